@@ -1,3 +1,62 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import ValidationError
 
-# Register your models here.
+from . import positions
+from .models import Puzzle
+
+
+class PuzzleAdminForm(forms.ModelForm):
+    class Meta:
+        model = Puzzle
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['position'].required = False
+        self.fields['position'].help_text = 'Leave empty to add the puzzle at the end of its category.'
+
+    def validate_unique(self):
+        # A taken position is fine: saving shifts the other puzzles along
+        exclude = self._get_validation_exclusions()
+        exclude.add('position')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
+
+@admin.register(Puzzle)
+class PuzzleAdmin(admin.ModelAdmin):
+    form = PuzzleAdminForm
+    list_display = ('solution', 'category', 'position', 'par_score')
+    list_filter = ('category',)
+    search_fields = ('solution', 'clue')
+    ordering = ('category', 'position')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Moving between categories would need a position in both
+        return ('category',) if obj else ()
+
+    def save_model(self, request, obj, form, change):
+        """
+        A position given for a new puzzle inserts it there, and a changed
+        position moves the puzzle, shifting the others instead of failing on
+        the (category, position) constraint.
+        """
+        position = obj.position
+        if not change:
+            if position is None:
+                super().save_model(request, obj, form, change)
+            else:
+                positions.insert_at(obj, position)
+            return
+
+        if 'position' in form.changed_data and position is not None:
+            # Save at the old position (a puzzle without one is given the
+            # next free one), then move it where it was asked to go
+            obj.position = form.initial.get('position')
+            super().save_model(request, obj, form, change)
+            positions.move(obj, position)
+        else:
+            super().save_model(request, obj, form, change)
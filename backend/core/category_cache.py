@@ -0,0 +1,131 @@
+"""
+Cached CategoryListView payloads.
+
+A category list only changes when its owner writes (an endless high score, a
+daily completion, one of their own categories) or when a system category
+changes. Rather than deleting cached lists on those writes, every cache key
+embeds version numbers: a global one for system categories and one per
+player. A write bumps the relevant version, and lists cached under the old
+key are never read again and simply expire.
+
+Keys use the player's Clerk ID, which is what the endpoint receives, so a
+cache hit doesn't touch the database at all.
+
+Versions only reach every process when CACHES points at a shared backend
+(see REDIS_URL in settings). With the local-memory default a worker never
+sees another worker's bumps, so lists are then kept for a few seconds
+instead of an hour, which bounds how long a stale badge or high score shows.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, User
+
+logger = logging.getLogger(__name__)
+
+LIST_CACHE_SECONDS = 60 * 60
+LOCAL_LIST_CACHE_SECONDS = 5
+
+# Backends that keep a separate cache in every process.
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+# Log the hit rate once per this many lookups in a process.
+STATS_LOG_EVERY = 1000
+
+_GLOBAL_VERSION_KEY = "categories:version"
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _user_version_key(clerk_id):
+    return f"categories:version:{clerk_id}"
+
+
+def list_key(clerk_id=None, game_mode=None, day=None):
+    """
+    Return the cache key for a category list. `day` is the player's local
+    date, for lists whose badges depend on it.
+    """
+    if clerk_id is None:
+        return f"categories:anon:v{cache.get(_GLOBAL_VERSION_KEY, 0)}"
+
+    user_version_key = _user_version_key(clerk_id)
+    versions = cache.get_many([_GLOBAL_VERSION_KEY, user_version_key])
+    return (
+        f"categories:{clerk_id}:{game_mode or ''}:{day or ''}"
+        f":v{versions.get(_GLOBAL_VERSION_KEY, 0)}.{versions.get(user_version_key, 0)}"
+    )
+
+
+def lookup(key):
+    """Return the cached payload for `key`, or None, counting the hit or miss."""
+    payload = cache.get(key)
+    with _stats_lock:
+        _stats["hits" if payload is not None else "misses"] += 1
+        lookups = _stats["hits"] + _stats["misses"]
+    if lookups % STATS_LOG_EVERY == 0:
+        current = stats()
+        logger.info(
+            f"Category list cache: {current['hits']} hits, {current['misses']} misses "
+            f"({current['hit_rate']:.1%} hit rate)"
+        )
+    return payload
+
+
+def list_cache_seconds():
+    """How long to keep a list: an hour with a shared cache, seconds without."""
+    if settings.CACHES["default"]["BACKEND"] in PER_PROCESS_BACKENDS:
+        return LOCAL_LIST_CACHE_SECONDS
+    return LIST_CACHE_SECONDS
+
+
+def store(key, payload):
+    cache.set(key, payload, list_cache_seconds())
+
+
+def stats():
+    """Return this process's hit and miss counts and hit rate."""
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+def _bump(key):
+    # Versions never expire, unlike the payloads keyed by them
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_user(clerk_id):
+    """Invalidate every cached category list of one player."""
+    _bump(_user_version_key(clerk_id))
+
+
+def bump_all():
+    """Invalidate every cached category list."""
+    _bump(_GLOBAL_VERSION_KEY)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def _category_changed(sender, instance, **kwargs):
+    if instance.creator_id is None:
+        bump_all()
+        return
+    clerk_id = User.objects.filter(pk=instance.creator_id).values_list("clerk_id", flat=True).first()
+    if clerk_id:
+        bump_user(clerk_id)
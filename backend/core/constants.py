@@ -1,5 +1,8 @@
 from enum import IntEnum
 
+# Slug of the synthetic category that mixed endless runs are scored under.
+MIXED_CATEGORY_SLUG = "mixed"
+
 
 class WordAccuracy(IntEnum):
     """
@@ -0,0 +1,165 @@
+"""
+Buffered counters for hot, additive statistics.
+
+Requests bump in-process deltas; every few seconds a background thread (or
+the next write, whichever comes first) writes them with
+`count = count + delta` updates. Because every write is additive, any
+number of worker processes can flush into the same rows without losing
+counts, and a failed flush keeps its deltas for the next attempt.
+
+Deltas are flushed again when a worker exits cleanly (SIGTERM, max_requests
+restarts), but a worker that is killed outright (SIGKILL, a gunicorn
+timeout, a crash) loses whatever it had not flushed yet: at most
+FLUSH_INTERVAL_SECONDS of its counts, more only if flushes were already
+failing. The tables these counters feed can be recounted from UserProgress
+with rebuild_daily_stats and rebuild_score_sketches.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 5
+
+_registry = []
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def increment_rows(model, key_fields, count_field, deltas):
+    """
+    Add `deltas` ({key tuple: delta}) to `count_field` of the matching rows,
+    creating rows that don't exist yet.
+
+    Keys are applied in sorted order so concurrent flushes lock rows in the
+    same order and cannot deadlock.
+    """
+    for key in sorted(deltas):
+        delta = deltas[key]
+        if not delta:
+            continue
+        lookup = dict(zip(key_fields, key))
+        updated = model.objects.filter(**lookup).update(**{count_field: F(count_field) + delta})
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **{count_field: delta})
+        except IntegrityError:
+            # Another process created the row first; add to it instead.
+            model.objects.filter(**lookup).update(**{count_field: F(count_field) + delta})
+
+
+def lock_for_rebuild(model):
+    """
+    Keep flushes out of `model`'s table until the current transaction ends,
+    so a rebuild can delete and recount its rows without racing them. On
+    PostgreSQL reads still go ahead; elsewhere the rebuild's first write
+    takes the database's write lock.
+    """
+    if connection.vendor == "postgresql":
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+
+
+class BufferedCounters:
+    """
+    Per-process buffer of counter deltas, flushed through `flush_func`.
+
+    `flush_func` receives a {key: delta} dict and must apply it additively;
+    it runs inside a transaction.
+    """
+
+    def __init__(self, name, flush_func, interval=FLUSH_INTERVAL_SECONDS):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        _registry.append(self)
+
+    def add(self, key, delta=1):
+        with self._lock:
+            self._pending[key] += delta
+        _ensure_flusher()
+        self.maybe_flush()
+
+    def pending(self, key):
+        """Return the unflushed delta for `key` in this process."""
+        with self._lock:
+            return self._pending.get(key, 0)
+
+    def pending_items(self):
+        with self._lock:
+            return list(self._pending.items())
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Write all pending deltas. Returns the number of keys flushed."""
+        with self._lock:
+            batch = dict(self._pending)
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+        if not batch:
+            return 0
+
+        try:
+            with transaction.atomic():
+                self.flush_func(batch)
+        except Exception as e:
+            logger.error(f"Failed to flush {self.name} counters, will retry: {e}")
+            with self._lock:
+                for key, delta in batch.items():
+                    self._pending[key] += delta
+            return 0
+
+        logger.debug(f"Flushed {len(batch)} {self.name} counters")
+        return len(batch)
+
+
+def flush_all():
+    """Flush every counter buffer in this process."""
+    for counters in _registry:
+        counters.flush()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        try:
+            for counters in _registry:
+                counters.maybe_flush()
+        finally:
+            # This thread has its own connection; don't hold it between flushes.
+            connection.close()
+
+
+def _ensure_flusher():
+    """
+    Start this process's flush thread on first use, so counters reach the
+    database even when no further writes come in. Started lazily so it runs
+    in each forked worker rather than in a preloading parent.
+    """
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_forever, name="counter-flusher", daemon=True)
+            _flusher.start()
+
+
+# Don't drop buffered counts when a worker shuts down cleanly.
+atexit.register(flush_all)
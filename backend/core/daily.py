@@ -0,0 +1,281 @@
+"""
+Daily puzzle scheduling.
+
+The daily puzzle for a category is still chosen with the original rule
+(days since the epoch modulo the number of puzzles, in position order), but
+the choice is written to DailyPuzzle ahead of time. Serving a day is then a
+single indexed lookup that stays stable even if puzzles are imported mid-day.
+
+Players roll over at their own midnight: clients send their UTC offset,
+which is bucketed to whole hours. Every bucket on the same local date shares
+that date's cached payload; only the cache headers differ per bucket.
+"""
+import hashlib
+import json
+import logging
+import math
+from datetime import date, datetime, time, timedelta, timezone
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.db.models.functions import Greatest
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+
+from .counters import BufferedCounters, increment_rows, lock_for_rebuild
+from .models import Category, DailyPuzzle, DailyStats, Puzzle, UserProgress
+from .text import getAcronymFromSolution
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+
+# Offset buckets, in whole hours from UTC (UTC-12 .. UTC+14: 27 buckets).
+MIN_OFFSET_HOURS = -12
+MAX_OFFSET_HOURS = 14
+
+# A day's payload never changes, and some bucket is on that day for up to
+# ~50 hours, so cache payloads for a little longer than that.
+PAYLOAD_CACHE_SECONDS = 3 * 24 * 60 * 60
+
+
+def parse_offset(raw):
+    """
+    Turn a client's UTC offset in minutes (e.g. 330 for UTC+5:30) into an
+    offset bucket: whole hours, clamped to the range real time zones use.
+
+    Bucketing keeps the number of distinct daily payloads small enough to
+    precompute and cache. Missing values mean UTC; raises ValueError for
+    anything that isn't an integer.
+    """
+    if raw in (None, ""):
+        return 0
+    # Half-hour zones round up, consistently (round() would alternate)
+    hours = math.floor(int(raw) / 60 + 0.5)
+    return min(max(hours, MIN_OFFSET_HOURS), MAX_OFFSET_HOURS)
+
+
+def local_today(offset_hours=0):
+    """The current date for players in the given offset bucket."""
+    return (datetime.now(timezone.utc) + timedelta(hours=offset_hours)).date()
+
+
+def day_bounds(day, offset_hours=0):
+    """Return the [start, end) UTC datetimes of `day` in the given offset bucket."""
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc) - timedelta(hours=offset_hours)
+    return start, start + timedelta(days=1)
+
+
+def next_midnight(offset_hours=0):
+    """The UTC datetime at which the offset bucket's day rolls over."""
+    return day_bounds(local_today(offset_hours), offset_hours)[1]
+
+
+def seconds_until_midnight(offset_hours=0):
+    remaining = next_midnight(offset_hours) - datetime.now(timezone.utc)
+    return max(int(remaining.total_seconds()), 1)
+
+
+def cache_until_midnight(response, offset_hours=0):
+    """Let browsers and proxies cache `response` until the bucket's daily rollover."""
+    patch_cache_control(response, public=True, max_age=seconds_until_midnight(offset_hours))
+    response["Expires"] = http_date(next_midnight(offset_hours).timestamp())
+    return response
+
+
+def date_seed(day):
+    """Days since the epoch; the seed for a day's puzzle."""
+    return (day - EPOCH).days
+
+
+def schedule_category(category, start, days):
+    """
+    Schedule `category`'s daily puzzles for `days` days from `start`.
+
+    Days that already have a puzzle keep it. Returns the number of days
+    newly scheduled.
+    """
+    puzzle_ids = list(
+        Puzzle.objects.filter(category=category).order_by("position").values_list("id", flat=True)
+    )
+    if not puzzle_ids:
+        return 0
+
+    existing = set(
+        DailyPuzzle.objects.filter(
+            category=category, date__gte=start, date__lt=start + timedelta(days=days)
+        ).values_list("date", flat=True)
+    )
+    rows = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day in existing:
+            continue
+        puzzle_id = puzzle_ids[date_seed(day) % len(puzzle_ids)]
+        rows.append(DailyPuzzle(date=day, category=category, puzzle_id=puzzle_id))
+
+    DailyPuzzle.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def _schedule_one(category, day):
+    """Pick and store a day's puzzle on demand when the schedule has a gap."""
+    puzzles = Puzzle.objects.filter(category=category).order_by("position")
+    count = puzzles.count()
+    if count == 0:
+        return None
+
+    puzzle = puzzles[date_seed(day) % count]
+    logger.warning(f"No daily puzzle scheduled for {category.slug} on {day}; picked one on demand")
+    try:
+        # A savepoint, so losing the race doesn't break a caller's transaction
+        with transaction.atomic():
+            return DailyPuzzle.objects.create(date=day, category=category, puzzle=puzzle)
+    except IntegrityError:
+        # Another request scheduled it first; use theirs.
+        return DailyPuzzle.objects.select_related("puzzle").get(date=day, category=category)
+
+
+def daily_payload(category, day):
+    """
+    Return the response data for `category`'s daily puzzle on `day`, or None
+    if the category has no puzzles.
+    """
+    key = f"daily:{category.id}:{day.isoformat()}"
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    scheduled = DailyPuzzle.objects.select_related("puzzle").filter(date=day, category=category).first()
+    if scheduled is None:
+        scheduled = _schedule_one(category, day)
+        if scheduled is None:
+            return None
+
+    payload = _puzzle_data(scheduled.puzzle)
+    cache.set(key, payload, PAYLOAD_CACHE_SECONDS)
+    return payload
+
+
+def _puzzle_data(puzzle):
+    return {
+        'acronym': getAcronymFromSolution(puzzle.solution),
+        'clue': puzzle.clue,
+        'par_score': puzzle.par_score,
+        'position': puzzle.position
+    }
+
+
+class DailyBundle:
+    """Every active system category's daily puzzle, pre-rendered as JSON."""
+
+    def __init__(self, day, body):
+        self.day = day
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+# Per-process bundles, keyed by day. At most three local dates are live at
+# once (UTC-12 .. UTC+14), so only that many are kept.
+_bundles = {}
+MAX_BUNDLES = 3
+
+
+def daily_bundle(day):
+    """
+    Return the DailyBundle for `day`, building it on first use in this
+    process. The scheduled puzzles are loaded in one query.
+    """
+    bundle = _bundles.get(day)
+    if bundle is not None:
+        return bundle
+
+    categories = list(Category.objects.filter(creator__isnull=True, is_active=True).order_by("order", "name"))
+    scheduled = {
+        row.category_id: row
+        for row in DailyPuzzle.objects.select_related("puzzle").filter(date=day, category__in=categories)
+    }
+
+    items = []
+    for category in categories:
+        row = scheduled.get(category.id) or _schedule_one(category, day)
+        if row is None:
+            continue
+        items.append({"category_slug": category.slug, **_puzzle_data(row.puzzle)})
+
+    body = json.dumps({"date": day.isoformat(), "puzzles": items}).encode()
+    bundle = DailyBundle(day, body)
+    _bundles[day] = bundle
+    for stale in sorted(_bundles)[:-MAX_BUNDLES]:
+        del _bundles[stale]
+    return bundle
+
+
+def _flush_daily_stats(deltas):
+    increment_rows(DailyStats, ("date", "category_id", "guesses"), "completions", deltas)
+
+
+daily_stats = BufferedCounters("daily stats", _flush_daily_stats)
+
+
+def record_completion(day, category_id, guesses):
+    """Count one completion of `category_id`'s daily puzzle for `day`."""
+    daily_stats.add((day, category_id, max(int(guesses), 0)))
+
+
+def stats_for(day, category_id):
+    """
+    Return {guesses: completions} for a day's puzzle in a category: the
+    flushed totals plus this process's unflushed counts.
+    """
+    distribution = dict(
+        DailyStats.objects.filter(date=day, category_id=category_id).values_list("guesses", "completions")
+    )
+    for (pending_day, pending_category, guesses), delta in daily_stats.pending_items():
+        if pending_day == day and pending_category == category_id:
+            distribution[guesses] = distribution.get(guesses, 0) + delta
+    return distribution
+
+
+def rebuild_stats(since=None):
+    """
+    Recount DailyStats from daily UserProgress rows (only dates on or after
+    `since`, if given), restoring counts a killed worker never flushed.
+    Returns (rows written, completions counted).
+
+    Like percentiles.rebuild_guess_counts, this holds the table against
+    flushes while it runs, and counts still buffered in a worker are added
+    again when they are flushed.
+    """
+    stats = DailyStats.objects.all()
+    progress = UserProgress.objects.filter(game_mode=UserProgress.GameMode.DAILY, played_on__isnull=False)
+    if since is not None:
+        stats = stats.filter(date__gte=since)
+        progress = progress.filter(played_on__gte=since)
+
+    with transaction.atomic():
+        lock_for_rebuild(DailyStats)
+        stats.delete()
+        rows = (
+            progress.annotate(guesses=Greatest("score", 0))
+            .values("played_on", "category_id", "guesses")
+            .annotate(completions=Count("id"))
+            .order_by()
+        )
+        created = DailyStats.objects.bulk_create(
+            [
+                DailyStats(
+                    date=row["played_on"],
+                    category_id=row["category_id"],
+                    guesses=row["guesses"],
+                    completions=row["completions"],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+    completions = sum(row.completions for row in created)
+    logger.info(f"Rebuilt {len(created)} daily stats rows from {completions} completions")
+    return len(created), completions
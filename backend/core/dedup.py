@@ -0,0 +1,258 @@
+"""
+Near-duplicate detection for puzzle solutions.
+
+Solutions are only unique exactly, so "Big Red Dog" and "big red dogs!" can
+both be imported. Each solution is normalized word by word with the same
+rules as guess checking (normalize_word), each word is reduced to its
+singular (stem_word) so plurals don't count as differences, and the result
+is cut into overlapping three character shingles, and summarized by a MinHash signature whose matching
+fraction estimates the Jaccard similarity of two shingle sets. Signatures
+are split into bands and hashed (locality-sensitive hashing), so only
+solutions that share a whole band are ever compared. Those candidates are
+confirmed with the exact Jaccard similarity.
+
+Signatures are computed with numpy a few thousand solutions at a time, and
+the corpus's band hashes are kept in sorted arrays, so indexing and checking
+100k solutions takes seconds rather than the hours a pairwise comparison
+would.
+"""
+import logging
+
+import numpy as np
+
+from .text import normalize_word, stem_word
+
+logger = logging.getLogger(__name__)
+
+# Solutions at least this similar (Jaccard similarity of their shingles)
+# are reported as near duplicates. Plurals are stemmed away, so "Big Red
+# Dog" and "big red dogs" score 1.0 and "Big Red Dog" and "Big Red Dogz"
+# 0.77; solutions differing in a whole word of four score well under 0.7.
+SIMILARITY_THRESHOLD = 0.7
+
+SHINGLE_SIZE = 3
+
+# 25 bands of 4 hashes: pairs at 0.7 similarity share a band with
+# probability > 0.998, pairs at 0.3 about one time in five.
+BANDS = 25
+ROWS_PER_BAND = 4
+NUM_HASHES = BANDS * ROWS_PER_BAND
+
+# Candidates whose signatures agree on fewer than (threshold - margin) of
+# their hashes are dropped without an exact comparison. The estimate's
+# standard deviation is under 0.05, so this margin loses no real matches.
+ESTIMATE_MARGIN = 0.15
+
+# At most this many of the best estimated candidates are compared exactly.
+MAX_CONFIRMED = 10
+
+# Solutions hashed per numpy batch; bounds the (hashes x shingles) matrix.
+CHUNK_SIZE = 2000
+
+# Buckets bigger than this are made of very short solutions, not near
+# duplicates; comparing every pair in them would be quadratic.
+MAX_BUCKET_SIZE = 50
+
+_random = np.random.default_rng(20240101)
+_HASH_MULTIPLIERS = _random.integers(1, 2**63, size=NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_HASH_OFFSETS = _random.integers(0, 2**63, size=NUM_HASHES, dtype=np.uint64)
+_BAND_MULTIPLIERS = _random.integers(1, 2**63, size=ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+_SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_solution(solution):
+    """
+    Normalize every word of `solution` like normalize_word, reduce it to its
+    singular with stem_word and join them with single spaces, dropping words
+    that were only punctuation.
+    """
+    # normalize_word never touches whitespace, so one call covers all words
+    return " ".join(stem_word(word) for word in normalize_word(solution).split())
+
+
+def shingles(solution):
+    """The set of character shingles of the normalized solution."""
+    text = normalize_solution(solution)
+    if not text:
+        return set()
+    text = f" {text} "
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def similarity(first, second):
+    """Exact Jaccard similarity of two solutions' shingle sets."""
+    a, b = shingles(first), shingles(second)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _shingle_codes(texts):
+    """
+    Return (codes, starts): every solution's shingles as 32-bit integers,
+    concatenated, and the index where each solution's shingles begin.
+    Every text must be at least SHINGLE_SIZE characters long.
+    """
+    # One code point per character; a NUL between texts marks shingles
+    # that span two of them.
+    chars = np.frombuffer("\0".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    grams = chars[:-2] << np.uint64(42) | chars[1:-1] << np.uint64(21) | chars[2:]
+    valid = (chars[:-2] != 0) & (chars[1:-1] != 0) & (chars[2:] != 0)
+
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    # Shingles before each text's start belong to earlier texts
+    kept_before = np.concatenate(([0], np.cumsum(valid)))[starts]
+    codes = (grams[valid] * _SHINGLE_MIX) >> np.uint64(32)
+    return codes, kept_before
+
+
+def signatures(solutions):
+    """Return the (len(solutions), NUM_HASHES) uint32 MinHash signatures."""
+    result = np.full((len(solutions), NUM_HASHES), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for chunk_start in range(0, len(solutions), CHUNK_SIZE):
+        chunk = solutions[chunk_start:chunk_start + CHUNK_SIZE]
+        texts, rows = [], []
+        for row, solution in enumerate(chunk, chunk_start):
+            text = normalize_solution(solution)
+            if text:
+                texts.append(f" {text} ")
+                rows.append(row)
+        if not texts:
+            continue
+
+        codes, starts = _shingle_codes(texts)
+        # Multiply-add-shift hashing: one row of hash values per hash function
+        hashed = np.multiply(_HASH_MULTIPLIERS[:, None], codes[None, :])
+        hashed += _HASH_OFFSETS[:, None]
+        hashed >>= np.uint64(32)
+        result[rows] = np.minimum.reduceat(hashed, starts, axis=1).T.astype(np.uint32)
+    return result
+
+
+def band_keys(signature_rows):
+    """Hash each band of each signature into one uint64: (n, BANDS)."""
+    bands = signature_rows.reshape(len(signature_rows), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    return (bands * _BAND_MULTIPLIERS).sum(axis=2, dtype=np.uint64)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of puzzle solutions.
+
+    Built once from the existing corpus; solutions checked later are added
+    as they pass, so near duplicates within an import are caught too.
+    """
+
+    def __init__(self, solutions=(), threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.solutions = list(solutions)
+        self._signatures = signatures(self.solutions)
+        keys = band_keys(self._signatures)
+        order = np.argsort(keys, axis=0, kind="stable")
+        # Per band: the corpus's keys in sorted order and whose key each is
+        self._keys = np.take_along_axis(keys, order, axis=0).T.copy()
+        self._ids = order.T.astype(np.int64)
+        self._added = [{} for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.solutions)
+
+    def check(self, solutions):
+        """
+        Check `solutions` in order against the index and each other.
+
+        Returns a list with, for each solution, None if it was new enough
+        (it is then added to the index) or a (matching solution, similarity)
+        tuple for the most similar solution already indexed.
+        """
+        solutions = list(solutions)
+        new_signatures = signatures(solutions)
+        keys = band_keys(new_signatures)
+        corpus_candidates = self._corpus_candidates(keys)
+
+        results = []
+        for row, solution in enumerate(solutions):
+            row_keys = keys[row].tolist()
+            candidates = set(corpus_candidates.get(row, ()))
+            for band, key in enumerate(row_keys):
+                candidates.update(self._added[band].get(key, ()))
+
+            best = self._best_match(solution, new_signatures[row], candidates)
+            results.append(best)
+            if best is None:
+                self._add(solution, new_signatures[row], row_keys)
+        return results
+
+    def pairs(self):
+        """
+        Yield (first index, second index, similarity) for every pair of
+        near-duplicate solutions the index was built with, most similar first.
+        """
+        candidates = set()
+        for band_keys_sorted, band_ids in zip(self._keys, self._ids):
+            _, run_starts, run_lengths = np.unique(band_keys_sorted, return_index=True, return_counts=True)
+            shared = (run_lengths > 1) & (run_lengths <= MAX_BUCKET_SIZE)
+            for start, length in zip(run_starts[shared].tolist(), run_lengths[shared].tolist()):
+                members = sorted(band_ids[start:start + length].tolist())
+                for i, first in enumerate(members):
+                    for second in members[i + 1:]:
+                        candidates.add((first, second))
+
+        found = []
+        if candidates:
+            pairs = np.array(sorted(candidates), dtype=np.int64)
+            estimates = (self._signatures[pairs[:, 0]] == self._signatures[pairs[:, 1]]).mean(axis=1)
+            for first, second in pairs[estimates >= self.threshold - ESTIMATE_MARGIN].tolist():
+                score = similarity(self.solutions[first], self.solutions[second])
+                if score >= self.threshold:
+                    found.append((first, second, score))
+        logger.info(f"Checked {len(candidates)} candidate pairs, found {len(found)} near duplicates")
+        yield from sorted(found, key=lambda pair: (-pair[2], pair[0], pair[1]))
+
+    def _add(self, solution, signature, row_keys):
+        entry = len(self.solutions)
+        if entry == len(self._signatures):
+            grown = np.empty((max(2 * entry, CHUNK_SIZE), NUM_HASHES), dtype=np.uint32)
+            grown[:entry] = self._signatures
+            self._signatures = grown
+        self._signatures[entry] = signature
+        self.solutions.append(solution)
+        for band, key in enumerate(row_keys):
+            bucket = self._added[band].setdefault(key, [])
+            if len(bucket) < MAX_BUCKET_SIZE:
+                bucket.append(entry)
+
+    def _corpus_candidates(self, keys):
+        """Map row -> ids of corpus solutions sharing at least one band with it."""
+        candidates = {}
+        if not self._ids.shape[1]:
+            return candidates
+        for band in range(BANDS):
+            sorted_keys = self._keys[band]
+            left = np.searchsorted(sorted_keys, keys[:, band], side="left")
+            right = np.searchsorted(sorted_keys, keys[:, band], side="right")
+            hits = np.flatnonzero((right > left) & (right - left <= MAX_BUCKET_SIZE))
+            for row in hits.tolist():
+                candidates.setdefault(row, []).extend(self._ids[band][left[row]:right[row]].tolist())
+        return candidates
+
+    def _best_match(self, solution, signature, candidates):
+        if not candidates:
+            return None
+        entries = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        # Only confirm candidates whose signatures make a match plausible
+        estimates = (self._signatures[entries] == signature).mean(axis=1)
+        plausible = np.flatnonzero(estimates >= self.threshold - ESTIMATE_MARGIN)
+        if not len(plausible):
+            return None
+        likely = entries[plausible[np.argsort(-estimates[plausible], kind="stable")][:MAX_CONFIRMED]]
+
+        query = shingles(solution)
+        best = None
+        for entry in likely.tolist():
+            other = shingles(self.solutions[entry])
+            score = len(query & other) / len(query | other) if query and other else 0.0
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (self.solutions[entry], score)
+        return best
@@ -0,0 +1,139 @@
+"""
+Deleting departed users.
+
+A Clerk user.deleted webhook only tombstones the user: one UPDATE setting
+deleted_at and is_active=False, plus taking their high scores out of the
+leaderboard histograms, after which they drop off leaderboards and ranks.
+The purge_deleted_users command then removes their data. Rows are deleted
+in bounded batches, each in its own short transaction, so purging a heavy
+player never holds locks on a large slice of UserProgress (the table every
+puzzle completion writes to). That covers everything that would otherwise
+cascade from the user, including puzzles they added to other players'
+categories and the progress on them, so the final User.delete() only has a
+few rows left to cascade to.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import leaderboards
+from .models import EndlessScore, EndlessSession, Puzzle, User, UserProgress
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_DEFAULT = 1000
+
+
+def tombstone(clerk_ids):
+    """
+    Mark the users with these Clerk IDs as deleted and take their high
+    scores off the leaderboards. Returns the number marked.
+    """
+    with transaction.atomic():
+        # Locked so a user tombstoned twice at once only leaves the boards once
+        user_ids = list(
+            User.objects.select_for_update()
+            .filter(clerk_id__in=clerk_ids, deleted_at__isnull=True)
+            .values_list("id", flat=True)
+        )
+        if not user_ids:
+            return 0
+        User.objects.filter(id__in=user_ids).update(deleted_at=timezone.now(), is_active=False)
+
+        removed = (
+            EndlessScore.objects.filter(user_id__in=user_ids)
+            .values("category_id", "high_score")
+            .annotate(players=Count("id"))
+            .order_by("category_id", "high_score")
+        )
+        for row in removed:
+            leaderboards.record_score_removed(row["category_id"], row["high_score"], row["players"])
+    return len(user_ids)
+
+
+def _delete_in_batches(queryset, label, batch_size, pause, progress):
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by().values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        if progress:
+            progress(label, deleted)
+        if pause:
+            # Give concurrent writers room between batches
+            time.sleep(pause)
+    return deleted
+
+
+def purge_user(user, batch_size=BATCH_SIZE_DEFAULT, pause=0, progress=None):
+    """
+    Delete a tombstoned user and everything that belongs to them.
+
+    `progress`, if given, is called with (label, rows deleted so far) after
+    every batch. Returns the total number of batched rows deleted.
+    """
+    total = 0
+
+    # Categories the user created, with other players' progress in them
+    for category in user.categories.all():
+        label = f"category {category.slug}"
+        total += _delete_in_batches(
+            UserProgress.objects.filter(category=category), f"{label} progress", batch_size, pause, progress
+        )
+        total += _delete_in_batches(
+            EndlessSession.objects.filter(category=category), f"{label} sessions", batch_size, pause, progress
+        )
+        total += _delete_in_batches(
+            Puzzle.objects.filter(category=category), f"{label} puzzles", batch_size, pause, progress
+        )
+        # The category's board goes with it, so its scores need no bucket updates
+        total += _delete_in_batches(
+            EndlessScore.objects.filter(category=category), f"{label} scores", batch_size, pause, progress
+        )
+        with transaction.atomic():
+            category.delete()
+
+    # Puzzles the user added to other categories, and everyone's progress on them
+    total += _delete_in_batches(
+        UserProgress.objects.filter(puzzle__creator=user), "progress on created puzzles", batch_size, pause, progress
+    )
+    total += _delete_in_batches(
+        Puzzle.objects.filter(creator=user), "created puzzles", batch_size, pause, progress
+    )
+
+    total += _delete_in_batches(
+        UserProgress.objects.filter(user=user), "progress", batch_size, pause, progress
+    )
+    total += _delete_in_batches(
+        EndlessSession.objects.filter(user=user), "sessions", batch_size, pause, progress
+    )
+    # tombstone() already took these off the leaderboards
+    total += _delete_in_batches(
+        EndlessScore.objects.filter(user=user), "scores", batch_size, pause, progress
+    )
+
+    with transaction.atomic():
+        user.delete()
+
+    logger.info(f"Purged deleted user {user.clerk_id} ({total} rows)")
+    return total
+
+
+def purge_deleted(batch_size=BATCH_SIZE_DEFAULT, pause=0, progress=None, on_user=None):
+    """
+    Purge every tombstoned user. `on_user`, if given, is called with each
+    user before they are purged. Returns the number of users purged.
+    """
+    purged = 0
+    for user in User.objects.filter(deleted_at__isnull=False).order_by("deleted_at").iterator():
+        if on_user:
+            on_user(user)
+        purge_user(user, batch_size, pause, progress)
+        purged += 1
+    return purged
@@ -0,0 +1,276 @@
+"""
+Server-side state for endless mode runs.
+
+Each run walks a seeded pseudo-random permutation of the category's puzzle
+positions (or, for mixed runs, of several categories laid end to end), so
+handing out the next packet only touches as many positions as the packet
+needs. Served positions are also recorded in a compact bitset so a
+run never repeats a puzzle, however long it gets.
+"""
+import bisect
+import hashlib
+import random
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import EndlessSession, Puzzle, User
+from .sampling import get_sampler
+
+# Number of Feistel rounds used to shuffle positions.
+PERMUTATION_ROUNDS = 4
+
+# Weighted draws that land on served puzzles are retried up to this many
+# times per requested puzzle before falling back to the permutation.
+WEIGHTED_ATTEMPTS_PER_PUZZLE = 8
+
+
+def has_seen(seen, slot):
+    """Return True if `slot` is set in the `seen` bitset."""
+    byte_index = slot >> 3
+    if byte_index >= len(seen):
+        return False
+    return bool(seen[byte_index] & (1 << (slot & 7)))
+
+
+def mark_seen(seen, slot):
+    """Set `slot` in the `seen` bytearray, growing it if needed."""
+    byte_index = slot >> 3
+    if byte_index >= len(seen):
+        seen.extend(b"\x00" * (byte_index + 1 - len(seen)))
+    seen[byte_index] |= 1 << (slot & 7)
+
+
+def _round_key(seed, rnd, value):
+    digest = hashlib.blake2b(f"{seed}:{rnd}:{value}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def permuted_slot(index, span, seed):
+    """
+    Map `index` to a unique slot in [0, span) for the permutation named by `seed`.
+
+    Uses a small Feistel network over the next even power of two and walks
+    the cycle until the value falls inside the span, which keeps the mapping
+    a bijection without ever materializing the permutation.
+    """
+    bits = max(2, (span - 1).bit_length())
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for rnd in range(PERMUTATION_ROUNDS):
+            left, right = right, left ^ (_round_key(seed, rnd, right) & mask)
+        value = (left << half) | right
+        if value < span:
+            return value
+
+
+class SlotLayout:
+    """
+    Maps permutation slots to (category_id, position) pairs.
+
+    A single-category run uses slot = position - 1. A mixed run lays its
+    categories end to end, each taking as many slots as its highest position.
+    """
+
+    def __init__(self, session):
+        if session.layout:
+            self.entries = [(category_id, span) for category_id, span in session.layout]
+        else:
+            self.entries = [(session.category_id, session.span)]
+        self.offsets = []
+        offset = 0
+        for _category_id, span in self.entries:
+            self.offsets.append(offset)
+            offset += span
+        self.cum_spans = [o + span for o, (_c, span) in zip(self.offsets, self.entries)]
+
+    def key(self, slot):
+        """Return the (category_id, position) stored at `slot`."""
+        i = bisect.bisect_right(self.offsets, slot) - 1
+        return self.entries[i][0], slot - self.offsets[i] + 1
+
+    def slot(self, index, position):
+        """Return the slot of `position` in the `index`-th category, or None if out of range."""
+        if not 1 <= position <= self.entries[index][1]:
+            return None
+        return self.offsets[index] + position - 1
+
+
+def _replace_session(user, category, **fields):
+    with transaction.atomic():
+        # Nothing stops two sessions for one user and category but this lock:
+        # concurrent starts take turns instead of both deleting, then both
+        # creating.
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        EndlessSession.objects.filter(user=user, category=category).delete()
+        return EndlessSession.objects.create(
+            user=user,
+            category=category,
+            seed=random.getrandbits(62),
+            **fields,
+        )
+
+
+def start_session(user, category, exclude_positions=()):
+    """
+    Create a new endless run for `user` in `category`.
+
+    Any previous run the user had in the same category is discarded.
+    `exclude_positions` pre-marks positions as served, which lets older
+    clients that still send `last_position` carry their history over.
+    """
+    # Puzzles without a position have no slot and are never served
+    puzzles = Puzzle.objects.filter(category=category, position__isnull=False)
+    span = puzzles.order_by("-position").values_list("position", flat=True).first() or 0
+    total = puzzles.count()
+
+    seen = bytearray()
+    excluded = 0
+    for position in set(exclude_positions):
+        if 1 <= position <= span:
+            mark_seen(seen, position - 1)
+            excluded += 1
+
+    return _replace_session(user, category, span=span, total=total, served=excluded, seen=bytes(seen))
+
+
+def start_mixed_session(user, mixed_category, source_categories):
+    """
+    Create a new endless run for `user` that draws from every category in
+    `source_categories`. The run is stored, and scored, under `mixed_category`.
+
+    Per-category counts and highest positions come from this process's
+    samplers (see core.sampling), which the run's weighted draws need anyway,
+    so starting a run doesn't scan every source category's puzzles. The
+    puzzles themselves are fetched a packet at a time like any other run.
+    """
+    layout = []
+    total = 0
+    for category_id in source_categories.order_by("id").values_list("id", flat=True):
+        sampler = get_sampler(category_id)
+        if sampler is None:
+            continue
+        count, _max_id, span, _version = sampler.signature
+        if span:
+            layout.append([category_id, span])
+            total += count
+    return _replace_session(
+        user,
+        mixed_category,
+        layout=layout,
+        span=sum(span for _category_id, span in layout),
+        total=total,
+    )
+
+
+def _fetch_keys(keys, with_category=False):
+    """
+    Load puzzles for (category_id, position) `keys` in one query, keeping
+    the order the keys were drawn in.
+    """
+    by_category = {}
+    for category_id, position in keys:
+        by_category.setdefault(category_id, []).append(position)
+
+    query = Q()
+    for category_id, positions in by_category.items():
+        query |= Q(category_id=category_id, position__in=positions)
+
+    puzzles = Puzzle.objects.filter(query)
+    if with_category:
+        puzzles = puzzles.select_related("category")
+    found = {(puzzle.category_id, puzzle.position): puzzle for puzzle in puzzles}
+    return [found[key] for key in keys if key in found]
+
+
+def _draw_weighted(layout, samplers, seen, limit, round_num):
+    """
+    Draw up to `limit` unseen (category_id, position) keys by difficulty,
+    using `samplers` (category_id -> CategorySampler or None).
+
+    Mixed runs first pick a category in proportion to its size, then draw
+    from that category's alias table. Draws that hit an already served
+    puzzle are rejected; after a bounded number of misses the caller falls
+    back to the permutation walk, which always makes progress.
+    """
+    keys = []
+    for _ in range(limit * WEIGHTED_ATTEMPTS_PER_PUZZLE):
+        if len(keys) >= limit:
+            break
+        if len(layout.entries) == 1:
+            index = 0
+        else:
+            index = bisect.bisect_right(layout.cum_spans, random.randrange(layout.cum_spans[-1]))
+        category_id = layout.entries[index][0]
+
+        sampler = samplers.get(category_id)
+        if sampler is None:
+            continue
+        position = sampler.draw(round_num)
+        slot = layout.slot(index, position)
+        if slot is None:
+            # Added after the run started; mixed runs have no room for it.
+            if len(layout.entries) > 1:
+                continue
+            slot = position - 1
+        if not has_seen(seen, slot):
+            mark_seen(seen, slot)
+            keys.append((category_id, position))
+    return keys
+
+
+def next_packet(session, limit, round_num=None):
+    """
+    Return up to `limit` unseen puzzles for `session` and advance it.
+
+    Positions are pulled from the session's permutation in order; gaps left
+    by deleted puzzles are skipped. When `round_num` is given, puzzles are
+    drawn by difficulty for that round first (see core.sampling). The session
+    row is locked while it is advanced, so concurrent packet requests for one
+    run never overlap.
+    """
+    samplers = {}
+    if round_num is not None:
+        # Rebuilding a stale sampler scans the whole category, so it is done
+        # before the row lock is taken rather than while it is held.
+        samplers = {category_id: get_sampler(category_id) for category_id, _span in SlotLayout(session).entries}
+
+    with transaction.atomic():
+        session = EndlessSession.objects.select_for_update().get(pk=session.pk)
+        layout = SlotLayout(session)
+        mixed = bool(session.layout)
+        seen = bytearray(session.seen)
+        cursor = session.cursor
+        puzzles = []
+
+        if round_num is not None and session.span:
+            keys = _draw_weighted(layout, samplers, seen, limit, round_num)
+            if keys:
+                puzzles.extend(_fetch_keys(keys, with_category=mixed))
+
+        while len(puzzles) < limit and cursor < session.span:
+            wanted = limit - len(puzzles)
+            keys = []
+            while len(keys) < wanted and cursor < session.span:
+                slot = permuted_slot(cursor, session.span, session.seed)
+                cursor += 1
+                if not has_seen(seen, slot):
+                    mark_seen(seen, slot)
+                    keys.append(layout.key(slot))
+
+            if keys:
+                puzzles.extend(_fetch_keys(keys, with_category=mixed))
+
+        served_before = session.served
+        session.cursor = cursor
+        session.seen = bytes(seen)
+        session.served = served_before + len(puzzles)
+        session.save(update_fields=["cursor", "seen", "served", "updated_at"])
+
+    remaining = max(session.total - served_before, 0)
+    return puzzles, remaining
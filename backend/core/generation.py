@@ -0,0 +1,265 @@
+"""
+Candidate puzzle generation from themed word lists.
+
+A word list is streamed in chunks through a process pool. Each word is
+filed under its initial (the letter getAcronymFromSolution takes from it)
+and scored for novelty: how rarely the existing puzzles use it. Words are
+compared by their singular stem (stem_word), so "lion" and "lions" count
+as the same word. Only the
+most novel BUCKET_SIZE words per letter are kept, so memory stays bounded
+however long the list is.
+
+Each target acronym is then enumerated best first: the buckets for its
+letters are sorted by novelty and combinations are taken from a heap in
+order of total novelty, so the top candidates are found without walking
+the (astronomically large) full product. Words are capped at a few uses
+per acronym to keep the candidates varied, and the results are filtered
+for near duplicates of existing solutions (see core.dedup).
+
+Kept free of Django imports so worker processes don't need django.setup().
+"""
+import heapq
+import logging
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .dedup import NearDuplicateIndex
+from .text import getAcronymFromSolution, normalize_word, stem_word
+
+logger = logging.getLogger(__name__)
+
+# Words kept per initial letter.
+BUCKET_SIZE = 2000
+
+# Word list lines handed to a worker at a time.
+CHUNK_LINES = 50000
+
+# Candidates kept per acronym, and how often one word may appear in them.
+PER_ACRONYM_DEFAULT = 50
+MAX_WORD_USES_DEFAULT = 3
+
+# Give up on an acronym after this many heap pops per candidate wanted.
+MAX_POPS_PER_CANDIDATE = 500
+
+SOLUTION_MAX_LENGTH = 255
+
+# Set in each worker by _init_worker: word stem -> number of existing
+# solutions that use it.
+_word_uses = {}
+
+
+def _init_worker(word_uses):
+    global _word_uses
+    _word_uses = word_uses
+
+
+def word_uses(solutions):
+    """Count, for each word stem, how many of `solutions` contain it."""
+    uses = Counter()
+    for solution in solutions:
+        uses.update({stem_word(normalize_word(word)) for word in solution.split()})
+    uses.pop("", None)
+    return dict(uses)
+
+
+def acronym_words(solutions):
+    """Map acronym -> word stems used by the existing solutions with it."""
+    words = {}
+    for solution in solutions:
+        acronym = getAcronymFromSolution(solution)
+        words.setdefault(acronym, set()).update(stem_word(normalize_word(word)) for word in solution.split())
+    return words
+
+
+def novelty(stem):
+    """1 for a word no existing puzzle uses, falling towards 0 the more they do."""
+    return 1.0 / (1 + _word_uses.get(stem, 0))
+
+
+def scan_chunk(first_line, lines):
+    """
+    Score one chunk of a word list. Returns {letter: [(novelty, -line number,
+    word, word stem)]} with at most BUCKET_SIZE of the best entries per
+    letter; earlier lines win ties. Lines that aren't a single word, and
+    repeats of a word (or of its singular or plural), are skipped.
+    """
+    words = [line.strip() for line in lines]
+    # normalize_word leaves newlines alone, so the whole chunk is normalized
+    # in one call rather than one per word
+    normalized_words = normalize_word("\n".join(words)).split("\n")
+
+    buckets = {}
+    seen = set()
+    for line_number, word, normalized in zip(range(first_line, first_line + len(words)), words, normalized_words):
+        stem = stem_word(normalized)
+        if not stem or stem in seen or " " in word or "\t" in word:
+            continue
+        seen.add(stem)
+        # What getAcronymFromSolution takes from a one-word solution
+        letter = word[0].upper()
+        buckets.setdefault(letter, []).append((novelty(stem), -line_number, word, stem))
+    return {letter: heapq.nlargest(BUCKET_SIZE, entries) for letter, entries in buckets.items()}
+
+
+def _chunks(lines, size):
+    chunk, first_line = [], 1
+    for line_number, line in enumerate(lines, 1):
+        if not chunk:
+            first_line = line_number
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield first_line, chunk
+            chunk = []
+    if chunk:
+        yield first_line, chunk
+
+
+def _merge(buckets, chunk_buckets):
+    for letter, entries in chunk_buckets.items():
+        current = buckets.get(letter, [])
+        if len(current) >= BUCKET_SIZE:
+            # Buckets are kept best first; most entries of a long list can't get in
+            entries = [entry for entry in entries if entry > current[-1]]
+            if not entries:
+                continue
+        merged = {}
+        for entry in current + entries:
+            if entry[3] not in merged or entry > merged[entry[3]]:
+                merged[entry[3]] = entry
+        buckets[letter] = heapq.nlargest(BUCKET_SIZE, merged.values())
+
+
+def candidates_for(acronym, buckets, used_words, per_acronym, max_word_uses):
+    """
+    Return up to `per_acronym` (novelty, solution) pairs for `acronym`, best
+    first. `buckets` maps each of its letters to scored words and
+    `used_words` holds the words existing solutions with this acronym use,
+    which count as not novel at all.
+    """
+    letters = list(acronym)
+    if any(not buckets.get(letter) for letter in letters):
+        return []
+
+    ranked = []
+    for letter in letters:
+        entries = [
+            (0.0 if stem in used_words else score, word, stem)
+            for score, _order, word, stem in buckets[letter]
+        ]
+        # Stable sort keeps the word list's order among equal scores
+        entries.sort(key=lambda entry: -entry[0])
+        ranked.append(entries)
+
+    def total(indexes):
+        return sum(ranked[position][index][0] for position, index in enumerate(indexes))
+
+    start = (0,) * len(letters)
+    # Ties (common when few listed words appear in existing puzzles) go to
+    # the combination of earlier-ranked words, which spreads candidates over
+    # the buckets instead of walking one bucket to the end.
+    heap = [(-total(start), 0, start)]
+    seen = {start}
+    uses = Counter()
+    found = []
+    pops = 0
+    while heap and len(found) < per_acronym and pops < per_acronym * MAX_POPS_PER_CANDIDATE:
+        negative_total, _rank, indexes = heapq.heappop(heap)
+        pops += 1
+
+        chosen = [ranked[position][index] for position, index in enumerate(indexes)]
+        words = [entry[1] for entry in chosen]
+        stems = [entry[2] for entry in chosen]
+        if len(set(stems)) == len(stems) and all(uses[stem] < max_word_uses for stem in stems):
+            solution = " ".join(word[:1].upper() + word[1:] for word in words)
+            if len(solution) <= SOLUTION_MAX_LENGTH:
+                found.append((-negative_total / len(letters), solution))
+                uses.update(stems)
+
+        for position in range(len(indexes)):
+            if indexes[position] + 1 < len(ranked[position]):
+                successor = indexes[:position] + (indexes[position] + 1,) + indexes[position + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heapq.heappush(heap, (-total(successor), sum(successor), successor))
+    return found
+
+
+def _candidates_task(args):
+    return candidates_for(*args)
+
+
+def _run_inline(fn, *args):
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def _scan(lines, submit, in_flight, progress):
+    """Stream `lines` through scan_chunk; returns (buckets, lines read)."""
+    buckets = {}
+    read = 0
+    # Keep only a few chunks in flight so the list is never all in memory
+    pending = deque()
+    for first_line, chunk in _chunks(lines, CHUNK_LINES):
+        pending.append((len(chunk), submit(scan_chunk, first_line, chunk)))
+        while len(pending) > in_flight:
+            size, future = pending.popleft()
+            _merge(buckets, future.result())
+            read += size
+            if progress:
+                progress(read)
+    for size, future in pending:
+        _merge(buckets, future.result())
+        read += size
+    if progress and pending:
+        progress(read)
+    return buckets, read
+
+
+def generate(lines, acronyms, existing_solutions, per_acronym=PER_ACRONYM_DEFAULT,
+             max_word_uses=MAX_WORD_USES_DEFAULT, workers=1, progress=None):
+    """
+    Generate candidate solutions for each of `acronyms` from the word list
+    `lines` (any iterable of lines, read lazily).
+
+    Yields (acronym, novelty, solution) in the order the acronyms were
+    given, best candidates first. Candidates that are near duplicates of an
+    existing solution, or of a better candidate, are dropped. `progress`,
+    if given, is called with the number of lines read so far.
+    """
+    uses = word_uses(existing_solutions)
+    used_by_acronym = acronym_words(existing_solutions)
+
+    def tasks(buckets):
+        # Ask for extra candidates to make up for near duplicates dropped later
+        return [
+            (acronym, {letter: buckets.get(letter, []) for letter in set(acronym)},
+             used_by_acronym.get(acronym, set()), per_acronym * 2, max_word_uses)
+            for acronym in acronyms
+        ]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(uses,)) as pool:
+            buckets, read = _scan(lines, pool.submit, workers * 2, progress)
+            results = list(pool.map(_candidates_task, tasks(buckets)))
+    else:
+        _init_worker(uses)
+        buckets, read = _scan(lines, _run_inline, 0, progress)
+        results = [_candidates_task(task) for task in tasks(buckets)]
+    logger.info(f"Generated candidates for {len(acronyms)} acronyms from {read} word list lines")
+
+    index = NearDuplicateIndex(existing_solutions)
+    for acronym, found in zip(acronyms, results):
+        kept = 0
+        checked = 0
+        # Check only as many as could still be kept: everything that passes
+        # check() joins the index, and candidates beyond per_acronym must
+        # not shadow the next acronym's.
+        while kept < per_acronym and checked < len(found):
+            batch = found[checked:checked + per_acronym - kept]
+            checked += len(batch)
+            matches = index.check([solution for _score, solution in batch])
+            for (score, solution), match in zip(batch, matches):
+                if match is None:
+                    kept += 1
+                    yield acronym, score, solution
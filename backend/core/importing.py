@@ -0,0 +1,445 @@
+"""
+Bulk puzzle import from CSV files.
+
+Files are streamed row by row, normalized and validated. Duplicate solutions
+are caught against a set of every existing solution, loaded with one query
+up front, so no row costs a round trip of its own. New puzzles are written in
+batches, each in its own transaction that reserves a block of positions from
+the category's PositionCounter: with PostgreSQL COPY where the driver
+supports it, otherwise with bulk_create.
+
+New solutions are also checked against a near-duplicate index of the
+corpus (see core.dedup), so "big red dogs" is reported and skipped when "Big
+Red Dog" already exists.
+
+With several workers, files are parsed and validated in a process pool
+while a single writer in this process checks them against the database and
+assigns positions. The writer consumes files strictly in the order they were
+given, so positions come out the same however the workers are scheduled.
+A worker hands back a whole file's rows at once, so this path needs memory
+in proportion to the files being parsed; only a couple of files per worker
+are parsed ahead of the writer. Split very large files, or use one worker,
+which streams.
+"""
+import csv
+import io
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .dedup import NearDuplicateIndex
+from .models import PositionCounter, Puzzle
+from .sampling import invalidate_sampler
+from .text import getAcronymFromSolution, normalize_whitespace, puzzle_content_hash
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_DEFAULT = 1000
+DEFAULT_PAR_SCORE = 5
+
+# Keep this many error messages per file in a report.
+MAX_REPORTED_ERRORS = 20
+
+SOLUTION_MAX_LENGTH = Puzzle._meta.get_field("solution").max_length
+CLUE_MAX_LENGTH = Puzzle._meta.get_field("clue").max_length
+
+
+class RowError(ValueError):
+    """A CSV row that can't be imported."""
+
+
+def parse_row(row, keep_position=False):
+    """
+    Normalize and validate one CSV row and return
+    (solution, clue, par_score, position).
+
+    position is None unless `keep_position` is set, in which case the row's
+    own position column is required. Raises RowError for invalid rows.
+    """
+    solution = normalize_whitespace(row.get("solution") or "")
+    clue = normalize_whitespace(row.get("clue") or "")
+    if not solution:
+        raise RowError("missing solution")
+    if len(getAcronymFromSolution(solution)) < 2:
+        raise RowError("solution needs at least two words to make an acronym")
+    if len(solution) > SOLUTION_MAX_LENGTH:
+        raise RowError(f"solution longer than {SOLUTION_MAX_LENGTH} characters")
+    if not clue:
+        raise RowError("missing clue")
+    if len(clue) > CLUE_MAX_LENGTH:
+        raise RowError(f"clue longer than {CLUE_MAX_LENGTH} characters")
+
+    raw_par = (row.get("par_score") or "").strip()
+    try:
+        par_score = int(raw_par) if raw_par else DEFAULT_PAR_SCORE
+    except ValueError:
+        raise RowError(f"par_score is not an integer: {raw_par!r}")
+    if par_score < 1:
+        raise RowError(f"par_score must be positive: {par_score}")
+
+    position = None
+    if keep_position:
+        raw_position = (row.get("position") or "").strip()
+        try:
+            position = int(raw_position)
+        except ValueError:
+            raise RowError(f"position is not an integer: {raw_position!r}")
+        if position < 1:
+            raise RowError(f"position must be positive: {position}")
+
+    return solution, clue, par_score, position
+
+
+def read_rows(path):
+    """Yield (row number, row dict) from a CSV file without loading it all."""
+    with open(path, "r", encoding="utf-8", newline="") as csvfile:
+        for row_num, row in enumerate(csv.DictReader(csvfile), 1):
+            yield row_num, row
+
+
+class ImportReport:
+    """What happened to one file's rows."""
+
+    def __init__(self, path, category=None):
+        self.path = path
+        self.category = category
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def error(self, message):
+        self.invalid += 1
+        self._add_message(message)
+
+    def near_duplicate(self, solution, existing, similarity):
+        self.near_duplicates += 1
+        self._add_message(f"{solution}: near duplicate of {existing!r} ({similarity:.2f})")
+
+    @property
+    def unreported(self):
+        """Errors and near duplicates beyond the ones kept in `errors`."""
+        return self.invalid + self.near_duplicates - len(self.errors)
+
+    def _add_message(self, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def validated_rows(path, report, keep_positions=False):
+    """
+    Yield (solution, clue, par_score, position) for each valid row of `path`
+    whose solution hasn't appeared earlier in the file, counting the other
+    rows in `report`. Doesn't touch the database.
+    """
+    if not os.path.exists(path):
+        report.error(f"File not found: {path}")
+        return
+
+    seen = set()
+    for row_num, row in read_rows(path):
+        report.read += 1
+        try:
+            parsed = parse_row(row, keep_positions)
+        except RowError as e:
+            report.error(f"row {row_num}: {e}")
+            continue
+
+        if parsed[0] in seen:
+            report.duplicates += 1
+            continue
+        seen.add(parsed[0])
+        yield parsed
+
+
+def parse_file(path, keep_positions=False):
+    """
+    Parse and validate a whole file. This is the unit of work for the
+    process pool; returns (rows, report). Unlike import_file, which streams,
+    every valid row of the file is held in memory.
+    """
+    started = time.monotonic()
+    report = ImportReport(path)
+    rows = list(validated_rows(path, report, keep_positions))
+    report.seconds = time.monotonic() - started
+    return rows, report
+
+
+class PuzzleImporter:
+    """
+    Imports CSV files into categories, sharing one set of known solutions so
+    duplicates are also caught across files.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE_DEFAULT, dry_run=False, use_copy=None, near_duplicates=True):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.use_copy = copy_available() if use_copy is None else use_copy
+        self.solutions = set(Puzzle.objects.values_list("solution", flat=True))
+        self.near_duplicate_index = NearDuplicateIndex(self.solutions) if near_duplicates else None
+
+    def import_file(self, path, category, keep_positions=False):
+        """
+        Import `path` into `category` and return its ImportReport.
+
+        New puzzles go after the last position handed out in the category, in
+        file order. With `keep_positions`, the file's position column is used
+        instead and rows whose position is already taken are rejected.
+        """
+        started = time.monotonic()
+        report = ImportReport(path, category)
+        self._write_rows(validated_rows(path, report, keep_positions), category, report, keep_positions)
+        report.seconds = time.monotonic() - started
+        return report
+
+    def import_files(self, sources, keep_positions=False, workers=1):
+        """
+        Import (path, category) pairs, yielding an ImportReport per file in
+        the order given. With more than one worker, files are parsed in a
+        process pool while this process writes them.
+        """
+        if workers <= 1:
+            for path, category in sources:
+                yield self.import_file(path, category, keep_positions)
+            return
+
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            # Files are written in the order given, whichever worker finishes
+            # first, which keeps position assignment deterministic. Only a few
+            # are parsed ahead so their rows don't pile up in memory.
+            pending = deque()
+            for path, category in sources:
+                pending.append((category, pool.submit(parse_file, path, keep_positions)))
+                if len(pending) > workers * 2:
+                    yield self._write_parsed(*pending.popleft(), keep_positions)
+            while pending:
+                yield self._write_parsed(*pending.popleft(), keep_positions)
+
+    def _write_parsed(self, category, future, keep_positions):
+        rows, report = future.result()
+        started = time.monotonic()
+        report.category = category
+        self._write_rows(rows, category, report, keep_positions)
+        report.seconds += time.monotonic() - started
+        return report
+
+    def _write_rows(self, rows, category, report, keep_positions):
+        taken = set()
+        if keep_positions:
+            taken = set(Puzzle.objects.filter(category=category).values_list("position", flat=True))
+
+        batch = []
+        for solution, clue, par_score, position in rows:
+            if solution in self.solutions:
+                report.duplicates += 1
+                continue
+
+            if keep_positions:
+                if position in taken:
+                    report.error(f"{solution}: position {position} is already taken")
+                    continue
+                taken.add(position)
+
+            self.solutions.add(solution)
+            batch.append(_new_puzzle(solution, clue, par_score, category, position))
+            if len(batch) >= self.batch_size:
+                report.imported += self._write(batch, category, report, keep_positions)
+                batch = []
+
+        if batch:
+            report.imported += self._write(batch, category, report, keep_positions)
+
+        logger.info(
+            f"Imported {report.imported} {category.slug} puzzles from {report.path} "
+            f"({report.duplicates} duplicates, {report.near_duplicates} near duplicates, "
+            f"{report.invalid} invalid)"
+        )
+
+    def _without_near_duplicates(self, batch, report):
+        if self.near_duplicate_index is None:
+            return batch
+        kept = []
+        matches = self.near_duplicate_index.check([puzzle.solution for puzzle in batch])
+        for puzzle, match in zip(batch, matches):
+            if match is None:
+                kept.append(puzzle)
+            else:
+                report.near_duplicate(puzzle.solution, *match)
+        return kept
+
+    def _write(self, batch, category, report, keep_positions):
+        batch = self._without_near_duplicates(batch, report)
+        if not batch:
+            return 0
+        if self.dry_run:
+            return len(batch)
+        with transaction.atomic():
+            if keep_positions:
+                PositionCounter.objects.advance_to(category.id, max(puzzle.position for puzzle in batch))
+            else:
+                first = PositionCounter.objects.reserve(category.id, len(batch))
+                for offset, puzzle in enumerate(batch):
+                    puzzle.position = first + offset
+            if self.use_copy:
+                _copy_puzzles(batch)
+            else:
+                Puzzle.objects.bulk_create(batch, batch_size=self.batch_size)
+        # COPY and bulk_create don't send post_save
+        invalidate_sampler(category.id)
+        return len(batch)
+
+
+class SyncReport(ImportReport):
+    """What a sync changed in one category."""
+
+    def __init__(self, path, category):
+        super().__init__(path, category)
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.conflicts = 0
+
+    @property
+    def changed(self):
+        return self.inserted + self.updated + self.deleted
+
+
+def sync_file(path, category, batch_size=BATCH_SIZE_DEFAULT, dry_run=False, delete=True):
+    """
+    Make `category`'s puzzles match the CSV at `path`, touching only rows
+    that differ.
+
+    Rows are matched by solution and compared by content hash, so unchanged
+    puzzles keep their ids, positions and players' progress. Changed clues or
+    par scores are updated in place, new solutions are appended after the
+    last position, and (with `delete`) puzzles missing from the file are
+    deleted. An unchanged file costs a single query. Returns a SyncReport.
+    """
+    started = time.monotonic()
+    report = SyncReport(path, category)
+    rows = list(validated_rows(path, report))
+    if not os.path.exists(path):
+        # Never treat a missing file as "delete everything"
+        report.seconds = time.monotonic() - started
+        return report
+
+    existing = {
+        solution: (puzzle_id, stored_hash)
+        for puzzle_id, solution, stored_hash in Puzzle.objects.filter(category=category).values_list(
+            "id", "solution", "content_hash"
+        )
+    }
+
+    inserts, updates = [], []
+    in_file = set()
+    now = timezone.now()
+    for solution, clue, par_score, _ in rows:
+        in_file.add(solution)
+        content_hash = puzzle_content_hash(solution, clue, par_score)
+        if solution not in existing:
+            inserts.append((solution, clue, par_score))
+        elif existing[solution][1] == content_hash:
+            report.unchanged += 1
+        else:
+            updates.append(
+                Puzzle(
+                    id=existing[solution][0], clue=clue, par_score=par_score, content_hash=content_hash, updated_at=now
+                )
+            )
+    stale_ids = [puzzle_id for solution, (puzzle_id, _) in existing.items() if solution not in in_file]
+
+    if inserts:
+        # A solution may already belong to another category; it can't be moved here
+        taken = set(
+            Puzzle.objects.filter(solution__in=[solution for solution, _, _ in inserts]).values_list(
+                "solution", flat=True
+            )
+        )
+        report.conflicts = len(taken)
+        for solution in sorted(taken):
+            report.error(f"{solution}: already a puzzle in another category")
+        inserts = [row for row in inserts if row[0] not in taken]
+
+    report.inserted = len(inserts)
+    report.updated = len(updates)
+    report.deleted = len(stale_ids) if delete else 0
+
+    if not dry_run and report.changed:
+        with transaction.atomic():
+            if updates:
+                Puzzle.objects.bulk_update(
+                    updates, ["clue", "par_score", "content_hash", "updated_at"], batch_size=batch_size
+                )
+            if delete:
+                for start in range(0, len(stale_ids), batch_size):
+                    Puzzle.objects.filter(id__in=stale_ids[start:start + batch_size]).delete()
+            if inserts:
+                first = PositionCounter.objects.reserve(category.id, len(inserts))
+                Puzzle.objects.bulk_create(
+                    [
+                        _new_puzzle(solution, clue, par_score, category, first + i)
+                        for i, (solution, clue, par_score) in enumerate(inserts)
+                    ],
+                    batch_size=batch_size,
+                )
+        invalidate_sampler(category.id)
+
+    report.seconds = time.monotonic() - started
+    logger.info(
+        f"Synced {category.slug} from {path}: {report.inserted} inserted, {report.updated} updated, "
+        f"{report.deleted} deleted, {report.unchanged} unchanged"
+    )
+    return report
+
+
+def _new_puzzle(solution, clue, par_score, category, position):
+    return Puzzle(
+        solution=solution,
+        clue=clue,
+        par_score=par_score,
+        category=category,
+        position=position,
+        content_hash=puzzle_content_hash(solution, clue, par_score),
+    )
+
+
+def copy_available():
+    """Whether the database connection can bulk load with COPY (PostgreSQL via psycopg2)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        return hasattr(cursor, "copy_expert")
+
+
+def _copy_puzzles(puzzles):
+    columns = ["solution", "clue", "par_score", "category_id", "created_at", "updated_at", "position", "content_hash"]
+    now = timezone.now()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for puzzle in puzzles:
+        writer.writerow([
+            puzzle.solution, puzzle.clue, puzzle.par_score, puzzle.category_id,
+            now.isoformat(), now.isoformat(), puzzle.position, puzzle.content_hash,
+        ])
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Puzzle._meta.db_table)
+    column_list = ", ".join(connection.ops.quote_name(column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
@@ -0,0 +1,150 @@
+"""
+Endless mode leaderboards.
+
+Ranks come from LeaderboardBucket, a per-category histogram of high scores
+that every submission updates incrementally. Endless scores are round counts,
+so a category has few distinct scores and a rank lookup only sums the
+buckets above the player's score, however many players there are.
+
+The top of each board is read straight off the (category, -high_score)
+index on EndlessScore and cached briefly per process.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .counters import lock_for_rebuild
+from .models import EndlessScore, LeaderboardBucket
+
+logger = logging.getLogger(__name__)
+
+TOP_LIMIT_DEFAULT = 10
+TOP_LIMIT_MAX = 100
+
+# The top of a board changes rarely; a short TTL bounds staleness across
+# processes, and local submissions that reach the top invalidate it at once.
+TOP_CACHE_SECONDS = 30
+
+
+def _top_cache_key(category_id):
+    return f"leaderboard:top:{category_id}"
+
+
+def _bump_bucket(category_id, score, delta):
+    buckets = LeaderboardBucket.objects.filter(category_id=category_id, score=score)
+    if delta < 0:
+        # Never go below zero if the histogram has drifted; a rebuild fixes it.
+        buckets = buckets.filter(players__gte=-delta)
+    updated = buckets.update(players=F("players") + delta)
+    if updated or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            LeaderboardBucket.objects.create(category_id=category_id, score=score, players=delta)
+    except IntegrityError:
+        # Another request created the bucket first; add to it instead.
+        LeaderboardBucket.objects.filter(category_id=category_id, score=score).update(
+            players=F("players") + delta
+        )
+
+
+def record_score_change(category_id, previous, high_score):
+    """
+    Move one player from the `previous` bucket to the `high_score` bucket.
+
+    `previous` is None for a player's first score in the category. Calls
+    where the score did not change are ignored.
+    """
+    if previous == high_score:
+        return
+
+    with transaction.atomic():
+        if previous is not None:
+            _bump_bucket(category_id, previous, -1)
+        _bump_bucket(category_id, high_score, 1)
+
+    cached = cache.get(_top_cache_key(category_id))
+    if cached is not None and (len(cached) < TOP_LIMIT_MAX or high_score >= cached[-1]["high_score"]):
+        cache.delete(_top_cache_key(category_id))
+
+
+def record_score_removed(category_id, high_score, players=1):
+    """Take `players` players with `high_score` off a category's board."""
+    _bump_bucket(category_id, high_score, -players)
+
+    cached = cache.get(_top_cache_key(category_id))
+    if cached is not None and (len(cached) < TOP_LIMIT_MAX or high_score >= cached[-1]["high_score"]):
+        cache.delete(_top_cache_key(category_id))
+
+
+def rank_for_score(category_id, score):
+    """
+    Return (rank, players) for `score` in a category.
+
+    Ties share a rank: the rank is one more than the number of players with
+    a strictly higher score.
+    """
+    totals = LeaderboardBucket.objects.filter(category_id=category_id).aggregate(
+        above=Sum("players", filter=Q(score__gt=score)),
+        players=Sum("players"),
+    )
+    return (totals["above"] or 0) + 1, totals["players"] or 0
+
+
+def top_scores(category_id, limit=TOP_LIMIT_DEFAULT):
+    """
+    Return the best `limit` entries of a category's board as dicts with
+    rank, username and high_score.
+    """
+    limit = max(1, min(limit, TOP_LIMIT_MAX))
+    key = _top_cache_key(category_id)
+    entries = cache.get(key)
+    if entries is None:
+        rows = (
+            EndlessScore.objects.filter(category_id=category_id, user__deleted_at__isnull=True)
+            .order_by("-high_score", "updated_at")
+            .values("user__username", "high_score")[:TOP_LIMIT_MAX]
+        )
+        entries = []
+        for i, row in enumerate(rows):
+            # Competition ranking: ties share the rank of the first of them.
+            if entries and entries[-1]["high_score"] == row["high_score"]:
+                rank = entries[-1]["rank"]
+            else:
+                rank = i + 1
+            entries.append({"rank": rank, "username": row["user__username"], "high_score": row["high_score"]})
+        cache.set(key, entries, TOP_CACHE_SECONDS)
+    return entries[:limit]
+
+
+def rebuild(categories=None):
+    """
+    Recompute the histogram from EndlessScore for `categories` (all if None).
+    Deleted users who haven't been purged yet are left out, as in ranks.
+
+    The bucket table is locked against writes before the scores are read
+    (see counters.lock_for_rebuild), so a submission either lands before the
+    recount and is counted by it, or waits and moves its player between the
+    rebuilt buckets. Returns the number of buckets written.
+    """
+    scores = EndlessScore.objects.filter(user__deleted_at__isnull=True)
+    buckets = LeaderboardBucket.objects.all()
+    if categories is not None:
+        scores = scores.filter(category__in=categories)
+        buckets = buckets.filter(category__in=categories)
+
+    rows = scores.values("category_id", "high_score").annotate(players=Count("id")).order_by()
+    with transaction.atomic():
+        lock_for_rebuild(LeaderboardBucket)
+        buckets.delete()
+        created = LeaderboardBucket.objects.bulk_create(
+            [
+                LeaderboardBucket(category_id=row["category_id"], score=row["high_score"], players=row["players"])
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+    logger.info(f"Rebuilt {len(created)} leaderboard buckets")
+    return len(created)
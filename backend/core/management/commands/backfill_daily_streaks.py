@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core import streaks
+
+
+class Command(BaseCommand):
+    help = 'Recompute every player\'s daily streak from their daily puzzle history'
+
+    def handle(self, *args, **options):
+        count = streaks.backfill(
+            progress=lambda written: self.stdout.write(f'Wrote streaks for {written} players...')
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully backfilled daily streaks for {count} players.'
+            )
+        )
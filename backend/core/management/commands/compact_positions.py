@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category
+from core import positions
+
+
+class Command(BaseCommand):
+    help = 'Renumber puzzle positions 1..n within each category, closing gaps left by deleted puzzles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slug',
+            action='append',
+            help='Only compact this category (can be given more than once)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report categories with gaps without renumbering them',
+        )
+
+    def handle(self, *args, **options):
+        categories = None
+        if options['slug']:
+            categories = list(Category.objects.filter(slug__in=options['slug']).order_by('id'))
+            missing = set(options['slug']) - {category.slug for category in categories}
+            if missing:
+                raise CommandError(f'Category not found: {", ".join(sorted(missing))}')
+
+        count = positions.compact_all(
+            categories,
+            dry_run=options['dry_run'],
+            on_category=lambda category, puzzles, high, unpositioned: self.stdout.write(
+                f'{category.slug}: {puzzles} puzzles, highest position {high}, {unpositioned} without a position'
+            ),
+        )
+
+        verb = 'Would compact' if options['dry_run'] else 'Successfully compacted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} categories.'))
@@ -0,0 +1,61 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category, Puzzle
+from core import dedup
+
+
+class Command(BaseCommand):
+    help = 'List puzzles whose solutions are near duplicates of each other'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slug',
+            action='append',
+            help='Only check puzzles in this category (can be given more than once)',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=dedup.SIMILARITY_THRESHOLD,
+            help=f'Minimum similarity, from 0 to 1, to report (default: {dedup.SIMILARITY_THRESHOLD})',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Most pairs to list (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('--threshold must be between 0 and 1')
+
+        puzzles = Puzzle.objects.all()
+        if options['slug']:
+            categories = list(Category.objects.filter(slug__in=options['slug']))
+            missing = set(options['slug']) - {category.slug for category in categories}
+            if missing:
+                raise CommandError(f'Category not found: {", ".join(sorted(missing))}')
+            puzzles = puzzles.filter(category__in=categories)
+
+        started = time.monotonic()
+        rows = list(puzzles.order_by('id').values_list('id', 'solution', 'category__slug'))
+        index = dedup.NearDuplicateIndex([solution for _, solution, _ in rows], threshold=options['threshold'])
+        pairs = list(index.pairs())
+        seconds = time.monotonic() - started
+
+        for first, second, similarity in pairs[:options['limit']]:
+            first_id, first_solution, first_slug = rows[first]
+            second_id, second_solution, second_slug = rows[second]
+            self.stdout.write(
+                f'{similarity:.2f}  #{first_id} {first_solution!r} ({first_slug})  ~  '
+                f'#{second_id} {second_solution!r} ({second_slug})'
+            )
+        if len(pairs) > options['limit']:
+            self.stdout.write(f'... and {len(pairs) - options["limit"]} more')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Found {len(pairs)} near-duplicate pairs among {len(rows)} puzzles in {seconds:.2f}s.'
+            )
+        )
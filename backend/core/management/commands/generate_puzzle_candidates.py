@@ -0,0 +1,116 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category, Puzzle
+from core import generation, importing
+
+
+class Command(BaseCommand):
+    help = 'Generate candidate puzzle solutions for target acronyms from a themed word list, as an import-ready CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('words', help='Word list file, one word per line (may be huge; it is streamed)')
+        parser.add_argument(
+            'acronyms',
+            nargs='*',
+            help='Target acronyms, e.g. LTME BRD',
+        )
+        parser.add_argument(
+            '--acronyms-file',
+            help='File with more target acronyms, one per line',
+        )
+        parser.add_argument(
+            '--output',
+            required=True,
+            help='CSV file to write (solution, clue, par_score, acronym, novelty columns)',
+        )
+        parser.add_argument(
+            '--clue',
+            required=True,
+            help='Clue written for every candidate, e.g. the theme',
+        )
+        parser.add_argument(
+            '--par-score',
+            type=int,
+            default=importing.DEFAULT_PAR_SCORE,
+            help=f'Par score written for every candidate (default: {importing.DEFAULT_PAR_SCORE})',
+        )
+        parser.add_argument(
+            '--per-acronym',
+            type=int,
+            default=generation.PER_ACRONYM_DEFAULT,
+            help=f'Most candidates per acronym (default: {generation.PER_ACRONYM_DEFAULT})',
+        )
+        parser.add_argument(
+            '--max-word-uses',
+            type=int,
+            default=generation.MAX_WORD_USES_DEFAULT,
+            help=f'Most candidates of one acronym a word may appear in (default: {generation.MAX_WORD_USES_DEFAULT})',
+        )
+        parser.add_argument(
+            '--slug',
+            help='Only score novelty against this category (default: every puzzle)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes that scan the word list and enumerate acronyms in parallel (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('per_acronym', 'max_word_uses', 'workers', 'par_score'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be at least 1')
+
+        acronyms = list(options['acronyms'])
+        if options['acronyms_file']:
+            try:
+                with open(options['acronyms_file'], encoding='utf-8') as f:
+                    acronyms += [line.strip() for line in f if line.strip()]
+            except OSError as e:
+                raise CommandError(f'Could not read {options["acronyms_file"]}: {e}')
+        acronyms = list(dict.fromkeys(acronym.upper() for acronym in acronyms))
+        if not acronyms:
+            raise CommandError('Give at least one target acronym')
+        invalid = [acronym for acronym in acronyms if len(acronym) < 2 or not acronym.isalnum()]
+        if invalid:
+            raise CommandError(f'Acronyms must be two or more letters or digits: {", ".join(invalid)}')
+
+        puzzles = Puzzle.objects.all()
+        if options['slug']:
+            try:
+                puzzles = puzzles.filter(category=Category.objects.get(slug=options['slug']))
+            except Category.DoesNotExist:
+                raise CommandError(f'Category not found: {options["slug"]}')
+        existing = list(puzzles.values_list('solution', flat=True))
+
+        started = time.monotonic()
+        counts = dict.fromkeys(acronyms, 0)
+        try:
+            with open(options['words'], encoding='utf-8') as words, \
+                    open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['solution', 'clue', 'par_score', 'acronym', 'novelty'])
+                for acronym, novelty, solution in generation.generate(
+                    words,
+                    acronyms,
+                    existing,
+                    per_acronym=options['per_acronym'],
+                    max_word_uses=options['max_word_uses'],
+                    workers=options['workers'],
+                    progress=lambda read: self.stdout.write(f'  {read} word list lines read...'),
+                ):
+                    writer.writerow([solution, options['clue'], options['par_score'], acronym, f'{novelty:.3f}'])
+                    counts[acronym] += 1
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for acronym, count in counts.items():
+            self.stdout.write(f'{acronym}: {count} candidates')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully wrote {sum(counts.values())} candidates for {len(acronyms)} acronyms '
+                f'to {options["output"]} in {time.monotonic() - started:.2f}s'
+            )
+        )
@@ -0,0 +1,125 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category
+from core import importing
+
+
+class Command(BaseCommand):
+    help = 'Bulk import puzzles from CSV files (solution, clue, par_score[, position] columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources',
+            nargs='+',
+            metavar='SLUG=PATH',
+            help='Category slug and CSV file to import into it, e.g. carta=core/carta_puzzles.csv',
+        )
+        parser.add_argument(
+            '--confirm',
+            action='store_true',
+            help='Confirm you want to import puzzles (not needed with --dry-run)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and report without writing anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importing.BATCH_SIZE_DEFAULT,
+            help=f'Puzzles written per transaction (default: {importing.BATCH_SIZE_DEFAULT})',
+        )
+        parser.add_argument(
+            '--keep-positions',
+            action='store_true',
+            help="Use the files' position column instead of appending after each category's last puzzle",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes that parse and validate files in parallel (default: 1)',
+        )
+        parser.add_argument(
+            '--allow-near-duplicates',
+            action='store_true',
+            help='Import solutions even when they are near duplicates of existing ones',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Always insert with bulk_create, even where PostgreSQL COPY is available',
+        )
+
+    def handle(self, *args, **options):
+        if not options['confirm'] and not options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(
+                    'This will import CSV puzzles. Use --confirm flag to proceed.'
+                )
+            )
+            return
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        sources = []
+        for source in options['sources']:
+            slug, sep, path = source.partition('=')
+            if not sep or not slug or not path:
+                raise CommandError(f'Expected SLUG=PATH, got: {source}')
+            sources.append((slug, path))
+
+        categories = Category.objects.in_bulk([slug for slug, _ in sources], field_name='slug')
+        missing = {slug for slug, _ in sources} - set(categories)
+        if missing:
+            raise CommandError(f'Category not found: {", ".join(sorted(missing))}')
+
+        importer = importing.PuzzleImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            use_copy=False if options['no_copy'] else None,
+            near_duplicates=not options['allow_near_duplicates'],
+        )
+        method = 'COPY' if importer.use_copy else 'bulk_create'
+        if options['dry_run']:
+            method = 'dry run'
+        self.stdout.write(
+            f'Importing {len(sources)} files ({method}, batches of {options["batch_size"]}, '
+            f'{options["workers"]} workers)'
+        )
+
+        started = time.monotonic()
+        reports = []
+        for report in importer.import_files(
+            [(path, categories[slug]) for slug, path in sources],
+            keep_positions=options['keep_positions'],
+            workers=options['workers'],
+        ):
+            reports.append(report)
+            self.write_report(report)
+
+        total = sum(report.imported for report in reports)
+        read = sum(report.read for report in reports)
+        seconds = time.monotonic() - started
+        rate = read / seconds if seconds else 0
+        verb = 'Would import' if options['dry_run'] else 'Successfully imported'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {total} puzzles from {read} rows in {seconds:.2f}s ({rate:,.0f} rows/sec)'
+            )
+        )
+
+    def write_report(self, report):
+        self.stdout.write(
+            f'{report.category.slug}: {report.imported} imported, {report.duplicates} duplicates, '
+            f'{report.near_duplicates} near duplicates, {report.invalid} invalid of {report.read} rows '
+            f'({report.seconds:.2f}s, {report.rows_per_second:,.0f} rows/sec)'
+        )
+        for message in report.errors:
+            self.stdout.write(self.style.ERROR(f'  {message}'))
+        if report.unreported:
+            self.stdout.write(self.style.ERROR(f'  ... and {report.unreported} more'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category, Puzzle
+from core import positions
+
+
+class Command(BaseCommand):
+    help = 'Add a puzzle at a position in its category, moving the puzzles from there on up by one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Category slug')
+        parser.add_argument('position', type=int, help='Position to insert at (past the end appends)')
+        parser.add_argument('solution', help='Full sentence solution')
+        parser.add_argument('clue', help='Clue to get the player started')
+        parser.add_argument(
+            '--par-score',
+            type=int,
+            default=5,
+            help='Par score (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            category = Category.objects.get(slug=options['slug'])
+        except Category.DoesNotExist:
+            raise CommandError(f'Category not found: {options["slug"]}')
+
+        if Puzzle.objects.filter(solution=options['solution']).exists():
+            raise CommandError(f'A puzzle with the solution "{options["solution"]}" already exists')
+
+        puzzle = Puzzle(
+            category=category,
+            solution=options['solution'],
+            clue=options['clue'],
+            par_score=options['par_score'],
+        )
+        position = positions.insert_at(puzzle, options['position'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully inserted "{puzzle.solution}" at position {position} in {category.slug}.'
+            )
+        )
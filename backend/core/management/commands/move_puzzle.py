@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category, Puzzle
+from core import positions
+
+
+class Command(BaseCommand):
+    help = 'Move a puzzle to another position in its category, shifting the puzzles in between'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Category slug')
+        parser.add_argument('from_position', type=int, help='Current position of the puzzle')
+        parser.add_argument('to_position', type=int, help='Position to move it to (past the end moves it last)')
+
+    def handle(self, *args, **options):
+        try:
+            category = Category.objects.get(slug=options['slug'])
+        except Category.DoesNotExist:
+            raise CommandError(f'Category not found: {options["slug"]}')
+
+        puzzle = Puzzle.objects.filter(category=category, position=options['from_position']).first()
+        if puzzle is None:
+            raise CommandError(f'No puzzle at position {options["from_position"]} in {category.slug}')
+
+        position = positions.move(puzzle, options['to_position'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully moved "{puzzle.solution}" from position {options["from_position"]} to {position}.'
+            )
+        )
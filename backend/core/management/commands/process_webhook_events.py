@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core import webhooks
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Clerk webhook events to the User table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=webhooks.BATCH_SIZE_DEFAULT,
+            help=f'Events applied per transaction (default: {webhooks.BATCH_SIZE_DEFAULT})',
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and poll for new events instead of exiting when the queue is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls with --watch (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            processed, failed = webhooks.drain(options['batch_size'])
+            if processed or failed:
+                self.stdout.write(f'Applied {processed} events, {failed} failed')
+            if not options['watch']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully applied {processed} webhook events.'
+            )
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import deletion
+
+
+class Command(BaseCommand):
+    help = 'Delete the data of users deleted in Clerk, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=deletion.BATCH_SIZE_DEFAULT,
+            help=f'Rows deleted per transaction (default: {deletion.BATCH_SIZE_DEFAULT})',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.05,
+            help='Seconds to sleep between batches (default: 0.05)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        count = deletion.purge_deleted(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            progress=lambda label, deleted: self.stdout.write(f'  {label}: {deleted} rows deleted'),
+            on_user=lambda user: self.stdout.write(f'Purging {user.clerk_id} (deleted {user.deleted_at})'),
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully purged {count} deleted users.'
+            )
+        )
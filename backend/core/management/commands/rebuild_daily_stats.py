@@ -0,0 +1,31 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import daily
+
+
+class Command(BaseCommand):
+    help = 'Recount daily puzzle stats from daily progress, restoring counts lost by killed workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only recount the last N days (default: every day)',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError('--days must be at least 1')
+            # The extra day covers players whose local date is still yesterday
+            since = timezone.now().date() - timedelta(days=options['days'])
+
+        count, completions = daily.rebuild_stats(since)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {count} daily stats rows from {completions} completions.'
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category
+from core import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild endless leaderboard histograms from the EndlessScore table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slug',
+            action='append',
+            help='Only rebuild this category (can be given more than once)',
+        )
+
+    def handle(self, *args, **options):
+        categories = None
+        if options['slug']:
+            categories = list(Category.objects.filter(slug__in=options['slug']))
+            missing = set(options['slug']) - {category.slug for category in categories}
+            if missing:
+                raise CommandError(f'Category not found: {", ".join(sorted(missing))}')
+
+        count = leaderboards.rebuild(categories)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {count} leaderboard buckets.'
+            )
+        )
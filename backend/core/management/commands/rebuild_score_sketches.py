@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from core import percentiles
+
+
+class Command(BaseCommand):
+    help = 'Rebuild levelup/daily guess count histograms from UserProgress'
+
+    def handle(self, *args, **options):
+        count, scanned = percentiles.rebuild_guess_counts()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {count} guess count buckets from {scanned} progress rows.'
+            )
+        )
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from core.models import Puzzle
+from core.models import PositionCounter, Puzzle
 
 
 class Command(BaseCommand):
@@ -23,6 +23,8 @@ class Command(BaseCommand):
 
         count = Puzzle.objects.count()
         Puzzle.objects.all().delete()
+        # Number the next import from 1 again
+        PositionCounter.objects.all().delete()
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category
+from core import daily
+
+
+class Command(BaseCommand):
+    help = 'Schedule daily puzzles ahead of time for every active system category'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Number of days to schedule (default: 30)',
+        )
+        parser.add_argument(
+            '--start',
+            type=str,
+            help='First day to schedule as YYYY-MM-DD (default: the earliest date any time zone is on)',
+        )
+        parser.add_argument(
+            '--slug',
+            action='append',
+            help='Only schedule this category (can be given more than once)',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        if options['start']:
+            try:
+                start = date.fromisoformat(options['start'])
+            except ValueError:
+                raise CommandError(f'Invalid --start date: {options["start"]}')
+        else:
+            start = daily.local_today(daily.MIN_OFFSET_HOURS)
+
+        categories = Category.objects.filter(creator__isnull=True, is_active=True)
+        if options['slug']:
+            categories = categories.filter(slug__in=options['slug'])
+
+        total = 0
+        for category in categories:
+            count = daily.schedule_category(category, start, options['days'])
+            total += count
+            self.stdout.write(f'Scheduled {count} days for {category.slug}')
+
+        end = start + timedelta(days=options['days'] - 1)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully scheduled {total} daily puzzles from {start} to {end}.'
+            )
+        )
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Category
+from core import importing
+
+
+class Command(BaseCommand):
+    help = "Sync a category's puzzles with a CSV file, changing only rows that differ"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Category to sync')
+        parser.add_argument('path', help='CSV file with solution, clue and par_score columns')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing anything',
+        )
+        parser.add_argument(
+            '--keep-missing',
+            action='store_true',
+            help='Keep puzzles that are no longer in the file instead of deleting them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importing.BATCH_SIZE_DEFAULT,
+            help=f'Rows per bulk statement (default: {importing.BATCH_SIZE_DEFAULT})',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        try:
+            category = Category.objects.get(slug=options['slug'])
+        except Category.DoesNotExist:
+            raise CommandError(f'Category not found: {options["slug"]}')
+
+        report = importing.sync_file(
+            options['path'],
+            category,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            delete=not options['keep_missing'],
+        )
+
+        for message in report.errors:
+            self.stdout.write(self.style.ERROR(f'  {message}'))
+        if report.unreported:
+            self.stdout.write(self.style.ERROR(f'  ... and {report.unreported} more'))
+
+        verb = 'Would sync' if options['dry_run'] else 'Successfully synced'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {category.slug}: {report.inserted} inserted, {report.updated} updated, '
+                f'{report.deleted} deleted, {report.unchanged} unchanged, '
+                f'{report.duplicates} duplicate and {report.invalid} invalid rows ({report.seconds:.2f}s)'
+            )
+        )
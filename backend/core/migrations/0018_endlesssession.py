@@ -0,0 +1,37 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_alter_userprogress_category_alter_userprogress_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EndlessSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('seed', models.BigIntegerField(help_text="Seed of this run's permutation of positions.")),
+                ('span', models.PositiveIntegerField(help_text='Highest puzzle position when the run started.')),
+                ('total', models.PositiveIntegerField(default=0, help_text='Number of puzzles when the run started.')),
+                ('cursor', models.PositiveIntegerField(default=0, help_text='Index of the next permutation slot to serve.')),
+                ('served', models.PositiveIntegerField(default=0, help_text='Number of puzzles already served.')),
+                ('seen', models.BinaryField(default=b'', help_text='Bitset of positions already served.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='endless_sessions', to='core.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='endless_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Endless Session',
+                'verbose_name_plural': 'Endless Sessions',
+                'indexes': [models.Index(fields=['user', 'category'], name='core_endles_user_id_38faa3_idx')],
+            },
+        ),
+    ]
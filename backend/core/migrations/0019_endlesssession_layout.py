@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_endlesssession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endlesssession',
+            name='layout',
+            field=models.JSONField(blank=True, default=list, help_text='For mixed runs: [category_id, span] pairs laid end to end in slot order.'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:28
+
+from django.db import migrations
+
+
+def create_mixed_category(apps, schema_editor):
+    """Create the hidden category that mixed endless scores are recorded under"""
+    Category = apps.get_model('core', 'Category')
+
+    Category.objects.get_or_create(
+        slug='mixed',
+        defaults={
+            'name': 'Mixed',
+            'description': 'Puzzles from every category, shuffled together.',
+            'emoji': '🔀',
+            'order': 1000,
+            # Kept inactive so it never shows up as a category of its own
+            'is_active': False,
+        },
+    )
+
+
+def delete_mixed_category(apps, schema_editor):
+    Category = apps.get_model('core', 'Category')
+    Category.objects.filter(slug='mixed', creator__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_endlesssession_layout'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_mixed_category, delete_mixed_category),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:30
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def build_leaderboard_buckets(apps, schema_editor):
+    """Seed the leaderboard histograms from existing endless scores"""
+    EndlessScore = apps.get_model('core', 'EndlessScore')
+    LeaderboardBucket = apps.get_model('core', 'LeaderboardBucket')
+
+    rows = EndlessScore.objects.values('category_id', 'high_score').annotate(players=Count('id')).order_by()
+    LeaderboardBucket.objects.bulk_create(
+        [
+            LeaderboardBucket(category_id=row['category_id'], score=row['high_score'], players=row['players'])
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_mixed_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endlessscore',
+            name='previous_high_score',
+            field=models.IntegerField(blank=True, help_text='High score before the latest submission, so leaderboards can apply exact deltas.', null=True),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField()),
+                ('players', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_buckets', to='core.category')),
+            ],
+            options={
+                'verbose_name': 'Leaderboard Bucket',
+                'verbose_name_plural': 'Leaderboard Buckets',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardbucket',
+            constraint=models.UniqueConstraint(fields=('category', 'score'), name='uq_leaderboard_category_score'),
+        ),
+        migrations.RunPython(build_leaderboard_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:31
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def build_guess_count_buckets(apps, schema_editor):
+    """Seed guess count histograms from existing levelup and daily progress"""
+    UserProgress = apps.get_model('core', 'UserProgress')
+    GuessCountBucket = apps.get_model('core', 'GuessCountBucket')
+
+    # Scores past the last bucket (100) share it
+    totals = {}
+    rows = (
+        UserProgress.objects.filter(game_mode__in=['levelup', 'daily'])
+        .values('category_id', 'game_mode', 'score')
+        .annotate(plays=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        key = (row['category_id'], row['game_mode'], min(max(row['score'], 0), 100))
+        totals[key] = totals.get(key, 0) + row['plays']
+
+    GuessCountBucket.objects.bulk_create(
+        [
+            GuessCountBucket(category_id=category_id, game_mode=game_mode, guesses=guesses, plays=plays)
+            for (category_id, game_mode, guesses), plays in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuessCountBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_mode', models.CharField(choices=[('levelup', 'Levels'), ('endless', 'Endless'), ('daily', 'Daily')], max_length=128)),
+                ('guesses', models.PositiveIntegerField()),
+                ('plays', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='guess_count_buckets', to='core.category')),
+            ],
+            options={
+                'verbose_name': 'Guess Count Bucket',
+                'verbose_name_plural': 'Guess Count Buckets',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='guesscountbucket',
+            constraint=models.UniqueConstraint(fields=('category', 'game_mode', 'guesses'), name='uq_guess_bucket_category_mode_guesses'),
+        ),
+        migrations.RunPython(build_guess_count_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_guesscountbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPuzzle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_puzzles', to='core.category')),
+                ('puzzle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_schedule', to='core.puzzle')),
+            ],
+            options={
+                'verbose_name': 'Daily Puzzle',
+                'verbose_name_plural': 'Daily Puzzles',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailypuzzle',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='uq_daily_puzzle_date_category'),
+        ),
+    ]
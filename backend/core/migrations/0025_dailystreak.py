@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_dailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.PositiveIntegerField(default=0)),
+                ('longest', models.PositiveIntegerField(default=0)),
+                ('last_played', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='daily_streak', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Streak',
+                'verbose_name_plural': 'Daily Streaks',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:38
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models, transaction
+from django.db.models import Max
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 10000
+
+
+def backfill_played_on(apps, schema_editor):
+    # Existing rows don't record the player's time zone, so use the UTC date.
+    # Each batch commits on its own to keep locks short on a large table.
+    UserProgress = apps.get_model('core', 'UserProgress')
+    last_id = UserProgress.objects.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic():
+            UserProgress.objects.filter(
+                id__gte=start, id__lt=start + BATCH_SIZE, played_on__isnull=True
+            ).update(played_on=TruncDate('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    # The backfill commits batch by batch, and the index is built
+    # concurrently so writes to the table aren't blocked while it builds
+    atomic = False
+
+    dependencies = [
+        ('core', '0025_dailystreak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='played_on',
+            field=models.DateField(blank=True, editable=False, help_text="The player's local date when this record was created. Never changes after insert.", null=True),
+        ),
+        migrations.RunPython(backfill_played_on, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='userprogress',
+            index=models.Index(condition=models.Q(('game_mode', 'daily')), fields=['user', 'played_on', 'category'], include=('puzzle', 'id'), name='idx_progress_daily_played_on'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_userprogress_played_on'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('svix_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=64)),
+                ('data', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Webhook Event',
+                'verbose_name_plural': 'Webhook Events',
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='idx_webhook_event_pending')],
+            },
+        ),
+    ]
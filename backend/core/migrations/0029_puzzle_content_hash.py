@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puzzle',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of solution, clue and par score; lets CSV syncs skip unchanged rows.', max_length=32),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:50
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def create_counters(apps, schema_editor):
+    Puzzle = apps.get_model("core", "Puzzle")
+    PositionCounter = apps.get_model("core", "PositionCounter")
+    PositionCounter.objects.bulk_create(
+        PositionCounter(category_id=category_id, last_position=last_position or 0)
+        for category_id, last_position in Puzzle.objects.order_by().values("category_id")
+        .annotate(last_position=Max("position"))
+        .values_list("category_id", "last_position")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_puzzle_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionCounter',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position_counter', serialize=False, to='core.category')),
+                ('last_position', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Position Counter',
+                'verbose_name_plural': 'Position Counters',
+            },
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+        # Positions come from the counters now. The global sequence from 0007
+        # was never used (Django always sends the column) and isn't per category.
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE core_puzzle ALTER COLUMN position DROP DEFAULT;
+                DROP SEQUENCE IF EXISTS core_puzzle_position_seq;
+            """,
+            reverse_sql="""
+                CREATE SEQUENCE IF NOT EXISTS core_puzzle_position_seq START WITH 1;
+                SELECT setval(
+                    'core_puzzle_position_seq',
+                    COALESCE((SELECT MAX(position) FROM core_puzzle), 1)
+                );
+                ALTER TABLE core_puzzle
+                ALTER COLUMN position SET DEFAULT nextval('core_puzzle_position_seq');
+            """,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_positioncounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='positioncounter',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped whenever puzzles are reordered in place, which changes no count or id.'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-19 07:44
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    # Existing puzzles haven't changed since they were created as far as
+    # anyone knows; without this every one of them would look new to the
+    # next incremental export.
+    Puzzle = apps.get_model("core", "Puzzle")
+    Puzzle.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_positioncounter_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puzzle',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
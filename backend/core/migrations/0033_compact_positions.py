@@ -0,0 +1,77 @@
+# Generated by Django 4.2.25 on 2026-10-19 09:12
+
+from django.db import migrations
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+
+def compact_positions(apps, schema_editor):
+    """
+    Renumber positions 1..n in every category that has gaps, the same way
+    positions.compact does: two UPDATEs over the table rather than a save
+    per puzzle.
+    """
+    Puzzle = apps.get_model('core', 'Puzzle')
+    PositionCounter = apps.get_model('core', 'PositionCounter')
+    table = schema_editor.quote_name(Puzzle._meta.db_table)
+
+    stats = Puzzle.objects.order_by().values('category_id').annotate(
+        count=Count('id'), positioned=Count('position'), high=Max('position')
+    )
+    gapped = {
+        row['category_id']: row
+        for row in stats
+        if row['count'] != (row['high'] or 0) or row['count'] != row['positioned']
+    }
+    if not gapped:
+        return
+
+    # Lift the affected rows clear of both the current positions and the new
+    # ones (puzzles without a position push those past the highest), so the
+    # renumbering never collides with the (category, position) constraint
+    # halfway through.
+    lift = max(max(row['high'] or 0, row['count']) for row in gapped.values())
+    ids = list(gapped)
+    placeholders = ', '.join(['%s'] * len(ids))
+    schema_editor.execute(
+        f"UPDATE {table} SET position = position + %s WHERE category_id IN ({placeholders})",
+        [lift, *ids],
+    )
+    schema_editor.execute(
+        f"""
+        UPDATE {table} SET position = ranked.new_position, updated_at = %s
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY category_id ORDER BY position IS NULL, position, id
+            ) AS new_position
+            FROM {table}
+            WHERE category_id IN ({placeholders})
+        ) AS ranked
+        WHERE {table}.id = ranked.id
+        """,
+        [timezone.now(), *ids],
+    )
+
+    # Bump each counter's version too, so endless samplers built on the old
+    # order are thrown away.
+    counted = set(PositionCounter.objects.filter(category_id__in=ids).values_list('category_id', flat=True))
+    for category_id, row in gapped.items():
+        PositionCounter.objects.filter(category_id=category_id).update(
+            last_position=row['count'], version=F('version') + 1
+        )
+    PositionCounter.objects.bulk_create(
+        PositionCounter(category_id=category_id, last_position=row['count'])
+        for category_id, row in gapped.items()
+        if category_id not in counted
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_puzzle_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_positions, migrations.RunPython.noop),
+    ]
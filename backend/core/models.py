@@ -1,10 +1,13 @@
 # core/models.py
-from django.db import models
+import uuid
+from django.db import connections, models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.conf import settings
-from django.db.models import Max
+from django.db.models import F, Max
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Q
+from .text import puzzle_content_hash
 
 # This manager tells Django how to handle creating users with our custom model.
 class UserManager(BaseUserManager):
@@ -74,6 +77,10 @@ class User(AbstractBaseUser):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
 
+    # Set when the user is deleted in Clerk; their data is removed later in
+    # batches by the purge_deleted_users command (see core.deletion)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
     # Use email as login identifier
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']  # Required when creating superuser
@@ -123,7 +130,15 @@ class Puzzle(models.Model):
         related_name='puzzles'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     position = models.PositiveIntegerField(null=True)
+    content_hash = models.CharField(
+        max_length=32,
+        blank=True,
+        default="",
+        editable=False,
+        help_text="Hash of solution, clue and par score; lets CSV syncs skip unchanged rows."
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -132,12 +147,119 @@ class Puzzle(models.Model):
     def __str__(self):
         return f"{self.solution} ({self.category.name})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_position = instance._position_key()
+        return instance
+
+    def _position_key(self):
+        fields = self.__dict__
+        return fields.get("category_id"), fields.get("position")
+
     def save(self, *args, **kwargs):
+        self.content_hash = puzzle_content_hash(self.solution, self.clue, self.par_score)
         if self.position is None:
-            max_pos = Puzzle.objects.filter(category=self.category).aggregate(Max("position"))["position__max"] or 0
-            self.position = max_pos + 1
+            self.position = PositionCounter.objects.reserve(self.category_id)
+        elif self._state.adding or self._position_key() != getattr(self, "_saved_position", None):
+            # Keep the counter ahead of positions chosen by hand; edits that
+            # leave the position alone don't need the extra UPDATE
+            PositionCounter.objects.advance_to(self.category_id, self.position)
 
         super().save(*args, **kwargs)
+        self._saved_position = self._position_key()
+
+class PositionCounterManager(models.Manager):
+    """
+    Manager that hands out puzzle positions from per-category counter rows.
+    """
+
+    def reserve(self, category_id, count=1):
+        """
+        Reserve `count` consecutive positions after the last one handed out
+        in the category and return the first of them.
+
+        On PostgreSQL and SQLite this is one UPDATE ... RETURNING statement.
+        The counter row stays locked until the caller's transaction ends, so
+        concurrent inserts into a category queue behind each other instead
+        of colliding on (category, position). Positions reserved by a
+        transaction that rolls back are not reused, which leaves gaps.
+        """
+        connection = connections[self.db]
+        if not connection.features.can_return_columns_from_insert:
+            return self._reserve_locked(category_id, count)
+
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = f"""
+            UPDATE {table} SET last_position = last_position + %s
+            WHERE category_id = %s
+            RETURNING last_position
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [count, category_id])
+            row = cursor.fetchone()
+            if row is None:
+                self._create_counter(category_id)
+                cursor.execute(sql, [count, category_id])
+                row = cursor.fetchone()
+        return row[0] - count + 1
+
+    def advance_to(self, category_id, position):
+        """Make sure `position` is never handed out by reserve()."""
+        self.filter(category_id=category_id, last_position__lt=position).update(last_position=position)
+
+    def bump_version(self, category_id):
+        """Record that the category's puzzles were reordered (see PositionCounter.version)."""
+        self.filter(category_id=category_id).update(version=F("version") + 1)
+
+    def _create_counter(self, category_id):
+        # First allocation in this category: start after its current puzzles.
+        # A concurrent first allocation may create the row first; either way
+        # it starts from the same place.
+        last_position = Puzzle.objects.filter(category_id=category_id).aggregate(Max("position"))["position__max"]
+        self.bulk_create(
+            [PositionCounter(category_id=category_id, last_position=last_position or 0)],
+            ignore_conflicts=True,
+        )
+
+    def _reserve_locked(self, category_id, count):
+        with transaction.atomic(using=self.db):
+            counter = self.select_for_update().filter(category_id=category_id).first()
+            if counter is None:
+                self._create_counter(category_id)
+                counter = self.select_for_update().get(category_id=category_id)
+            counter.last_position += count
+            counter.save(update_fields=["last_position"])
+        return counter.last_position - count + 1
+
+class PositionCounter(models.Model):
+    """
+    The last puzzle position handed out in a category.
+
+    New puzzles take their positions from here (see PositionCounterManager)
+    rather than from MAX(position), so an insert costs one primary key update
+    however many puzzles the category has.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="position_counter"
+    )
+    last_position = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped whenever puzzles are reordered in place, which changes no count or id."
+    )
+
+    objects = PositionCounterManager()
+
+    class Meta:
+        verbose_name = "Position Counter"
+        verbose_name_plural = "Position Counters"
+
+    def __str__(self):
+        return f"{self.category_id}: {self.last_position}"
 
 class UserProgress(models.Model):
     """
@@ -183,13 +305,27 @@ class UserProgress(models.Model):
         auto_now=True, # Automatically updates on every save
         help_text="The date and time this record was last updated."
     )
+    played_on = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The player's local date when this record was created. Never changes after insert."
+    )
 
     class Meta:
         # This prevents duplicate entries for the same user on the same puzzle
         # or for the same user's endless score in the same category.
         indexes = [
             models.Index(fields=["user", "game_mode"]),
-            models.Index(fields=["puzzle", "game_mode"])
+            models.Index(fields=["puzzle", "game_mode"]),
+            # Covers "has this player done today's daily puzzle" lookups, so
+            # they are answered from the index alone on PostgreSQL.
+            models.Index(
+                fields=["user", "played_on", "category"],
+                include=["puzzle", "id"],
+                condition=Q(game_mode='daily'),
+                name="idx_progress_daily_played_on"
+            )
         ]
         constraints = [
             models.UniqueConstraint(
@@ -199,6 +335,13 @@ class UserProgress(models.Model):
             )
         ]
 
+    def save(self, *args, **kwargs):
+        # Callers that know the player's time zone pass played_on; fall back
+        # to the UTC date. Only set on insert, unlike the auto_now timestamp.
+        if self._state.adding and self.played_on is None:
+            self.played_on = timezone.now().date()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.game_mode == self.GameMode.ENDLESS:
             return f"{self.user.username} - {self.category.name} Endless: {self.score}"
@@ -206,6 +349,72 @@ class UserProgress(models.Model):
             return f"{self.user.username} - {self.puzzle} ({self.game_mode}): {self.score}"
         return f"{self.user.username} - Progress Record {self.pk}"
 
+class EndlessScoreManager(models.Manager):
+    """
+    Manager that records endless high scores without read-modify-write round trips.
+    """
+    # Scalar "larger of two values" function per database vendor.
+    GREATEST_FUNCTIONS = {
+        'postgresql': 'GREATEST',
+        'sqlite': 'MAX',
+    }
+
+    def record_high_score(self, user, category, score):
+        """
+        Store `score` for (user, category) if it beats the current high score.
+
+        On PostgreSQL and SQLite this is one INSERT ... ON CONFLICT DO UPDATE
+        statement that keeps the larger score and returns it, so concurrent
+        submissions never lock or overwrite each other. Other databases fall
+        back to a locked get_or_create.
+
+        Returns a (previous, high_score) tuple: the high score before this
+        write (None if there was no row yet) and the high score after it.
+        """
+        connection = connections[self.db]
+        greatest = self.GREATEST_FUNCTIONS.get(connection.vendor)
+        if greatest is None or not connection.features.can_return_columns_from_insert:
+            return self._record_high_score_locked(user, category, score)
+
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        now = timezone.now()
+        # Every SET expression sees the row as it was before this statement,
+        # so previous_high_score captures the exact old value atomically.
+        sql = f"""
+            INSERT INTO {table} (user_id, category_id, high_score, previous_high_score, created_at, updated_at)
+            VALUES (%s, %s, %s, NULL, %s, %s)
+            ON CONFLICT (user_id, category_id) DO UPDATE SET
+                high_score = {greatest}({table}.high_score, EXCLUDED.high_score),
+                previous_high_score = {table}.high_score,
+                updated_at = CASE
+                    WHEN EXCLUDED.high_score > {table}.high_score THEN EXCLUDED.updated_at
+                    ELSE {table}.updated_at
+                END
+            RETURNING previous_high_score, high_score
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, category.pk, score, now, now])
+            previous, high_score = cursor.fetchone()
+        return previous, high_score
+
+    def _record_high_score_locked(self, user, category, score):
+        with transaction.atomic(using=self.db):
+            row, created = self.select_for_update().get_or_create(
+                user=user, category=category, defaults={"high_score": score}
+            )
+            previous = None if created else row.high_score
+
+            # If record exists and new score is higher, update it
+            if not created:
+                row.previous_high_score = row.high_score
+                update_fields = ["previous_high_score"]
+                if score > row.high_score:
+                    row.high_score = score
+                    update_fields += ["high_score", "updated_at"]
+                row.save(update_fields=update_fields)
+
+        return previous, row.high_score
+
 class EndlessScore(models.Model):
     user = models.ForeignKey(
         User,
@@ -218,9 +427,16 @@ class EndlessScore(models.Model):
         related_name="endless_scores"
     )
     high_score = models.IntegerField(default=0)
+    previous_high_score = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="High score before the latest submission, so leaderboards can apply exact deltas."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EndlessScoreManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -235,4 +451,221 @@ class EndlessScore(models.Model):
         verbose_name_plural = "Endless Scores"
     
     def __str__(self):
-        return f"{self.user_id}:{self.category_id} -> {self.high_score}"
\ No newline at end of file
+        return f"{self.user_id}:{self.category_id} -> {self.high_score}"
+
+class LeaderboardBucket(models.Model):
+    """
+    Number of players whose endless high score in a category is exactly `score`.
+
+    Kept in step with EndlessScore on every submission, so a player's rank is
+    a sum over the (few) distinct scores above theirs instead of a count over
+    every player.
+    """
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_buckets"
+    )
+    score = models.IntegerField()
+    players = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "score"],
+                name="uq_leaderboard_category_score"
+            )
+        ]
+        verbose_name = "Leaderboard Bucket"
+        verbose_name_plural = "Leaderboard Buckets"
+
+    def __str__(self):
+        return f"{self.category_id}: {self.score} x {self.players}"
+
+class EndlessSession(models.Model):
+    """
+    Server-side state for one endless run: which positions have been served
+    and how far the run has walked through its shuffled permutation.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="endless_sessions"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="endless_sessions"
+    )
+    seed = models.BigIntegerField(help_text="Seed of this run's permutation of positions.")
+    span = models.PositiveIntegerField(help_text="Highest puzzle position when the run started.")
+    total = models.PositiveIntegerField(default=0, help_text="Number of puzzles when the run started.")
+    cursor = models.PositiveIntegerField(default=0, help_text="Index of the next permutation slot to serve.")
+    served = models.PositiveIntegerField(default=0, help_text="Number of puzzles already served.")
+    seen = models.BinaryField(default=b"", help_text="Bitset of positions already served.")
+    layout = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="For mixed runs: [category_id, span] pairs laid end to end in slot order."
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "category"])
+        ]
+        verbose_name = "Endless Session"
+        verbose_name_plural = "Endless Sessions"
+
+    def __str__(self):
+        return f"{self.user_id}:{self.category_id} session {self.pk} ({self.served} served)"
+
+class GuessCountBucket(models.Model):
+    """
+    Number of levelup or daily completions in a category that took `guesses` guesses.
+
+    Backs the "you beat X% of players" percentiles. Rows are only ever moved
+    by additive flushes (plays = plays + delta), so several processes can
+    write to them without losing counts.
+    """
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="guess_count_buckets"
+    )
+    game_mode = models.CharField(max_length=128, choices=UserProgress.GameMode.choices)
+    guesses = models.PositiveIntegerField()
+    plays = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "game_mode", "guesses"],
+                name="uq_guess_bucket_category_mode_guesses"
+            )
+        ]
+        verbose_name = "Guess Count Bucket"
+        verbose_name_plural = "Guess Count Buckets"
+
+    def __str__(self):
+        return f"{self.category_id}/{self.game_mode}: {self.guesses} guesses x {self.plays}"
+
+class DailyPuzzle(models.Model):
+    """
+    The puzzle scheduled as a category's daily puzzle on a given date.
+
+    Generated ahead of time (see the schedule_daily_puzzles command) so the
+    daily endpoint is a single indexed lookup and the puzzle stays the same
+    all day, even if puzzles are imported in the meantime.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="daily_puzzles"
+    )
+    puzzle = models.ForeignKey(
+        Puzzle,
+        on_delete=models.CASCADE,
+        related_name="daily_schedule"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "category"],
+                name="uq_daily_puzzle_date_category"
+            )
+        ]
+        verbose_name = "Daily Puzzle"
+        verbose_name_plural = "Daily Puzzles"
+
+    def __str__(self):
+        return f"{self.date} {self.category_id} -> {self.puzzle_id}"
+
+class DailyStats(models.Model):
+    """
+    How many players finished a category's daily puzzle on `date` in exactly
+    `guesses` guesses.
+
+    Written only by additive flushes (completions = completions + delta) of
+    per-process counters, so multiple workers never lose counts.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="daily_stats"
+    )
+    guesses = models.PositiveIntegerField()
+    completions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "category", "guesses"],
+                name="uq_daily_stats_date_category_guesses"
+            )
+        ]
+        verbose_name = "Daily Stats"
+        verbose_name_plural = "Daily Stats"
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}: {self.guesses} guesses x {self.completions}"
+
+class DailyStreak(models.Model):
+    """
+    A player's run of consecutive days with at least one daily puzzle solved.
+
+    Updated in place on every daily completion (see core.streaks), so reading
+    a streak never scans the player's history. `current` is the streak as of
+    `last_played`; it counts as broken once a whole day passes without play.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="daily_streak"
+    )
+    current = models.PositiveIntegerField(default=0)
+    longest = models.PositiveIntegerField(default=0)
+    last_played = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Daily Streak"
+        verbose_name_plural = "Daily Streaks"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.current} (best {self.longest}, last {self.last_played})"
+
+class WebhookEvent(models.Model):
+    """
+    A verified Clerk webhook, queued for the process_webhook_events command.
+
+    Keyed by the svix-id header, so redelivered webhooks are stored once and
+    never applied twice.
+    """
+    svix_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=64)
+    data = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Only the pending events are ever scanned by the worker
+            models.Index(
+                fields=["id"],
+                condition=Q(processed_at__isnull=True),
+                name="idx_webhook_event_pending"
+            )
+        ]
+        verbose_name = "Webhook Event"
+        verbose_name_plural = "Webhook Events"
+
+    def __str__(self):
+        return f"{self.svix_id} {self.event_type}"
@@ -0,0 +1,197 @@
+"""
+"You beat X% of players" percentiles per category and game mode.
+
+Each process keeps a fixed-bucket histogram (a ScoreSketch) per category and
+game mode in memory, so a percentile lookup never touches the database.
+Sketches are loaded lazily, reloaded every few minutes to pick up other
+processes' writes, and updated in place on every local write.
+
+- Endless sketches hold players' high scores and are loaded from the
+  leaderboard histogram, which is already persisted on every submission.
+- Levelup and daily sketches hold guess counts per completion. They are
+  persisted to GuessCountBucket through buffered additive flushes.
+"""
+import logging
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Greatest, Least
+
+from .counters import BufferedCounters, increment_rows, lock_for_rebuild
+from .models import GuessCountBucket, LeaderboardBucket, UserProgress
+
+logger = logging.getLogger(__name__)
+
+# Values at or above the last bucket share it.
+SKETCH_BUCKETS = 101
+
+# How long a process trusts its sketch before reloading it.
+SKETCH_TTL_SECONDS = 300
+
+GUESS_MODES = (UserProgress.GameMode.LEVELS, UserProgress.GameMode.DAILY)
+
+
+def bucket_for(value):
+    return min(max(int(value), 0), SKETCH_BUCKETS - 1)
+
+
+class ScoreSketch:
+    """Fixed-bucket histogram with cached cumulative counts."""
+
+    def __init__(self):
+        self.counts = [0] * SKETCH_BUCKETS
+        self.loaded_at = time.monotonic()
+        self._cumulative = None
+
+    def add(self, value, delta=1):
+        bucket = bucket_for(value)
+        self.counts[bucket] = max(self.counts[bucket] + delta, 0)
+        self._cumulative = None
+
+    def _cumulative_counts(self):
+        if self._cumulative is None:
+            running, cumulative = 0, []
+            for count in self.counts:
+                running += count
+                cumulative.append(running)
+            self._cumulative = cumulative
+        return self._cumulative
+
+    @property
+    def total(self):
+        return self._cumulative_counts()[-1]
+
+    def below(self, value):
+        """Number of samples in buckets strictly below `value`'s bucket."""
+        bucket = bucket_for(value)
+        return self._cumulative_counts()[bucket - 1] if bucket else 0
+
+    def above(self, value):
+        """Number of samples in buckets strictly above `value`'s bucket."""
+        return self.total - self._cumulative_counts()[bucket_for(value)]
+
+
+def _flush_guess_counts(deltas):
+    increment_rows(GuessCountBucket, ("category_id", "game_mode", "guesses"), "plays", deltas)
+
+
+guess_counts = BufferedCounters("guess count", _flush_guess_counts)
+
+_sketches = {}
+_lock = threading.Lock()
+
+
+def _load_sketch(category_id, game_mode):
+    sketch = ScoreSketch()
+    if game_mode == UserProgress.GameMode.ENDLESS:
+        rows = LeaderboardBucket.objects.filter(category_id=category_id).values_list("score", "players")
+    else:
+        rows = GuessCountBucket.objects.filter(
+            category_id=category_id, game_mode=game_mode
+        ).values_list("guesses", "plays")
+        # Include this process's counts that have not been flushed yet.
+        for (pending_category, pending_mode, guesses), delta in guess_counts.pending_items():
+            if pending_category == category_id and pending_mode == game_mode:
+                sketch.add(guesses, delta)
+
+    for value, count in rows:
+        sketch.add(value, count)
+    return sketch
+
+
+def get_sketch(category_id, game_mode):
+    key = (category_id, game_mode)
+    with _lock:
+        sketch = _sketches.get(key)
+    if sketch is None or time.monotonic() - sketch.loaded_at > SKETCH_TTL_SECONDS:
+        sketch = _load_sketch(category_id, game_mode)
+        with _lock:
+            _sketches[key] = sketch
+    return sketch
+
+
+def _update_loaded(category_id, game_mode, value, delta):
+    # Only sketches that are already in memory need patching; anything else
+    # will see the write when it is loaded.
+    with _lock:
+        sketch = _sketches.get((category_id, game_mode))
+        if sketch is not None:
+            sketch.add(value, delta)
+
+
+def record_endless(category_id, previous, high_score):
+    """Move a player between high score buckets in this process's endless sketch."""
+    if previous == high_score:
+        return
+    if previous is not None:
+        _update_loaded(category_id, UserProgress.GameMode.ENDLESS, previous, -1)
+    _update_loaded(category_id, UserProgress.GameMode.ENDLESS, high_score, 1)
+
+
+def record_guesses(category_id, game_mode, guesses):
+    """Count one levelup or daily completion that took `guesses` guesses."""
+    if game_mode not in GUESS_MODES:
+        return
+    _update_loaded(category_id, game_mode, guesses, 1)
+    guess_counts.add((category_id, game_mode, bucket_for(guesses)))
+
+
+def beat_percent(category_id, game_mode, score):
+    """
+    Return the percentage of other results that `score` beats, or None if
+    nobody else has played yet.
+
+    Higher is better in endless mode; fewer guesses are better otherwise.
+    The caller's own result is assumed to be in the sketch already.
+    """
+    if game_mode != UserProgress.GameMode.ENDLESS and game_mode not in GUESS_MODES:
+        return None
+
+    sketch = get_sketch(category_id, game_mode)
+    others = sketch.total - 1
+    if others <= 0:
+        return None
+
+    if game_mode == UserProgress.GameMode.ENDLESS:
+        beaten = sketch.below(score)
+    else:
+        beaten = sketch.above(score)
+    return round(100 * min(beaten, others) / others, 1)
+
+
+def rebuild_guess_counts():
+    """
+    Recompute GuessCountBucket from UserProgress. Returns (buckets written,
+    progress rows counted).
+
+    Counting is one GROUP BY in the database. The bucket table is locked
+    against writes for the whole rebuild (see counters.lock_for_rebuild), so
+    flushes from live workers wait and then add to the rebuilt rows instead
+    of racing the delete and reinsert. Completions a worker has buffered but
+    not yet flushed (at most FLUSH_INTERVAL_SECONDS worth) are counted by
+    the rebuild and again by their flush.
+    """
+    with transaction.atomic():
+        lock_for_rebuild(GuessCountBucket)
+        GuessCountBucket.objects.all().delete()
+
+        rows = (
+            UserProgress.objects.filter(game_mode__in=GUESS_MODES)
+            .annotate(bucket=Least(Greatest("score", 0), SKETCH_BUCKETS - 1))
+            .values("category_id", "game_mode", "bucket")
+            .annotate(plays=Count("id"))
+            .order_by()
+        )
+        buckets = [
+            GuessCountBucket(
+                category_id=row["category_id"], game_mode=row["game_mode"], guesses=row["bucket"], plays=row["plays"]
+            )
+            for row in rows
+        ]
+        GuessCountBucket.objects.bulk_create(buckets, batch_size=1000)
+
+    scanned = sum(bucket.plays for bucket in buckets)
+    logger.info(f"Rebuilt {len(buckets)} guess count buckets from {scanned} progress rows")
+    return len(buckets), scanned
@@ -0,0 +1,197 @@
+"""
+Set-based maintenance of puzzle positions.
+
+Positions are unique per category, and the database checks that constraint
+row by row while an UPDATE runs, so renumbering rows in place can collide
+with a row that hasn't moved yet. Every renumbering here first lifts the
+affected rows clear of every position in use or about to be written, with
+one constant offset, then writes their final positions in a second
+statement, so a whole category is renumbered, or a range shifted to insert
+or move a puzzle, in two statements whatever its size. The second statement
+also sets updated_at, which raw UPDATEs don't do on their own, so
+incremental exports pick up the new positions.
+
+Puzzle ids never change, so players' progress and the daily schedule keep
+pointing at the same puzzles.
+"""
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Category, PositionCounter, Puzzle
+from .sampling import invalidate_sampler
+
+logger = logging.getLogger(__name__)
+
+
+def _table():
+    return connection.ops.quote_name(Puzzle._meta.db_table)
+
+
+def _lock_category(category_id):
+    # Reserving nothing still locks the category's counter row, which keeps
+    # new puzzles out of the category until the caller's transaction ends.
+    PositionCounter.objects.reserve(category_id, 0)
+
+
+def _high(category_id):
+    return Puzzle.objects.filter(category_id=category_id).aggregate(Max("position"))["position__max"] or 0
+
+
+def _reordered(category_id):
+    # Raw UPDATEs send no post_save, and a reorder changes no count or id,
+    # so other processes' samplers only notice through the version bump.
+    PositionCounter.objects.bump_version(category_id)
+    transaction.on_commit(lambda: invalidate_sampler(category_id))
+
+
+def _shift(category_id, first, last, delta, high, puzzle_id=None, position=None):
+    """
+    Add `delta` to the positions first..last of a category whose highest
+    position is `high`. If given, `puzzle_id` (which must be in that range)
+    goes to `position` instead.
+    """
+    table = _table()
+    offset = high + 1
+    settle = "position - %s"
+    params = [offset - delta]
+    if puzzle_id is not None:
+        settle = "CASE WHEN id = %s THEN %s ELSE position - %s END"
+        params = [puzzle_id, position] + params
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET position = position + %s "
+            f"WHERE category_id = %s AND position BETWEEN %s AND %s",
+            [offset, category_id, first, last],
+        )
+        cursor.execute(
+            f"UPDATE {table} SET position = {settle}, updated_at = %s WHERE category_id = %s AND position > %s",
+            params + [timezone.now(), category_id, high],
+        )
+
+
+def insert_at(puzzle, position):
+    """
+    Save the new `puzzle` at `position` in its category, moving the puzzle
+    there and every one after it up by one. Positions past the end append.
+    Returns the position the puzzle was saved at.
+    """
+    category_id = puzzle.category_id
+    with transaction.atomic():
+        _lock_category(category_id)
+        high = _high(category_id)
+        position = min(max(position, 1), high + 1)
+        if position <= high:
+            _shift(category_id, position, high, 1, high)
+            _reordered(category_id)
+        puzzle.position = position
+        puzzle.save()
+        PositionCounter.objects.advance_to(category_id, high + 1)
+
+    logger.info(f"Inserted puzzle {puzzle.id} at position {position} in category {category_id}")
+    return position
+
+
+def move(puzzle, position):
+    """
+    Move `puzzle` to `position` in its category, shifting the puzzles in
+    between by one to make room. Positions past the end move it to the end.
+    Returns the position the puzzle ended up at.
+    """
+    category_id = puzzle.category_id
+    with transaction.atomic():
+        _lock_category(category_id)
+        current = Puzzle.objects.filter(id=puzzle.id).values_list("position", flat=True).get()
+        if current is None:
+            raise ValueError(f"Puzzle {puzzle.id} has no position; run compact_positions first")
+        high = _high(category_id)
+        position = min(max(position, 1), high)
+        if position < current:
+            _shift(category_id, position, current, 1, high, puzzle.id, position)
+        elif position > current:
+            _shift(category_id, current, position, -1, high, puzzle.id, position)
+        if position != current:
+            _reordered(category_id)
+
+    puzzle.position = position
+    logger.info(f"Moved puzzle {puzzle.id} from position {current} to {position} in category {category_id}")
+    return position
+
+
+def gaps(category_id):
+    """
+    Return (puzzles, highest position, unpositioned puzzles) for a category.
+    It is compact when the first equals the second and the last is 0.
+    """
+    stats = Puzzle.objects.filter(category_id=category_id).aggregate(
+        count=Count("id"), positioned=Count("position"), high=Max("position")
+    )
+    return stats["count"], stats["high"] or 0, stats["count"] - stats["positioned"]
+
+
+def compact(category_id):
+    """
+    Renumber a category's puzzles 1..n in their current order, closing the
+    gaps deleted puzzles leave behind. Puzzles without a position go last.
+
+    Puzzle ids don't change, so players' progress and the daily schedule are
+    unaffected; endless runs in progress may see a puzzle twice. Returns the
+    number of puzzles renumbered, 0 if the category was already compact.
+    """
+    table = _table()
+    with transaction.atomic():
+        _lock_category(category_id)
+        count, high, unpositioned = gaps(category_id)
+        if count == high and not unpositioned:
+            return 0
+
+        # New positions run up to `count`, which puzzles without a position
+        # push past `high`; lifted rows must clear both.
+        lift = max(high, count)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET position = position + %s WHERE category_id = %s",
+                [lift, category_id],
+            )
+            cursor.execute(
+                f"""
+                UPDATE {table} SET position = ranked.new_position, updated_at = %s
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY position IS NULL, position, id) AS new_position
+                    FROM {table}
+                    WHERE category_id = %s
+                ) AS ranked
+                WHERE {table}.id = ranked.id
+                """,
+                [timezone.now(), category_id],
+            )
+        PositionCounter.objects.filter(category_id=category_id).update(last_position=count)
+        _reordered(category_id)
+
+    logger.info(f"Compacted {count} puzzle positions in category {category_id} (highest was {high})")
+    return count
+
+
+def compact_all(categories=None, dry_run=False, on_category=None):
+    """
+    Compact every category (or just `categories`), each in its own
+    transaction. `on_category`, if given, is called with (category, puzzles,
+    highest position, unpositioned puzzles) before each one is compacted.
+    Returns the number of categories that had gaps.
+    """
+    if categories is None:
+        categories = Category.objects.order_by("id")
+
+    changed = 0
+    for category in categories:
+        count, high, unpositioned = gaps(category.id)
+        if count == high and not unpositioned:
+            continue
+        if on_category:
+            on_category(category, count, high, unpositioned)
+        if not dry_run:
+            compact(category.id)
+        changed += 1
+    return changed
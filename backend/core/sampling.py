@@ -0,0 +1,192 @@
+"""
+Difficulty-weighted puzzle sampling for endless mode.
+
+Each category gets a small set of Walker alias tables, one per difficulty
+tier, so a weighted draw is O(1) no matter how many puzzles the category
+holds. Tables are built lazily per process and rebuilt when the category's
+puzzle set changes.
+"""
+import math
+import random
+import time
+
+from django.db.models import Avg, Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PositionCounter, Puzzle, UserProgress
+
+# Rounds are grouped into tiers; each tier shifts the weight curve towards
+# harder puzzles until the last tier, which is used for every later round.
+ROUNDS_PER_TIER = 5
+MAX_TIER = 5
+
+# Width of the bell curve around each tier's target difficulty.
+DIFFICULTY_SPREAD = 0.2
+
+# Every puzzle keeps at least this weight so none become unreachable.
+MIN_WEIGHT = 0.02
+
+# How often a process re-checks whether another process changed the puzzles.
+SIGNATURE_TTL_SECONDS = 60
+
+# Solve stats need a few players before they are trusted over par_score.
+MIN_PLAYS_FOR_STATS = 5
+
+# Per-process cache: category_id -> CategorySampler
+_samplers = {}
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table for O(1) draws from a fixed discrete distribution.
+    """
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Whatever is left over is 1.0 up to rounding error.
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng=random):
+        """Return an index drawn from the table's distribution."""
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+def tier_for_round(round_num):
+    """Map an endless round number (1-based) to a difficulty tier."""
+    return min(max(round_num - 1, 0) // ROUNDS_PER_TIER, MAX_TIER)
+
+
+def tier_weights(difficulties, tier):
+    """
+    Weight each difficulty (0.0 easiest .. 1.0 hardest) for `tier`.
+
+    The curve is a bell centred on the tier's target difficulty, so early
+    rounds favour easy puzzles and later rounds favour hard ones.
+    """
+    target = tier / MAX_TIER
+    spread = 2 * DIFFICULTY_SPREAD ** 2
+    return [max(math.exp(-((d - target) ** 2) / spread), MIN_WEIGHT) for d in difficulties]
+
+
+def _category_signature(category_id):
+    """
+    Cheap fingerprint that changes whenever puzzles are added, removed or
+    reordered: (count, highest id, highest position, reorder version). Like
+    the sampler, it only counts puzzles that have a position.
+    """
+    stats = Puzzle.objects.filter(category_id=category_id, position__isnull=False).aggregate(
+        count=Count("id"), max_id=Max("id"), max_position=Max("position")
+    )
+    version = PositionCounter.objects.filter(category_id=category_id).values_list("version", flat=True).first()
+    return (stats["count"], stats["max_id"], stats["max_position"], version)
+
+
+def _puzzle_difficulties(category_id):
+    """
+    Return (positions, difficulties) for a category. Puzzles without a
+    position can't be served by position, so they are left out.
+
+    Difficulty starts from par_score and is blended with the average guess
+    count players needed in levelup mode once enough of them have played.
+    Raw values are turned into ranks so the curve is spread evenly over
+    [0, 1] whatever the underlying scale.
+    """
+    puzzles = list(
+        Puzzle.objects.filter(category_id=category_id, position__isnull=False)
+        .order_by("position")
+        .values_list("id", "position", "par_score")
+    )
+    stats = {
+        row["puzzle_id"]: row
+        for row in UserProgress.objects.filter(
+            puzzle__category_id=category_id,
+            game_mode=UserProgress.GameMode.LEVELS,
+        )
+        .values("puzzle_id")
+        .annotate(plays=Count("id"), avg_score=Avg("score"))
+    }
+
+    raw = []
+    for puzzle_id, _position, par_score in puzzles:
+        value = float(par_score)
+        row = stats.get(puzzle_id)
+        if row and row["plays"] >= MIN_PLAYS_FOR_STATS and row["avg_score"] is not None:
+            # More guesses than par means the puzzle plays harder than rated.
+            value = (value + float(row["avg_score"])) / 2
+        raw.append(value)
+
+    order = sorted(range(len(raw)), key=raw.__getitem__)
+    difficulties = [0.0] * len(raw)
+    last = max(len(raw) - 1, 1)
+    for rank, i in enumerate(order):
+        difficulties[i] = rank / last
+
+    return [position for _id, position, _par in puzzles], difficulties
+
+
+class CategorySampler:
+    """Alias tables for one category, one per difficulty tier."""
+
+    def __init__(self, category_id):
+        self.category_id = category_id
+        self.signature = _category_signature(category_id)
+        self.checked_at = time.monotonic()
+        self.positions, self.difficulties = _puzzle_difficulties(category_id)
+        self._tables = {}
+
+    def table(self, tier):
+        if tier not in self._tables:
+            self._tables[tier] = AliasTable(tier_weights(self.difficulties, tier))
+        return self._tables[tier]
+
+    def draw(self, round_num, rng=random):
+        """Return a puzzle position drawn for the given round."""
+        return self.positions[self.table(tier_for_round(round_num)).draw(rng)]
+
+    def is_stale(self):
+        now = time.monotonic()
+        if now - self.checked_at < SIGNATURE_TTL_SECONDS:
+            return False
+        self.checked_at = now
+        return _category_signature(self.category_id) != self.signature
+
+
+def get_sampler(category_id):
+    """Return the (possibly rebuilt) sampler for a category, or None if it is empty."""
+    sampler = _samplers.get(category_id)
+    if sampler is None or sampler.is_stale():
+        sampler = CategorySampler(category_id)
+        _samplers[category_id] = sampler
+    return sampler if sampler.positions else None
+
+
+def invalidate_sampler(category_id):
+    """Drop this process's tables for a category so the next draw rebuilds them."""
+    _samplers.pop(category_id, None)
+
+
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+def _puzzle_changed(sender, instance, **kwargs):
+    invalidate_sampler(instance.category_id)
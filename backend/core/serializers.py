@@ -11,4 +11,18 @@ class LevelupLevelSerializer(serializers.Serializer):
         position = serializers.IntegerField()
         par_score = serializers.IntegerField()
         score = serializers.IntegerField()
-        attempts_data = serializers.CharField(allow_null=True)
\ No newline at end of file
+        attempts_data = serializers.CharField(allow_null=True)
+
+
+# Plain-dict counterpart of CategorySerializer for hot list endpoints: rows
+# come straight from .values(), so no model instances or fields are built.
+CATEGORY_FIELDS = ('id', 'name', 'slug', 'description', 'emoji')
+
+
+def serialize_category_row(row):
+    data = {field: row[field] for field in CATEGORY_FIELDS}
+    if row.get('high_score') is not None:
+        data['high_score'] = row['high_score']
+    if row.get('completed_today'):
+        data['badge'] = "Completed"
+    return data
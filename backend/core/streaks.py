@@ -0,0 +1,144 @@
+"""
+Daily streaks.
+
+A DailyStreak row per player is moved forward by a single conditional UPDATE
+on each daily completion: the day after `last_played` extends the streak,
+any later day restarts it at 1, and the same (or an earlier) day changes
+nothing. The backfill rebuilds every row from UserProgress in one streaming
+pass ordered by player and time.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import DailyStreak, UserProgress
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def record_daily_play(user_id, day):
+    """
+    Count a daily completion by `user_id` on their local date `day`.
+
+    Call this inside the transaction that stores the completion.
+    """
+    current = Case(
+        When(last_played=day - timedelta(days=1), then=F("current") + 1),
+        default=Value(1),
+    )
+    # Every SET expression sees the old row, so `longest` compares against
+    # the new current streak computed from the old one.
+    updated = DailyStreak.objects.filter(user_id=user_id, last_played__lt=day).update(
+        current=current,
+        longest=Greatest("longest", current),
+        last_played=day,
+    )
+    if updated or DailyStreak.objects.filter(user_id=user_id).exists():
+        return
+
+    try:
+        with transaction.atomic():
+            DailyStreak.objects.create(user_id=user_id, current=1, longest=1, last_played=day)
+    except IntegrityError:
+        # A concurrent first completion created the row; apply ours on top.
+        DailyStreak.objects.filter(user_id=user_id, last_played__lt=day).update(
+            current=current,
+            longest=Greatest("longest", current),
+            last_played=day,
+        )
+
+
+def streak_summary(streak, today):
+    """
+    Return the streak fields a client shows for `today` (the player's local
+    date). A streak survives until the end of the day after its last play.
+    """
+    if streak is None:
+        return {"current": 0, "longest": 0, "last_played": None}
+
+    current = streak.current
+    if streak.last_played is None or streak.last_played < today - timedelta(days=1):
+        current = 0
+    return {
+        "current": current,
+        "longest": streak.longest,
+        "last_played": streak.last_played.isoformat() if streak.last_played else None,
+    }
+
+
+def _play_dates():
+    """Yield (user_id, date) for every daily completion, ordered by user then date."""
+    # Rows written with bulk_create or update() skip UserProgress.save and
+    # can lack a date; they can't extend a streak.
+    rows = (
+        UserProgress.objects.filter(game_mode=UserProgress.GameMode.DAILY, played_on__isnull=False)
+        .order_by("user_id", "played_on")
+        .values_list("user_id", "played_on")
+    )
+    return rows.iterator(chunk_size=BACKFILL_BATCH_SIZE)
+
+
+def _streaks_from(play_dates):
+    """Fold a (user_id, date) stream sorted by user and date into DailyStreaks."""
+    streak = None
+    for user_id, day in play_dates:
+        if streak is None or streak.user_id != user_id:
+            if streak is not None:
+                yield streak
+            streak = DailyStreak(user_id=user_id, current=1, longest=1, last_played=day)
+            continue
+
+        if day <= streak.last_played:
+            continue
+        if day == streak.last_played + timedelta(days=1):
+            streak.current += 1
+        else:
+            streak.current = 1
+        streak.longest = max(streak.longest, streak.current)
+        streak.last_played = day
+
+    if streak is not None:
+        yield streak
+
+
+def _write(batch):
+    DailyStreak.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["current", "longest", "last_played", "updated_at"],
+    )
+
+
+def backfill(progress=None):
+    """
+    Recompute every player's DailyStreak from their daily completions.
+
+    Only one player's state and one write batch are held in memory at a time.
+    `progress`, if given, is called with the running count of
+    players written after each batch. Returns the number of players written.
+    """
+    written = 0
+    batch = []
+    for streak in _streaks_from(_play_dates()):
+        batch.append(streak)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            _write(batch)
+            written += len(batch)
+            batch = []
+            if progress:
+                progress(written)
+
+    if batch:
+        _write(batch)
+        written += len(batch)
+        if progress:
+            progress(written)
+
+    logger.info(f"Backfilled daily streaks for {written} players")
+    return written
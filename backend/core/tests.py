@@ -1,3 +1,2078 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DataError, connection, connections, transaction
+from django.db.models import Exists, OuterRef
+from django.contrib.admin.sites import AdminSite
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from . import category_cache, daily, deletion, exporting, generation, importing, leaderboards, positions, sampling, streaks, webhooks
+from .admin import PuzzleAdmin, PuzzleAdminForm
+from .dedup import NearDuplicateIndex, similarity
+from .endless_sessions import has_seen, mark_seen, next_packet, permuted_slot, start_mixed_session, start_session
+from .models import Category, DailyPuzzle, DailyStats, DailyStreak, EndlessScore, EndlessSession, GuessCountBucket, LeaderboardBucket, PositionCounter, Puzzle, User, UserProgress, WebhookEvent
+from .percentiles import SKETCH_BUCKETS, guess_counts, rebuild_guess_counts
+from .sampling import AliasTable
+from .text import getAcronymFromSolution, stem_word
+
+
+def make_user(name="player"):
+    return User.objects.create(email=f"{name}@example.com", username=name, clerk_id=f"clerk_{name}")
+
+
+def make_category(slug="animals", creator=None):
+    return Category.objects.create(
+        name=slug.title(), slug=slug, description=f"{slug} puzzles", emoji="🧩", creator=creator
+    )
+
+
+def make_progress(user, puzzles, game_mode, scores):
+    return UserProgress.objects.bulk_create(
+        UserProgress(user=user, category=puzzle.category, puzzle=puzzle, game_mode=game_mode, score=score)
+        for puzzle, score in zip(puzzles, scores)
+    )
+
+
+def guess_histogram(category):
+    return {
+        (mode, guesses): plays
+        for mode, guesses, plays in GuessCountBucket.objects.filter(category=category).values_list(
+            "game_mode", "guesses", "plays"
+        )
+        if plays
+    }
+
+
+def signed_in(user):
+    """Patch JWT verification so requests with any bearer token come from `user`."""
+    return mock.patch("core.views.verify_clerk_jwt", return_value={"sub": user.clerk_id})
+
+
+AUTH = {"HTTP_AUTHORIZATION": "Bearer token"}
+
+
+def make_puzzles(category, count, **fields):
+    return [
+        Puzzle.objects.create(
+            solution=f"{category.slug} puzzle {i}", clue="clue", category=category, par_score=i % 10 + 1, **fields
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+class AliasTableTests(TestCase):
+    # Chi-square critical value for 4 outcomes (3 degrees of freedom) at p = 0.001
+    CHI_SQUARE_CRITICAL = 16.27
+
+    def test_draws_follow_weights(self):
+        weights = [1, 2, 3, 4]
+        table = AliasTable(weights)
+        rng = random.Random(1234)
+        draws = 200000
+
+        observed = [0] * len(weights)
+        for _ in range(draws):
+            observed[table.draw(rng)] += 1
+
+        total = sum(weights)
+        expected = [draws * weight / total for weight in weights]
+        chi_square = sum((o - e) ** 2 / e for o, e in zip(observed, expected))
+        self.assertLess(chi_square, self.CHI_SQUARE_CRITICAL)
+
+    def test_zero_weight_is_never_drawn(self):
+        table = AliasTable([0, 1, 0, 1])
+        rng = random.Random(99)
+        drawn = {table.draw(rng) for _ in range(10000)}
+        self.assertEqual(drawn, {1, 3})
+
+
+class EndlessPacketTests(TestCase):
+    PUZZLES = 1000
+    PACKET_SIZE = 10
+
+    # Loose floor so the test only fails on a real regression (e.g. a
+    # full category scan per packet), not on a slow CI machine.
+    MIN_PACKETS_PER_SECOND = 20
+
+    def setUp(self):
+        self.user = make_user()
+        self.category = make_category()
+        make_puzzles(self.category, self.PUZZLES)
+
+    def test_run_serves_every_puzzle_once(self):
+        session = start_session(self.user, self.category)
+        served = []
+        round_num = 1
+        while True:
+            puzzles, _remaining = next_packet(session, self.PACKET_SIZE, round_num)
+            if not puzzles:
+                break
+            served.extend(puzzle.id for puzzle in puzzles)
+            round_num += 1
+        self.assertEqual(len(served), self.PUZZLES)
+        self.assertEqual(len(set(served)), self.PUZZLES)
+
+    def test_packet_throughput(self):
+        session = start_session(self.user, self.category)
+        # The first weighted packet builds the sampler; time the steady state
+        next_packet(session, self.PACKET_SIZE, 1)
+
+        packets = 50
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for round_num in range(2, packets + 2):
+                puzzles, _remaining = next_packet(session, self.PACKET_SIZE, round_num)
+                self.assertEqual(len(puzzles), self.PACKET_SIZE)
+        elapsed = time.perf_counter() - started
+
+        # Lock, fetch and save: the query count doesn't grow with the category
+        self.assertLessEqual(len(queries) / packets, 8)
+        self.assertGreater(packets / elapsed, self.MIN_PACKETS_PER_SECOND)
+
+
+class MixedSessionTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.mixed = make_category("mixed-run")
+        self.first = make_category("first")
+        self.second = make_category("second")
+        make_puzzles(self.first, 30)
+        make_puzzles(self.second, 20)
+        self.sources = Category.objects.filter(id__in=[self.first.id, self.second.id])
+
+    def test_layout_covers_source_categories(self):
+        session = start_mixed_session(self.user, self.mixed, self.sources)
+        self.assertEqual(session.layout, [[self.first.id, 30], [self.second.id, 20]])
+        self.assertEqual((session.span, session.total), (50, 50))
+
+        served = []
+        while True:
+            puzzles, _remaining = next_packet(session, 10, len(served) // 10 + 1)
+            if not puzzles:
+                break
+            served.extend(puzzle.id for puzzle in puzzles)
+        self.assertEqual(len(set(served)), 50)
+
+    def test_start_reuses_samplers(self):
+        start_mixed_session(self.user, self.mixed, self.sources)
+        # Category ids, then replacing the previous run; no puzzle scans
+        with CaptureQueriesContext(connection) as queries:
+            start_mixed_session(self.user, self.mixed, self.sources)
+        self.assertFalse([query for query in queries if "core_puzzle" in query["sql"]])
+
+
+class EndlessHighScoreTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.category = make_category()
+
+    def test_keeps_the_larger_score(self):
+        record = EndlessScore.objects.record_high_score
+        self.assertEqual(record(self.user, self.category, 10), (None, 10))
+        self.assertEqual(record(self.user, self.category, 7), (10, 10))
+        self.assertEqual(record(self.user, self.category, 12), (10, 12))
+        self.assertEqual(EndlessScore.objects.get(user=self.user, category=self.category).high_score, 12)
+
+    def test_locked_fallback_agrees(self):
+        record = EndlessScore.objects._record_high_score_locked
+        self.assertEqual(record(self.user, self.category, 10), (None, 10))
+        self.assertEqual(record(self.user, self.category, 7), (10, 10))
+        self.assertEqual(record(self.user, self.category, 12), (10, 12))
+
+    def test_upsert_throughput(self):
+        other = make_user("other")
+        submissions = 300
+        rng = random.Random(7)
+        scores = [rng.randrange(1000) for _ in range(submissions)]
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for score in scores:
+                EndlessScore.objects.record_high_score(self.user, self.category, score)
+            upsert_seconds = time.perf_counter() - started
+        upsert_queries = len(queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for score in scores:
+                EndlessScore.objects._record_high_score_locked(other, self.category, score)
+            locked_seconds = time.perf_counter() - started
+
+        # One statement per submission instead of a locked read and a write
+        self.assertEqual(upsert_queries, submissions)
+        self.assertGreater(len(queries), 2 * submissions)
+        self.assertLess(upsert_seconds, locked_seconds * 1.5)
+
+
+class ConcurrentHighScoreTests(TransactionTestCase):
+    THREADS = 8
+    SUBMISSIONS_PER_THREAD = 25
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("threads can't write to an in-memory SQLite database concurrently")
+        self.user = make_user()
+        self.category = make_category()
+
+    def test_concurrent_submissions(self):
+        scores = list(range(1, self.THREADS * self.SUBMISSIONS_PER_THREAD + 1))
+        random.Random(42).shuffle(scores)
+        results = []
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def submit(chunk):
+            try:
+                start.wait()
+                for score in chunk:
+                    previous, high_score = EndlessScore.objects.record_high_score(self.user, self.category, score)
+                    results.append((score, previous, high_score))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=submit, args=(scores[i::self.THREADS],)) for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), len(scores))
+        self.assertEqual(EndlessScore.objects.get(user=self.user, category=self.category).high_score, max(scores))
+
+        # Only the very first write found no row
+        self.assertEqual(sum(previous is None for _score, previous, _high in results), 1)
+        for score, previous, high_score in results:
+            self.assertEqual(high_score, score if previous is None else max(previous, score))
+        # Writes are serialized: each one's previous score is the high score
+        # some earlier write left behind, so no update was lost or doubled
+        highs = sorted(high_score for _score, _previous, high_score in results)
+        previous_scores = sorted(previous for _score, previous, _high in results if previous is not None)
+        self.assertEqual(previous_scores, highs[:-1])
+
+
+class GuessCountRebuildTests(TestCase):
+    def setUp(self):
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 40)
+        self.scores = [i % 7 for i in range(40)]
+        for name in ("ann", "bob"):
+            user = make_user(name)
+            make_progress(user, self.puzzles, UserProgress.GameMode.LEVELS, self.scores)
+            make_progress(user, self.puzzles[:5], UserProgress.GameMode.DAILY, [3, 4, 5, -1, SKETCH_BUCKETS + 50])
+            make_progress(user, self.puzzles[:5], UserProgress.GameMode.ENDLESS, [9] * 5)
+
+    def expected(self):
+        histogram = {}
+        for score in self.scores:
+            key = (UserProgress.GameMode.LEVELS, score)
+            histogram[key] = histogram.get(key, 0) + 2
+        for guesses in (3, 4, 5, 0, SKETCH_BUCKETS - 1):
+            histogram[(UserProgress.GameMode.DAILY, guesses)] = 2
+        return histogram
+
+    def test_rebuild_counts_in_sql(self):
+        GuessCountBucket.objects.create(
+            category=self.category, game_mode=UserProgress.GameMode.LEVELS, guesses=50, plays=999
+        )
+        with CaptureQueriesContext(connection) as queries:
+            count, scanned = rebuild_guess_counts()
+        self.assertEqual(guess_histogram(self.category), self.expected())
+        self.assertEqual(count, len(self.expected()))
+        self.assertEqual(scanned, 90)
+        # Lock, delete, one GROUP BY and one insert; no per-row work
+        self.assertLessEqual(len(queries), 8)
+
+    def test_flushes_add_to_rebuilt_rows(self):
+        rebuild_guess_counts()
+        guess_counts.add((self.category.id, UserProgress.GameMode.LEVELS, 3), 4)
+        guess_counts.flush()
+        expected = self.expected()
+        expected[(UserProgress.GameMode.LEVELS, 3)] += 4
+        self.assertEqual(guess_histogram(self.category), expected)
+
+
+class DailyStatsTests(TestCase):
+    DAYS = [date(2026, 3, 1) + timedelta(days=i) for i in range(3)]
+
+    def setUp(self):
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, len(self.DAYS))
+        rng = random.Random(5)
+        self.completions = []
+        for player in range(30):
+            user = make_user(f"player{player}")
+            for day, puzzle in zip(self.DAYS, self.puzzles):
+                if rng.random() < 0.8:
+                    guesses = rng.randrange(1, 9)
+                    UserProgress.objects.create(
+                        user=user,
+                        category=self.category,
+                        puzzle=puzzle,
+                        game_mode=UserProgress.GameMode.DAILY,
+                        score=guesses,
+                        played_on=day,
+                    )
+                    self.completions.append((day, guesses))
+
+    def flushed(self):
+        return {
+            (day, guesses): completions
+            for day, guesses, completions in DailyStats.objects.filter(category=self.category).values_list(
+                "date", "guesses", "completions"
+            )
+        }
+
+    def recount(self):
+        counts = {}
+        for key in self.completions:
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def test_flushed_counts_match_recount(self):
+        for day, guesses in self.completions:
+            daily.record_completion(day, self.category.id, guesses)
+        daily.daily_stats.flush()
+        self.assertEqual(self.flushed(), self.recount())
+        self.assertEqual(daily.daily_stats.pending_items(), [])
+
+    def test_rebuild_restores_unflushed_counts(self):
+        for day, guesses in self.completions:
+            daily.record_completion(day, self.category.id, guesses)
+        daily.daily_stats.flush()
+        # A worker killed before its next flush takes these with it
+        lost = self.completions[:10]
+        for day, guesses in lost:
+            daily.record_completion(day, self.category.id, guesses)
+        daily.daily_stats._pending.clear()
+        DailyStats.objects.filter(date=self.DAYS[0]).delete()
+
+        count, completions = daily.rebuild_stats()
+        self.assertEqual(self.flushed(), self.recount())
+        self.assertEqual((count, completions), (len(self.recount()), len(self.completions)))
+
+    def test_rebuild_since_keeps_earlier_days(self):
+        DailyStats.objects.create(date=self.DAYS[0], category=self.category, guesses=3, completions=999)
+        daily.rebuild_stats(since=self.DAYS[1])
+        expected = {key: count for key, count in self.recount().items() if key[0] >= self.DAYS[1]}
+        expected[(self.DAYS[0], 3)] = 999
+        self.assertEqual(self.flushed(), expected)
+
+
+class DailyProgressIndexTests(TestCase):
+    INDEX = "idx_progress_daily_played_on"
+
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("the partial index is only created on PostgreSQL")
+        self.user = make_user()
+        self.category = make_category()
+        self.puzzle = make_puzzles(self.category, 1)[0]
+        self.today = date(2026, 3, 1)
+        with connection.cursor() as cursor:
+            # The test table is tiny; make the planner show whether the index can be used at all
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def test_completion_check_uses_index(self):
+        query = UserProgress.objects.filter(
+            user=self.user, puzzle=self.puzzle, game_mode=UserProgress.GameMode.DAILY, played_on=self.today
+        ).values_list("id", flat=True)
+        self.assertIn(self.INDEX, query.explain())
+
+    def test_category_list_completed_badge_uses_index(self):
+        completions = UserProgress.objects.filter(
+            user=self.user, game_mode=UserProgress.GameMode.DAILY, played_on=self.today, category=OuterRef("pk")
+        )
+        query = Category.objects.annotate(completed_today=Exists(completions))
+        self.assertIn(self.INDEX, query.explain())
+
+
+class CategoryListQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        for i in range(10):
+            make_category(f"system-{i}")
+        for i in range(5):
+            make_category(f"own-{i}", creator=self.user)
+        categories = list(Category.objects.all())
+        for category in categories[::2]:
+            puzzle = make_puzzles(category, 1)[0]
+            EndlessScore.objects.create(user=self.user, category=category, high_score=7)
+            UserProgress.objects.create(
+                user=self.user,
+                category=category,
+                puzzle=puzzle,
+                game_mode=UserProgress.GameMode.DAILY,
+                score=3,
+                played_on=daily.local_today(0),
+            )
+
+    def get(self, **params):
+        response = self.client.get("/api/categories/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_endless_list_takes_two_queries(self):
+        with self.assertNumQueries(2):
+            rows = self.get(user_id=self.user.clerk_id, game_mode="endless")
+        self.assertEqual(len(rows), 15)
+        self.assertEqual(sum(row.get("high_score") == 7 for row in rows), 8)
+
+    def test_daily_list_takes_two_queries(self):
+        with self.assertNumQueries(2):
+            rows = self.get(user_id=self.user.clerk_id, game_mode="daily", tz_offset=0)
+        self.assertEqual(sum(row.get("badge") == "Completed" for row in rows), 8)
+
+    def test_anonymous_list_takes_one_query(self):
+        with self.assertNumQueries(1):
+            rows = self.get()
+        self.assertEqual(len(rows), 10)
+
+    def test_cached_list_takes_no_queries(self):
+        first = self.get(user_id=self.user.clerk_id, game_mode="endless")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(user_id=self.user.clerk_id, game_mode="endless"), first)
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_per_process_cache_keeps_lists_briefly(self):
+        self.assertEqual(category_cache.list_cache_seconds(), category_cache.LOCAL_LIST_CACHE_SECONDS)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache"}}
+    )
+    def test_shared_cache_keeps_lists_longer(self):
+        self.assertEqual(category_cache.list_cache_seconds(), category_cache.LIST_CACHE_SECONDS)
+
+    def test_bump_changes_the_key(self):
+        before = category_cache.list_key("clerk_player", "daily", date(2026, 3, 1))
+        category_cache.bump_user("clerk_player")
+        self.assertNotEqual(category_cache.list_key("clerk_player", "daily", date(2026, 3, 1)), before)
+        self.assertEqual(category_cache.list_key("clerk_other", "daily", date(2026, 3, 1)).split(":v")[1], "0.0")
+
+
+def clerk_user(clerk_id, email=None, **fields):
+    email = email or f"{clerk_id}@example.com"
+    return {
+        "id": clerk_id,
+        "email_addresses": [{"id": "email_1", "email_address": email}],
+        "primary_email_address_id": "email_1",
+        **fields,
+    }
+
+
+class WebhookBatchTests(TestCase):
+    def enqueue(self, svix_id, event_type, data):
+        webhooks.enqueue(svix_id, {"type": event_type, "data": data})
+
+    def test_batch_folds_events_per_user(self):
+        self.enqueue("msg_1", "user.created", clerk_user("user_1", username="first"))
+        self.enqueue("msg_2", "user.updated", clerk_user("user_1", username="renamed"))
+        self.enqueue("msg_2", "user.updated", clerk_user("user_1", username="replayed"))
+        self.enqueue("msg_3", "session.created", {"id": "sess_1"})
+
+        self.assertEqual(webhooks.drain(), (3, 0))
+        self.assertEqual(User.objects.get(clerk_id="user_1").username, "renamed")
+        self.assertFalse(WebhookEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_bad_events_fail_alone(self):
+        real_user_from = webhooks._user_from
+
+        def user_from(data):
+            if data["id"] == "too_long":
+                raise DataError("value too long for type character varying(150)")
+            return real_user_from(data)
+
+        self.enqueue("msg_1", "user.created", clerk_user("user_1"))
+        self.enqueue("msg_2", "user.created", clerk_user("too_long"))
+        self.enqueue("msg_3", "user.created", {"id": "malformed", "email_addresses": "not a list"})
+        self.enqueue("msg_4", "user.created", {"id": "no_email"})
+        self.enqueue("msg_5", "user.created", clerk_user("user_2"))
+
+        with mock.patch.object(webhooks, "_user_from", side_effect=user_from):
+            self.assertEqual(webhooks.drain(), (2, 3))
+
+        self.assertEqual(set(User.objects.values_list("clerk_id", flat=True)), {"user_1", "user_2"})
+        failed = WebhookEvent.objects.filter(processed_at__isnull=True).order_by("svix_id")
+        self.assertEqual([event.svix_id for event in failed], ["msg_2", "msg_3", "msg_4"])
+        for event in failed:
+            self.assertEqual(event.attempts, 1)
+            self.assertTrue(event.last_error)
+
+    def test_failing_event_stops_after_max_attempts(self):
+        self.enqueue("msg_1", "user.created", {"id": "no_email"})
+        for _ in range(webhooks.MAX_ATTEMPTS + 2):
+            webhooks.drain()
+        event = WebhookEvent.objects.get(svix_id="msg_1")
+        self.assertEqual(event.attempts, webhooks.MAX_ATTEMPTS)
+        self.assertIsNone(event.processed_at)
+
+
+def submit_endless(user, category, score):
+    previous, high_score = EndlessScore.objects.record_high_score(user, category, score)
+    leaderboards.record_score_change(category.id, previous, high_score)
+
+
+class UserDeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leaving = make_user("leaving")
+        self.staying = make_user("staying")
+        self.shared = make_category("shared")
+        self.owned = make_category("owned", creator=self.leaving)
+
+        self.shared_puzzles = make_puzzles(self.shared, 10)
+        self.owned_puzzles = make_puzzles(self.owned, 10)
+        # Puzzles the leaving user added to a category they don't own
+        self.created = [
+            Puzzle.objects.create(
+                solution=f"created {i}", clue="clue", category=self.shared, par_score=3, creator=self.leaving
+            )
+            for i in range(5)
+        ]
+        for user in (self.leaving, self.staying):
+            for puzzles in (self.shared_puzzles, self.owned_puzzles, self.created):
+                make_progress(user, puzzles, UserProgress.GameMode.LEVELS, [4] * len(puzzles))
+            start_session(user, self.shared)
+
+        submit_endless(self.leaving, self.shared, 30)
+        submit_endless(self.staying, self.shared, 20)
+        submit_endless(self.leaving, self.owned, 5)
+
+    def test_tombstone_leaves_ranks_at_once(self):
+        self.assertEqual(leaderboards.rank_for_score(self.shared.id, 20), (2, 2))
+        self.assertEqual(deletion.tombstone([self.leaving.clerk_id]), 1)
+        self.assertEqual(leaderboards.rank_for_score(self.shared.id, 20), (1, 1))
+        self.assertEqual([entry["username"] for entry in leaderboards.top_scores(self.shared.id)], ["staying"])
+
+        self.leaving.refresh_from_db()
+        self.assertFalse(self.leaving.is_active)
+        self.assertIsNotNone(self.leaving.deleted_at)
+        # A repeated webhook doesn't take them off the boards twice
+        self.assertEqual(deletion.tombstone([self.leaving.clerk_id]), 0)
+        self.assertEqual(leaderboards.rank_for_score(self.shared.id, 20), (1, 1))
+
+    def test_purge_removes_everything_before_the_final_delete(self):
+        deletion.tombstone([self.leaving.clerk_id])
+        real_delete = User.delete
+
+        def delete(user, *args, **kwargs):
+            # Nothing large may be left for the final cascade
+            self.assertFalse(UserProgress.objects.filter(user=user).exists())
+            self.assertFalse(UserProgress.objects.filter(puzzle__creator=user).exists())
+            self.assertFalse(Puzzle.objects.filter(creator=user).exists())
+            self.assertFalse(Category.objects.filter(creator=user).exists())
+            self.assertFalse(EndlessScore.objects.filter(user=user).exists())
+            self.assertFalse(EndlessSession.objects.filter(user=user).exists())
+            return real_delete(user, *args, **kwargs)
+
+        with mock.patch.object(User, "delete", autospec=True, side_effect=delete):
+            self.assertEqual(deletion.purge_deleted(batch_size=7), 1)
+
+        self.assertFalse(User.objects.filter(pk=self.leaving.pk).exists())
+        self.assertFalse(Category.objects.filter(pk=self.owned.pk).exists())
+        self.assertEqual(Puzzle.objects.filter(category=self.shared).count(), 10)
+        # The staying player keeps their progress everywhere except on removed puzzles
+        self.assertEqual(UserProgress.objects.filter(user=self.staying).count(), 10)
+        self.assertEqual(leaderboards.rank_for_score(self.shared.id, 20), (1, 1))
+
+    def test_purge_batches(self):
+        deletion.tombstone([self.leaving.clerk_id])
+        batches = []
+        deletion.purge_deleted(batch_size=4, progress=lambda label, deleted: batches.append((label, deleted)))
+        previous = {}
+        for label, deleted in batches:
+            self.assertLessEqual(deleted - previous.get(label, 0), 4)
+            previous[label] = deleted
+        self.assertEqual(previous["progress on created puzzles"], 10)
+        self.assertEqual(previous["created puzzles"], 5)
+
+
+def make_heavy_user(rows):
+    """A tombstoned user with `rows` progress rows, two modes on each of rows / 2 puzzles."""
+    user = make_user("heavy")
+    category = make_category("heavy")
+    puzzles = Puzzle.objects.bulk_create(
+        Puzzle(solution=f"bulk {i}", clue="clue", category=category, position=i)
+        for i in range(1, rows // 2 + 1)
+    )
+    UserProgress.objects.bulk_create(
+        (
+            UserProgress(user=user, category=category, puzzle=puzzle, game_mode=mode, score=4)
+            for puzzle in puzzles
+            for mode in (UserProgress.GameMode.LEVELS, UserProgress.GameMode.DAILY)
+        ),
+        batch_size=5000,
+    )
+    deletion.tombstone([user.clerk_id])
+    return user
+
+
+class PurgeBenchmarkTests(TestCase):
+    PROGRESS_ROWS = 100000
+    BATCH_SIZE = 1000
+
+    # Loose floor; batching should never make a purge crawl
+    MIN_ROWS_PER_SECOND = 2000
+
+    def test_purge_throughput(self):
+        user = make_heavy_user(self.PROGRESS_ROWS)
+
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            total = deletion.purge_user(user, batch_size=self.BATCH_SIZE)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(total, self.PROGRESS_ROWS)
+        self.assertFalse(UserProgress.objects.filter(user_id=user.id).exists())
+        # A select and a delete per batch, not a statement per row
+        self.assertLess(len(queries), 5 * self.PROGRESS_ROWS / self.BATCH_SIZE + 40)
+        self.assertGreater(total / elapsed, self.MIN_ROWS_PER_SECOND)
+
+
+class PurgeLatencyTests(TransactionTestCase):
+    """Requests served while a heavy user is purged only ever wait for one batch."""
+
+    PROGRESS_ROWS = 100000
+    BATCH_SIZE = 1000
+
+    # Generous ceilings: a request waits for at most one batch's transaction
+    MAX_MEDIAN_SECONDS = 0.1
+    MAX_SECONDS = 1.0
+
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("SQLite has one database-wide write lock, so every write waits for the purge")
+        cache.clear()
+        self.heavy = make_heavy_user(self.PROGRESS_ROWS)
+        self.player = make_user("player")
+        self.category = make_category()
+
+    def test_requests_during_purge(self):
+        errors = []
+        done = threading.Event()
+
+        def purge():
+            try:
+                deletion.purge_user(self.heavy, batch_size=self.BATCH_SIZE)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                done.set()
+                connections.close_all()
+
+        latencies = []
+        thread = threading.Thread(target=purge)
+        with signed_in(self.player):
+            thread.start()
+            score = 0
+            while not done.is_set():
+                score += 1
+                started = time.perf_counter()
+                submitted = self.client.post(f"/api/endless/submit/?slug={self.category.slug}&score={score}", **AUTH)
+                board = self.client.get("/api/endless/leaderboard/", {"slug": self.category.slug}, **AUTH)
+                latencies.append(time.perf_counter() - started)
+                self.assertEqual((submitted.status_code, board.status_code), (200, 200))
+        thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertFalse(User.objects.filter(pk=self.heavy.pk).exists())
+        self.assertGreater(len(latencies), 1)
+        latencies.sort()
+        self.assertLess(latencies[len(latencies) // 2], self.MAX_MEDIAN_SECONDS)
+        self.assertLess(latencies[-1], self.MAX_SECONDS)
+
+
+class CompactPositionsTests(TestCase):
+    def setUp(self):
+        self.category = make_category()
+
+    def positions(self):
+        return list(
+            Puzzle.objects.filter(category=self.category).order_by("position").values_list("solution", "position")
+        )
+
+    def test_closes_gaps_in_order(self):
+        puzzles = make_puzzles(self.category, 6)
+        Puzzle.objects.filter(id__in=[puzzles[1].id, puzzles[4].id]).delete()
+        self.assertEqual(positions.gaps(self.category.id), (4, 6, 0))
+
+        self.assertEqual(positions.compact(self.category.id), 4)
+        self.assertEqual(
+            self.positions(), [(puzzles[i].solution, n) for n, i in enumerate([0, 2, 3, 5], start=1)]
+        )
+        self.assertEqual(PositionCounter.objects.get(category=self.category).last_position, 4)
+        self.assertEqual(positions.compact(self.category.id), 0)
+
+    def test_unpositioned_puzzles_go_last(self):
+        puzzles = make_puzzles(self.category, 5)
+        Puzzle.objects.filter(id__in=[puzzles[0].id, puzzles[3].id]).update(position=None)
+        # Positions {NULL, 2, 3, NULL, 5} -> the NULLs take 4 and 5
+        self.assertEqual(positions.gaps(self.category.id), (5, 5, 2))
+
+        self.assertEqual(positions.compact(self.category.id), 5)
+        self.assertEqual(
+            self.positions(), [(puzzles[i].solution, n) for n, i in enumerate([1, 2, 4, 0, 3], start=1)]
+        )
+
+    def test_more_unpositioned_puzzles_than_the_highest_position(self):
+        puzzles = make_puzzles(self.category, 5)
+        Puzzle.objects.filter(id__in=[puzzles[0].id, puzzles[1].id]).update(position=None)
+        for position, puzzle in enumerate(puzzles[2:], start=1):
+            Puzzle.objects.filter(id=puzzle.id).update(position=position)
+        # Positions {NULL, NULL, 1, 2, 3}: the NULLs get 4 and 5, which a
+        # lift of only the highest position would leave taken
+        self.assertEqual(positions.gaps(self.category.id), (5, 3, 2))
+
+        self.assertEqual(positions.compact(self.category.id), 5)
+        self.assertEqual(
+            self.positions(), [(puzzles[i].solution, n) for n, i in enumerate([2, 3, 4, 0, 1], start=1)]
+        )
+
+    def test_only_unpositioned_puzzles(self):
+        puzzles = make_puzzles(self.category, 3)
+        Puzzle.objects.filter(category=self.category).update(position=None)
+        self.assertEqual(positions.compact(self.category.id), 3)
+        self.assertEqual(self.positions(), [(puzzle.solution, n) for n, puzzle in enumerate(puzzles, start=1)])
+
+    def test_migration_compacts_only_gapped_categories(self):
+        compact_positions = importlib.import_module("core.migrations.0033_compact_positions").compact_positions
+        puzzles = make_puzzles(self.category, 5)
+        Puzzle.objects.filter(id=puzzles[1].id).delete()
+        Puzzle.objects.filter(id=puzzles[3].id).update(position=None)
+        compact = make_category("compact")
+        untouched = make_puzzles(compact, 3)
+        version = PositionCounter.objects.get(category=self.category).version
+
+        # Not entered as a context manager: SQLite's editor refuses to open
+        # inside the test's transaction, and the migration only executes SQL.
+        compact_positions(django_apps, connection.schema_editor())
+
+        self.assertEqual(
+            self.positions(), [(puzzles[i].solution, n) for n, i in enumerate([0, 2, 4, 3], start=1)]
+        )
+        counter = PositionCounter.objects.get(category=self.category)
+        self.assertEqual((counter.last_position, counter.version), (4, version + 1))
+        self.assertEqual(
+            list(Puzzle.objects.filter(category=compact).order_by("position").values_list("id", "updated_at")),
+            [(puzzle.id, puzzle.updated_at) for puzzle in untouched],
+        )
+
+
+class CompactBenchmarkTests(TestCase):
+    PUZZLES = 100000
+
+    # The request's target is well under a second on PostgreSQL; leave
+    # headroom for slower machines and SQLite.
+    MAX_SECONDS = 5.0
+
+    def test_compact_throughput(self):
+        category = make_category()
+        Puzzle.objects.bulk_create(
+            (
+                Puzzle(category=category, solution=f"solution {i}", clue="Clue", position=i * 3 + 1)
+                for i in range(self.PUZZLES)
+            ),
+            batch_size=5000,
+        )
+        ids = list(Puzzle.objects.filter(category=category).order_by("position").values_list("id", flat=True))
+
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(positions.compact(category.id), self.PUZZLES)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(positions.gaps(category.id), (self.PUZZLES, self.PUZZLES, 0))
+        self.assertEqual(Puzzle.objects.get(id=ids[0]).position, 1)
+        self.assertEqual(Puzzle.objects.get(id=ids[-1]).position, self.PUZZLES)
+        # A fixed handful of statements, not one per puzzle
+        self.assertLess(len(queries), 20)
+        self.assertLess(elapsed, self.MAX_SECONDS)
+
+
+class MovePuzzleTests(TestCase):
+    def setUp(self):
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 5)
+
+    def order(self):
+        return list(Puzzle.objects.filter(category=self.category).order_by("position").values_list("id", flat=True))
+
+    def ids(self, *indexes):
+        return [self.puzzles[i].id for i in indexes]
+
+    def test_move_shifts_the_puzzles_in_between(self):
+        self.assertEqual(positions.move(self.puzzles[4], 2), 2)
+        self.assertEqual(self.order(), self.ids(0, 4, 1, 2, 3))
+        self.assertEqual(positions.move(self.puzzles[0], 5), 5)
+        self.assertEqual(self.order(), self.ids(4, 1, 2, 3, 0))
+
+    def test_insert_at_shifts_later_puzzles(self):
+        puzzle = Puzzle(solution="inserted", clue="clue", category=self.category)
+        self.assertEqual(positions.insert_at(puzzle, 3), 3)
+        self.assertEqual(self.order(), self.ids(0, 1) + [puzzle.id] + self.ids(2, 3, 4))
+
+    def test_move_command(self):
+        out = io.StringIO()
+        call_command("move_puzzle", "animals", "5", "1", stdout=out)
+        self.assertEqual(self.order(), self.ids(4, 0, 1, 2, 3))
+        self.assertIn("from position 5 to 1", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "No puzzle at position 9 in animals"):
+            call_command("move_puzzle", "animals", "9", "1")
+
+    def test_insert_command(self):
+        out = io.StringIO()
+        call_command("insert_puzzle", "animals", "2", "Inserted Puzzle", "Clue", "--par-score", "4", stdout=out)
+        puzzle = Puzzle.objects.get(solution="Inserted Puzzle")
+        self.assertEqual((puzzle.position, puzzle.par_score), (2, 4))
+        self.assertEqual(self.order(), self.ids(0) + [puzzle.id] + self.ids(1, 2, 3, 4))
+        self.assertIn("at position 2 in animals", out.getvalue())
+
+        call_command("insert_puzzle", "animals", "99", "Appended Puzzle", "Clue", stdout=io.StringIO())
+        self.assertEqual(Puzzle.objects.get(solution="Appended Puzzle").position, 7)
+        self.assertEqual(PositionCounter.objects.get(category=self.category).last_position, 7)
+
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            call_command("insert_puzzle", "animals", "1", "Inserted Puzzle", "Clue")
+        with self.assertRaisesMessage(CommandError, "Category not found: birds"):
+            call_command("insert_puzzle", "birds", "1", "Bird Puzzle", "Clue")
+
+    def test_reorder_changes_the_sampler_signature(self):
+        sampler = sampling.get_sampler(self.category.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            positions.move(self.puzzles[4], 1)
+        # Same count, ids and highest position, but not the same sampler
+        self.assertNotEqual(sampling._category_signature(self.category.id), sampler.signature)
+        self.assertIsNot(sampling.get_sampler(self.category.id), sampler)
+        rebuilt = sampling.get_sampler(self.category.id)
+        self.assertEqual(rebuilt.positions[rebuilt.difficulties.index(1.0)], 1)
+
+
+class PuzzleAdminTests(TestCase):
+    def setUp(self):
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 4)
+        self.admin = PuzzleAdmin(Puzzle, AdminSite())
+
+    def save(self, puzzle, position):
+        data = {
+            "solution": puzzle.solution,
+            "clue": puzzle.clue,
+            "par_score": puzzle.par_score,
+            "category": self.category.id,
+            "position": position,
+        }
+        form = PuzzleAdminForm(data, instance=puzzle)
+        self.assertTrue(form.is_valid(), form.errors)
+        obj = form.save(commit=False)
+        self.admin.save_model(None, obj, form, change=True)
+        return obj
+
+    def order(self):
+        return list(Puzzle.objects.filter(category=self.category).order_by("position").values_list("id", flat=True))
+
+    def test_moving_to_a_taken_position(self):
+        self.save(self.puzzles[3], 1)
+        self.assertEqual(self.order(), [self.puzzles[i].id for i in (3, 0, 1, 2)])
+
+    def test_unpositioned_puzzle_given_a_taken_position(self):
+        Puzzle.objects.filter(id=self.puzzles[3].id).update(position=None)
+        puzzle = Puzzle.objects.get(id=self.puzzles[3].id)
+        self.save(puzzle, 2)
+        self.assertEqual(self.order(), [self.puzzles[i].id for i in (0, 3, 1, 2)])
+
+
+class NearDuplicateTests(TestCase):
+    def test_stem_word(self):
+        for plural, singular in [("dogs", "dog"), ("boxes", "box"), ("churches", "church"), ("glasses", "glass"), ("horses", "horse")]:
+            self.assertEqual(stem_word(plural), stem_word(singular))
+        for word in ["glass", "bus", "gas", "is", "dog"]:
+            self.assertEqual(stem_word(word), word)
+
+    def test_plurals_are_near_duplicates(self):
+        pairs = [
+            ("Big Red Dog", "big red dogs!"),
+            ("Lions Tigers Monkeys Elephants", "Lion Tiger Monkey Elephant"),
+            ("Boxes Of Glasses", "box of glass"),
+            ("Happy Horse", "Happy Horses"),
+        ]
+        index = NearDuplicateIndex([first for first, _second in pairs])
+        for first, second in pairs:
+            self.assertEqual(similarity(first, second), 1.0)
+        self.assertEqual([match for match, _score in index.check(second for _first, second in pairs)],
+                         [first for first, _second in pairs])
+
+    def test_distinct_solutions_are_kept(self):
+        pairs = [
+            ("Big Red Dog", "Big Red Cat"),
+            ("Big Red Dog", "Big Blue Dog"),
+            ("Cats And Dogs", "Cars And Dogs"),
+            ("Lions Tigers Monkeys Elephants", "Lions Tigers Monkeys Eagles"),
+        ]
+        for first, second in pairs:
+            self.assertLess(similarity(first, second), 0.7, (first, second))
+        index = NearDuplicateIndex(["Big Red Dog", "Cats And Dogs", "Lions Tigers Monkeys Elephants"])
+        self.assertEqual(index.check(second for _first, second in pairs), [None] * len(pairs))
+        self.assertEqual(list(index.pairs()), [])
+
+
+class NearDuplicateBenchmarkTests(TestCase):
+    SOLUTIONS = 100000
+    PLANTED = 50
+    CHECKED = 10000
+
+    # The request asks for 100k solutions in seconds; this is about 4s here.
+    MAX_SECONDS = 30.0
+
+    def test_index_throughput(self):
+        rng = random.Random(1)
+        words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(20000)]
+        solutions = set()
+        while len(solutions) < self.SOLUTIONS - self.PLANTED:
+            solutions.add(" ".join(rng.choice(words).capitalize() for _ in range(rng.randint(2, 6))))
+        solutions = sorted(solutions)
+        # Case and punctuation variants normalize to their originals
+        planted = {(i, len(solutions) + n) for n, i in enumerate(range(0, 5000, 100))}
+        solutions += [solutions[i].lower() + "!" for i, _copy in sorted(planted)]
+        new = [f"{solution} Zzyzx" for solution in solutions[:self.CHECKED]]
+
+        started = time.perf_counter()
+        index = NearDuplicateIndex(solutions)
+        found = {(first, second) for first, second, _score in index.pairs()}
+        checked = index.check([solutions[i].upper() for i, _copy in sorted(planted)] + new)
+        elapsed = time.perf_counter() - started
+
+        self.assertLessEqual(planted, found)
+        self.assertTrue(all(match is not None for match in checked[:self.PLANTED]))
+        self.assertEqual(len(index), self.SOLUTIONS + sum(match is None for match in checked))
+        self.assertLess(elapsed, self.MAX_SECONDS)
+
+
+class FindNearDuplicatesCommandTests(TestCase):
+    def setUp(self):
+        self.animals = make_category("animals")
+        self.colours = make_category("colours")
+        self.dog = Puzzle.objects.create(category=self.animals, solution="Big Red Dog", clue="Clue")
+        self.dogs = Puzzle.objects.create(category=self.colours, solution="big red dogs!", clue="Clue")
+        Puzzle.objects.create(category=self.animals, solution="Lions Tigers Monkeys Elephants", clue="Clue")
+        Puzzle.objects.create(category=self.colours, solution="Cats And Dogs", clue="Clue")
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command("find_near_duplicates", *args, stdout=out)
+        return out.getvalue()
+
+    def test_lists_pairs_across_categories(self):
+        output = self.run_command()
+        self.assertIn(
+            f"1.00  #{self.dog.id} 'Big Red Dog' (animals)  ~  #{self.dogs.id} 'big red dogs!' (colours)", output
+        )
+        self.assertIn("Found 1 near-duplicate pairs among 4 puzzles", output)
+
+    def test_slug_limits_the_puzzles_checked(self):
+        self.assertIn("Found 0 near-duplicate pairs among 2 puzzles", self.run_command("--slug", "animals"))
+        self.assertIn("among 4 puzzles", self.run_command("--slug", "animals", "--slug", "colours"))
+
+    def test_limit(self):
+        Puzzle.objects.create(category=self.animals, solution="Big Red Dogs", clue="Clue")
+        output = self.run_command("--limit", "1")
+        self.assertEqual(output.count("  ~  "), 1)
+        self.assertIn("... and 2 more", output)
+
+    def test_bad_arguments(self):
+        with self.assertRaisesMessage(CommandError, "Category not found: birds"):
+            self.run_command("--slug", "birds")
+        with self.assertRaisesMessage(CommandError, "--threshold must be between 0 and 1"):
+            self.run_command("--threshold", "0")
+
+
+class GenerationTests(TestCase):
+    existing = ["Lions Tigers Monkeys Elephants"]
+
+    def test_words_are_counted_by_stem(self):
+        self.assertEqual(generation.word_uses(["Lions and Tigers", "Lion Kings"]), {"lion": 2, "and": 1, "tiger": 1, "king": 1})
+        self.assertEqual(generation.acronym_words(self.existing), {"LTME": {"lion", "tiger", "monkey", "elephant"}})
+
+    def test_plural_of_a_listed_word_is_a_repeat(self):
+        generation._init_worker({})
+        buckets = generation.scan_chunk(1, ["Lion", "Lions", "Leopards", "Leopard"])
+        self.assertEqual([entry[2] for entry in buckets["L"]], ["Lion", "Leopards"])
+
+    def test_singular_of_an_existing_solution_is_not_novel(self):
+        lines = ["Lion", "Tiger", "Monkey", "Elephant", "Lynx", "Toucan", "Meerkat", "Emu"]
+        generation._init_worker(generation.word_uses(self.existing))
+        found = generation.candidates_for(
+            "LTME", generation.scan_chunk(1, lines), generation.acronym_words(self.existing)["LTME"], 20, 20,
+        )
+        self.assertEqual(dict((solution, score) for score, solution in found)["Lion Tiger Monkey Elephant"], 0.0)
+
+        generated = [solution for _acronym, _score, solution in generation.generate(lines, ["LTME"], self.existing, per_acronym=20, max_word_uses=20)]
+        self.assertIn("Lynx Toucan Meerkat Emu", generated)
+        self.assertNotIn("Lion Tiger Monkey Elephant", generated)
+
+    def test_unkept_candidates_do_not_block_later_acronyms(self):
+        lines = ["Big", "Red", "Dog", "Dogs", "Bug"]
+        generated = list(generation.generate(lines, ["BRD", "BRD"], [], per_acronym=1))
+        self.assertEqual([solution for _acronym, _score, solution in generated], ["Big Red Dog", "Bug Red Dog"])
+
+
+class DailyStreakTests(TestCase):
+    DAY = date(2026, 3, 10)
+
+    def setUp(self):
+        self.user = make_user()
+
+    def streak(self):
+        streak = DailyStreak.objects.get(user=self.user)
+        return streak.current, streak.longest, streak.last_played
+
+    def test_first_play(self):
+        streaks.record_daily_play(self.user.id, self.DAY)
+        self.assertEqual(self.streak(), (1, 1, self.DAY))
+
+    def test_same_day_and_earlier_days_change_nothing(self):
+        streaks.record_daily_play(self.user.id, self.DAY)
+        streaks.record_daily_play(self.user.id, self.DAY + timedelta(days=1))
+        streaks.record_daily_play(self.user.id, self.DAY + timedelta(days=1))
+        streaks.record_daily_play(self.user.id, self.DAY)
+        self.assertEqual(self.streak(), (2, 2, self.DAY + timedelta(days=1)))
+
+    def test_next_day_extends_and_a_gap_restarts(self):
+        for offset in range(3):
+            streaks.record_daily_play(self.user.id, self.DAY + timedelta(days=offset))
+        self.assertEqual(self.streak(), (3, 3, self.DAY + timedelta(days=2)))
+        streaks.record_daily_play(self.user.id, self.DAY + timedelta(days=4))
+        self.assertEqual(self.streak(), (1, 3, self.DAY + timedelta(days=4)))
+        streaks.record_daily_play(self.user.id, self.DAY + timedelta(days=5))
+        self.assertEqual(self.streak(), (2, 3, self.DAY + timedelta(days=5)))
+
+    def test_summary(self):
+        self.assertEqual(streaks.streak_summary(None, self.DAY), {"current": 0, "longest": 0, "last_played": None})
+        streak = DailyStreak(user=self.user, current=4, longest=6, last_played=self.DAY)
+        expected = {"current": 4, "longest": 6, "last_played": "2026-03-10"}
+        self.assertEqual(streaks.streak_summary(streak, self.DAY), expected)
+        # Still alive until the end of the next day, broken after that
+        self.assertEqual(streaks.streak_summary(streak, self.DAY + timedelta(days=1)), expected)
+        self.assertEqual(streaks.streak_summary(streak, self.DAY + timedelta(days=2)), {**expected, "current": 0})
+
+    def test_backfill(self):
+        other = make_user("other")
+        category = make_category()
+        puzzles = make_puzzles(category, 6)
+        plays = {
+            self.user: [0, 1, 1, 2, 4, 5],
+            other: [3],
+        }
+        for user, offsets in plays.items():
+            for puzzle, offset in zip(puzzles, offsets):
+                UserProgress.objects.create(
+                    user=user, category=category, puzzle=puzzle, game_mode=UserProgress.GameMode.DAILY,
+                    score=3, played_on=self.DAY + timedelta(days=offset),
+                )
+        # Neither a dateless daily row nor a levels row counts
+        UserProgress.objects.filter(user=other).update(played_on=None)
+        make_progress(other, puzzles[1:3], UserProgress.GameMode.LEVELS, [3, 3])
+        UserProgress.objects.create(
+            user=other, category=category, puzzle=puzzles[4], game_mode=UserProgress.GameMode.DAILY,
+            score=3, played_on=self.DAY,
+        )
+        DailyStreak.objects.create(user=self.user, current=40, longest=40, last_played=self.DAY)
+
+        written = []
+        self.assertEqual(streaks.backfill(progress=written.append), 2)
+        self.assertEqual(written, [2])
+        self.assertEqual(self.streak(), (2, 3, self.DAY + timedelta(days=5)))
+        other_streak = DailyStreak.objects.get(user=other)
+        self.assertEqual((other_streak.current, other_streak.longest, other_streak.last_played), (1, 1, self.DAY))
+
+    def test_view(self):
+        today = daily.local_today(0)
+        DailyStreak.objects.create(user=self.user, current=3, longest=5, last_played=today - timedelta(days=1))
+        with signed_in(self.user):
+            response = self.client.get("/api/daily/streak/", {"tz_offset": "0"}, **AUTH)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                "current": 3, "longest": 5, "last_played": (today - timedelta(days=1)).isoformat(),
+            })
+            self.assertEqual(self.client.get("/api/daily/streak/", {"tz_offset": "soon"}, **AUTH).status_code, 400)
+
+        newcomer = make_user("newcomer")
+        with signed_in(newcomer):
+            response = self.client.get("/api/daily/streak/", **AUTH)
+        self.assertEqual(response.json(), {"current": 0, "longest": 0, "last_played": None})
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category()
+        self.players = {}
+        for name, score in [("ann", 30), ("bob", 20), ("cat", 20), ("dan", 10)]:
+            self.players[name] = make_user(name)
+            submit_endless(self.players[name], self.category, score)
+
+    def buckets(self):
+        return dict(LeaderboardBucket.objects.filter(category=self.category, players__gt=0).values_list("score", "players"))
+
+    def test_rank_for_score(self):
+        rank = leaderboards.rank_for_score
+        self.assertEqual(rank(self.category.id, 30), (1, 4))
+        # Ties share a rank
+        self.assertEqual(rank(self.category.id, 20), (2, 4))
+        self.assertEqual(rank(self.category.id, 10), (4, 4))
+        self.assertEqual(rank(self.category.id, 5), (5, 4))
+        self.assertEqual(rank(make_category("empty").id, 5), (1, 0))
+
+    def test_score_change_moves_the_player(self):
+        submit_endless(self.players["dan"], self.category, 25)
+        submit_endless(self.players["dan"], self.category, 12)
+        self.assertEqual(self.buckets(), {30: 1, 25: 1, 20: 2})
+        self.assertEqual(leaderboards.rank_for_score(self.category.id, 20), (3, 4))
+
+    def test_top_scores(self):
+        self.assertEqual(leaderboards.top_scores(self.category.id, 3), [
+            {"rank": 1, "username": "ann", "high_score": 30},
+            {"rank": 2, "username": "bob", "high_score": 20},
+            {"rank": 2, "username": "cat", "high_score": 20},
+        ])
+
+    def test_top_cache_invalidation(self):
+        key = leaderboards._top_cache_key(self.category.id)
+        leaderboards.top_scores(self.category.id)
+        # A board shorter than the cached limit changes with any new player
+        submit_endless(make_user("eve"), self.category, 1)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(leaderboards.top_scores(self.category.id)[-1]["username"], "eve")
+
+        full = [{"rank": i + 1, "username": f"p{i}", "high_score": 50} for i in range(leaderboards.TOP_LIMIT_MAX)]
+        cache.set(key, full)
+        # A full board only changes when a score reaches it
+        submit_endless(make_user("fay"), self.category, 40)
+        self.assertEqual(cache.get(key), full)
+        submit_endless(self.players["dan"], self.category, 50)
+        self.assertIsNone(cache.get(key))
+
+        cache.set(key, full)
+        leaderboards.record_score_removed(self.category.id, 50)
+        self.assertIsNone(cache.get(key))
+
+    def test_rebuild_locks_before_reading_scores(self):
+        LeaderboardBucket.objects.filter(category=self.category, score=20).update(players=7)
+        LeaderboardBucket.objects.create(category=self.category, score=99, players=3)
+        locked = []
+
+        def lock(model):
+            locked.append(model)
+            self.assertTrue(connection.in_atomic_block)
+            self.assertFalse(any("core_endlessscore" in query["sql"] for query in queries.captured_queries))
+
+        with CaptureQueriesContext(connection) as queries, mock.patch("core.leaderboards.lock_for_rebuild", side_effect=lock):
+            self.assertEqual(leaderboards.rebuild(), 3)
+        self.assertEqual(locked, [LeaderboardBucket])
+        self.assertEqual(self.buckets(), {30: 1, 20: 2, 10: 1})
+
+    def test_view(self):
+        private = make_category("private", creator=self.players["ann"])
+        with signed_in(self.players["bob"]):
+            response = self.client.get("/api/endless/leaderboard/", {"slug": self.category.slug, "limit": "2"}, **AUTH)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                "category_slug": self.category.slug,
+                "top": [
+                    {"rank": 1, "username": "ann", "high_score": 30},
+                    {"rank": 2, "username": "bob", "high_score": 20},
+                ],
+                "me": {"high_score": 20, "rank": 2, "players": 4},
+            })
+            self.assertEqual(self.client.get("/api/endless/leaderboard/", **AUTH).status_code, 400)
+            response = self.client.get("/api/endless/leaderboard/", {"slug": self.category.slug, "limit": "x"}, **AUTH)
+            self.assertEqual(response.status_code, 400)
+            # Someone else's category
+            response = self.client.get("/api/endless/leaderboard/", {"slug": private.slug}, **AUTH)
+            self.assertEqual(response.status_code, 404)
+
+        with signed_in(make_user("new")):
+            response = self.client.get("/api/endless/leaderboard/", {"slug": self.category.slug}, **AUTH)
+        self.assertIsNone(response.json()["me"])
+        self.assertEqual(len(response.json()["top"]), 4)
+
+
+class TombstonedSubmitTests(TestCase):
+    def test_deleted_user_cannot_submit(self):
+        cache.clear()
+        category = make_category()
+        user = make_user()
+        submit_endless(user, category, 10)
+        deletion.tombstone([user.clerk_id])
+
+        with signed_in(user):
+            response = self.client.post(f"/api/endless/submit/?slug={category.slug}&score=50", **AUTH)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(EndlessScore.objects.get(user=user, category=category).high_score, 10)
+        self.assertEqual(leaderboards.rank_for_score(category.id, 50), (1, 0))
+
+
+def write_csv(directory, name, rows, columns=("solution", "clue", "par_score")):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return path
+
+
+def category_rows(category):
+    return list(
+        Puzzle.objects.filter(category=category)
+        .order_by("position")
+        .values_list("solution", "clue", "par_score", "position", "content_hash")
+    )
+
+
+class PuzzleImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.category = make_category()
+        self.other = make_category("other")
+        Puzzle.objects.create(solution="Big Red Dog", clue="clue", category=self.other, par_score=3)
+
+    def csv(self, name, rows, **kwargs):
+        return write_csv(self.directory, name, rows, **kwargs)
+
+    def test_skips_preloaded_and_repeated_duplicates(self):
+        first = self.csv("first.csv", [
+            ("Big Red Dog", "taken in another category", 3),
+            ("Lions  Tigers", "big cats", 4),
+            ("Lions Tigers", "repeated in the file", 4),
+            ("Green Eggs Ham", "breakfast", ""),
+        ])
+        second = self.csv("second.csv", [("Lions Tigers", "repeated across files", 2)])
+        importer = importing.PuzzleImporter(near_duplicates=False)
+
+        report = importer.import_file(first, self.category)
+        self.assertEqual((report.read, report.imported, report.duplicates, report.invalid), (4, 2, 2, 0))
+        # Duplicates are caught without a query per row
+        with self.assertNumQueries(0):
+            report = importer.import_file(second, self.category)
+        self.assertEqual((report.imported, report.duplicates), (0, 1))
+
+        self.assertEqual(
+            [row[:4] for row in category_rows(self.category)],
+            [("Lions Tigers", "big cats", 4, 1), ("Green Eggs Ham", "breakfast", importing.DEFAULT_PAR_SCORE, 2)],
+        )
+
+    def test_reports_invalid_rows(self):
+        path = self.csv("invalid.csv", [
+            ("", "no solution", 3),
+            ("Single", "one word", 3),
+            ("Two Words", "", 3),
+            ("Par Words", "clue", "x"),
+            ("Zero Par", "clue", 0),
+            ("Good Words", "clue", 2),
+            ("Big Red Dogs", "near duplicate", 2),
+        ])
+        report = importing.PuzzleImporter().import_file(path, self.category)
+
+        self.assertEqual((report.read, report.imported, report.invalid, report.near_duplicates), (7, 1, 5, 1))
+        self.assertEqual(report.errors, [
+            "row 1: missing solution",
+            "row 2: solution needs at least two words to make an acronym",
+            "row 3: missing clue",
+            "row 4: par_score is not an integer: 'x'",
+            "row 5: par_score must be positive: 0",
+            "Big Red Dogs: near duplicate of 'Big Red Dog' (1.00)",
+        ])
+        missing = importing.PuzzleImporter().import_file(os.path.join(self.directory, "missing.csv"), self.category)
+        self.assertEqual((missing.invalid, missing.imported), (1, 0))
+
+    def test_keep_positions(self):
+        Puzzle.objects.create(solution="Taken Spot", clue="clue", category=self.category, position=2)
+        path = self.csv("positions.csv", [
+            ("First Puzzle", "clue", 3, 5),
+            ("Second Puzzle", "clue", 3, 2),
+            ("Third Puzzle", "clue", 3, "x"),
+        ], columns=("solution", "clue", "par_score", "position"))
+        report = importing.PuzzleImporter().import_file(path, self.category, keep_positions=True)
+
+        self.assertEqual((report.imported, report.invalid), (1, 2))
+        self.assertEqual(Puzzle.objects.get(solution="First Puzzle").position, 5)
+        # Later appends go after the kept positions
+        self.assertEqual(PositionCounter.objects.reserve(self.category.id), 6)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.csv("dry.csv", [("Lions Tigers", "big cats", 4), ("Green Eggs Ham", "breakfast", 2)])
+        out = io.StringIO()
+        call_command("import_puzzle_csvs", f"{self.category.slug}={path}", "--dry-run", stdout=out)
+
+        self.assertIn("Would import 2 puzzles", out.getvalue())
+        self.assertFalse(Puzzle.objects.filter(category=self.category).exists())
+        self.assertFalse(PositionCounter.objects.filter(category=self.category).exists())
+
+        # Without --confirm nothing is imported either
+        call_command("import_puzzle_csvs", f"{self.category.slug}={path}", stdout=out)
+        self.assertFalse(Puzzle.objects.filter(category=self.category).exists())
+        call_command("import_puzzle_csvs", f"{self.category.slug}={path}", "--confirm", stdout=out)
+        self.assertEqual(Puzzle.objects.filter(category=self.category).count(), 2)
+
+    def test_batches_are_atomic(self):
+        path = self.csv("batches.csv", [(f"Batch Puzzle {i}", "clue", 3) for i in range(7)])
+        real_bulk_create = Puzzle.objects.bulk_create
+        calls = []
+
+        def bulk_create(puzzles, **kwargs):
+            calls.append(len(puzzles))
+            if len(calls) == 2:
+                raise DataError("disk full")
+            return real_bulk_create(puzzles, **kwargs)
+
+        importer = importing.PuzzleImporter(batch_size=3, use_copy=False, near_duplicates=False)
+        with mock.patch.object(Puzzle.objects, "bulk_create", side_effect=bulk_create):
+            with self.assertRaises(DataError):
+                importer.import_file(path, self.category)
+
+        # The first batch is in; the failed one left neither rows nor positions behind
+        self.assertEqual([row[3] for row in category_rows(self.category)], [1, 2, 3])
+        self.assertEqual(PositionCounter.objects.get(category=self.category).last_position, 3)
+
+    def test_copy_path_is_used_when_enabled(self):
+        path = self.csv("copy.csv", [(f"Copied Puzzle {i}", "clue", 3) for i in range(5)])
+        self.assertEqual(importing.PuzzleImporter().use_copy, importing.copy_available())
+
+        importer = importing.PuzzleImporter(batch_size=2, use_copy=True, near_duplicates=False)
+        with mock.patch("core.importing._copy_puzzles") as copy, \
+                mock.patch.object(Puzzle.objects, "bulk_create") as bulk_create:
+            report = importer.import_file(path, self.category)
+        self.assertEqual(report.imported, 5)
+        bulk_create.assert_not_called()
+        batches = [call.args[0] for call in copy.call_args_list]
+        self.assertEqual([[puzzle.position for puzzle in batch] for batch in batches], [[1, 2], [3, 4], [5]])
+
+    def test_copy_and_bulk_create_write_the_same_rows(self):
+        if not importing.copy_available():
+            self.skipTest("COPY needs PostgreSQL with psycopg2")
+        path = self.csv("same.csv", [(f"Same Puzzle {i}", f"clue, with \"quotes\" {i}", i % 9 + 1) for i in range(50)])
+
+        importing.PuzzleImporter(batch_size=20, use_copy=True).import_file(path, self.category)
+        copied = category_rows(self.category)
+        self.assertFalse(Puzzle.objects.filter(category=self.category, created_at__isnull=True).exists())
+        Puzzle.objects.filter(category=self.category).delete()
+        PositionCounter.objects.filter(category=self.category).delete()
+
+        importing.PuzzleImporter(batch_size=20, use_copy=False).import_file(path, self.category)
+        self.assertEqual(category_rows(self.category), copied)
+        self.assertEqual(len(copied), 50)
+
+
+class ImportBenchmarkTests(TestCase):
+    ROWS = 10000
+
+    # "10k rows in seconds", with near-duplicate checks on
+    MAX_SECONDS = 10
+
+    def test_import_10k_rows(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        category = make_category()
+        rng = random.Random(3)
+        words = [f"{rng.choice('ABCDEFGHIJKLMNOPRSTW')}{rng.randrange(10**6):06d}" for _ in range(3 * self.ROWS)]
+        path = write_csv(directory.name, "big.csv", [
+            (f"{words[3 * i]} {words[3 * i + 1]} {words[3 * i + 2]}", f"clue {i}", i % 9 + 1)
+            for i in range(self.ROWS)
+        ])
+
+        started = time.perf_counter()
+        report = importing.PuzzleImporter().import_file(path, category)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(report.imported, self.ROWS)
+        self.assertEqual(Puzzle.objects.filter(category=category).count(), self.ROWS)
+        self.assertLess(elapsed, self.MAX_SECONDS)
+
+
+class ParallelImportTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.categories = [make_category(slug) for slug in ("birds", "fish", "trees")]
+        # Files of very different sizes finish parsing out of order, and
+        # repeats across files make the writing order matter
+        sizes = [3000, 10, 400, 1, 1200]
+        self.sources = []
+        for i, size in enumerate(sizes):
+            rows = [(f"Shared Puzzle {j}", f"clue {i}", 3) for j in range(5)]
+            rows += [(f"File{i} Puzzle {j}", "clue", j % 9 + 1) for j in range(size)]
+            if i % 2:
+                rows.reverse()
+            path = write_csv(directory.name, f"file{i}.csv", rows)
+            self.sources.append((path, self.categories[i % len(self.categories)]))
+
+    def imported(self, workers):
+        importer = importing.PuzzleImporter(batch_size=250, near_duplicates=False)
+        reports = list(importer.import_files(self.sources, workers=workers))
+        rows = list(
+            Puzzle.objects.order_by("category__slug", "position").values_list("category__slug", "solution", "position")
+        )
+        Puzzle.objects.all().delete()
+        PositionCounter.objects.all().delete()
+        return rows, [(report.path, report.imported, report.duplicates) for report in reports]
+
+    def test_positions_do_not_depend_on_workers(self):
+        rows, reports = self.imported(workers=1)
+        self.assertEqual(len(rows), 3000 + 10 + 400 + 1 + 1200 + 5)
+        self.assertEqual(self.imported(workers=3), (rows, reports))
+        # Two workers parse at most four files ahead, so the writer catches up mid-list
+        self.assertEqual(self.imported(workers=2), (rows, reports))
+        self.assertEqual([path for path, _imported, _duplicates in reports], [path for path, _ in self.sources])
+
+
+class SyncCsvTests(TestCase):
+    ORIGINAL = [
+        ("Lions Tigers", "big cats", 4),
+        ("Green Eggs Ham", "breakfast", 3),
+        ("Red Sky Night", "shepherds", 5),
+        ("Blue Moon Rising", "rare", 2),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.category = make_category()
+        importing.sync_file(self.csv("original.csv", self.ORIGINAL), self.category)
+        self.puzzles = {puzzle.solution: puzzle for puzzle in Puzzle.objects.filter(category=self.category)}
+
+    def csv(self, name, rows):
+        return write_csv(self.directory, name, rows)
+
+    def state(self):
+        return {
+            solution: (puzzle_id, clue, par_score, position)
+            for puzzle_id, solution, clue, par_score, position in Puzzle.objects.filter(category=self.category)
+            .values_list("id", "solution", "clue", "par_score", "position")
+        }
+
+    def test_first_sync_appends_in_file_order(self):
+        self.assertEqual(
+            [row[:4] for row in category_rows(self.category)],
+            [row + (position,) for position, row in enumerate(self.ORIGINAL, 1)],
+        )
+
+    def test_changed_new_and_removed_rows(self):
+        player = make_user()
+        lions = self.puzzles["Lions Tigers"]
+        make_progress(player, [lions], UserProgress.GameMode.LEVELS, [4])
+        path = self.csv("changed.csv", [
+            ("Lions Tigers", "striped and maned", 4),
+            ("Green Eggs Ham", "breakfast", 3),
+            ("Blue Moon Rising", "rare", 6),
+            ("Owls Hoot Nightly", "birds", 2),
+        ])
+        before = self.state()
+
+        report = importing.sync_file(path, self.category)
+
+        self.assertEqual(
+            (report.inserted, report.updated, report.deleted, report.unchanged), (1, 2, 1, 1)
+        )
+        after = self.state()
+        # Updated in place: same id and position, so progress survives
+        self.assertEqual(after["Lions Tigers"], (lions.id, "striped and maned", 4, 1))
+        self.assertEqual(after["Blue Moon Rising"], before["Blue Moon Rising"][:2] + (6, 4))
+        self.assertEqual(after["Green Eggs Ham"], before["Green Eggs Ham"])
+        self.assertNotIn("Red Sky Night", after)
+        # New rows go after the last position handed out, leaving the gap
+        self.assertEqual(after["Owls Hoot Nightly"][3], 5)
+        self.assertTrue(UserProgress.objects.filter(user=player, puzzle=lions).exists())
+        self.assertEqual(
+            Puzzle.objects.get(solution="Lions Tigers").content_hash,
+            importing.puzzle_content_hash("Lions Tigers", "striped and maned", 4),
+        )
+
+    def test_unchanged_file_is_one_query(self):
+        path = self.csv("same.csv", self.ORIGINAL)
+        before = self.state()
+        with self.assertNumQueries(1):
+            report = importing.sync_file(path, self.category)
+        self.assertEqual((report.changed, report.unchanged), (0, len(self.ORIGINAL)))
+        self.assertEqual(self.state(), before)
+
+    def test_dry_run_and_keep_missing(self):
+        path = self.csv("smaller.csv", self.ORIGINAL[:2] + [("Owls Hoot Nightly", "birds", 2)])
+        before = self.state()
+        report = importing.sync_file(path, self.category, dry_run=True)
+        self.assertEqual((report.inserted, report.deleted), (1, 2))
+        self.assertEqual(self.state(), before)
+
+        report = importing.sync_file(path, self.category, delete=False)
+        self.assertEqual((report.inserted, report.deleted), (1, 0))
+        self.assertEqual(len(self.state()), len(self.ORIGINAL) + 1)
+
+    def test_conflicts_and_missing_files(self):
+        other = make_category("other")
+        Puzzle.objects.create(solution="Owls Hoot Nightly", clue="clue", category=other, par_score=3)
+        report = importing.sync_file(self.csv("conflict.csv", self.ORIGINAL + [("Owls Hoot Nightly", "birds", 2)]), self.category)
+        self.assertEqual((report.inserted, report.conflicts), (0, 1))
+        self.assertEqual(report.errors, ["Owls Hoot Nightly: already a puzzle in another category"])
+
+        before = self.state()
+        report = importing.sync_file(os.path.join(self.directory, "missing.csv"), self.category)
+        self.assertEqual((report.invalid, report.deleted), (1, 0))
+        self.assertEqual(self.state(), before)
+
+    def test_command(self):
+        path = self.csv("command.csv", self.ORIGINAL[1:])
+        out = io.StringIO()
+        call_command("sync_puzzle_csv", self.category.slug, path, "--dry-run", stdout=out)
+        self.assertIn("Would sync animals: 0 inserted, 0 updated, 1 deleted, 3 unchanged", out.getvalue())
+        call_command("sync_puzzle_csv", self.category.slug, path, "--keep-missing", stdout=out)
+        self.assertEqual(len(self.state()), len(self.ORIGINAL))
+        call_command("sync_puzzle_csv", self.category.slug, path, stdout=out)
+        self.assertEqual(len(self.state()), len(self.ORIGINAL) - 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 5)
+        Puzzle.objects.filter(id=self.puzzles[0].id).update(clue='commas, "quotes" and ünïcode')
+        self.user = make_user()
+        make_progress(self.user, self.puzzles[:3], UserProgress.GameMode.LEVELS, [2, 3, 4])
+        submit_endless(self.user, self.category, 12)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def expected(self, name, since=None):
+        _, _, fields = exporting.EXPORTS[name]
+        return [
+            [exporting._plain(value) for value in row]
+            for row in exporting.export_queryset(name, since)
+        ], fields
+
+    def test_jsonl_round_trip(self):
+        for name in exporting.EXPORTS:
+            path = self.path(f"{name}.jsonl.gz")
+            count, latest = exporting.export(name, path, chunk_size=2)
+            rows, fields = self.expected(name)
+            with gzip.open(path, "rt", encoding="utf-8") as exported:
+                self.assertEqual([json.loads(line) for line in exported], [dict(zip(fields, row)) for row in rows])
+            self.assertEqual(count, len(rows))
+            self.assertIsNotNone(latest)
+
+        with gzip.open(self.path("progress.jsonl.gz"), "rt", encoding="utf-8") as exported:
+            self.assertEqual(json.loads(next(exported))["score"], 2)
+
+    def test_csv_round_trip(self):
+        path = self.path("puzzles.csv.gz")
+        self.assertEqual(exporting.export("puzzles", path, fmt="csv")[0], 5)
+        rows, fields = self.expected("puzzles")
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as exported:
+            reader = csv.reader(exported)
+            self.assertEqual(next(reader), fields)
+            self.assertEqual(list(reader), [["" if value is None else str(value) for value in row] for row in rows])
+
+    def test_since_includes_edited_puzzles(self):
+        _count, latest = exporting.export("puzzles", self.path("all.jsonl.gz"))
+        later = latest + timedelta(seconds=1)
+        newer = Puzzle.objects.create(solution="new puzzle", clue="clue", category=self.category)
+        edited = self.puzzles[3]
+        edited.clue = "edited"
+        edited.save()
+        # A reorder counts as a change too
+        positions.move(self.puzzles[1], 5)
+        Puzzle.objects.filter(id__in=[newer.id, edited.id]).update(updated_at=later)
+
+        count, _latest = exporting.export("puzzles", self.path("since.jsonl.gz"), since=later)
+        with gzip.open(self.path("since.jsonl.gz"), "rt", encoding="utf-8") as exported:
+            ids = {json.loads(line)["id"] for line in exported}
+        self.assertEqual(ids, {newer.id, edited.id})
+        self.assertEqual(count, 2)
+
+        synced = self.puzzles[0]
+        path = write_csv(self.directory, "sync.csv", [(synced.solution, "synced clue", synced.par_score)])
+        importing.sync_file(path, self.category, delete=False)
+        os.remove(path)
+        self.assertGreater(Puzzle.objects.get(id=synced.id).updated_at, latest)
+
+        count, _latest = exporting.export("puzzles", self.path("moved.jsonl.gz"), since=latest + timedelta(microseconds=1))
+        with gzip.open(self.path("moved.jsonl.gz"), "rt", encoding="utf-8") as exported:
+            ids = {json.loads(line)["id"] for line in exported}
+        self.assertTrue({self.puzzles[0].id, self.puzzles[1].id, newer.id, edited.id} <= ids)
+
+    def test_failed_export_leaves_no_file(self):
+        path = self.path("failed.jsonl.gz")
+        with mock.patch("core.exporting._plain", side_effect=[1, 2, 3, RuntimeError("connection lost")]):
+            with self.assertRaises(RuntimeError):
+                exporting.export("puzzles", path)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        with self.assertRaises(ValueError):
+            exporting.export("puzzles", path, fmt="xml")
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_command(self):
+        out = io.StringIO()
+        tomorrow = (date.today() + timedelta(days=2)).isoformat()
+        call_command("export_data", "puzzles", "progress", "--output-dir", self.directory, "--format", "csv", stdout=out)
+        call_command("export_data", "--output-dir", self.directory, "--since", tomorrow, stdout=out)
+        self.assertIn("Exported 5 puzzles rows", out.getvalue())
+        self.assertIn("Exported 0 endless_scores rows", out.getvalue())
+        self.assertEqual(len(os.listdir(self.directory)), 5)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(".partial")])
+
+
+class DailyScheduleTests(TestCase):
+    START = date(2026, 3, 1)
+
+    def setUp(self):
+        cache.clear()
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 7)
+
+    def schedule(self, category=None):
+        return dict(
+            DailyPuzzle.objects.filter(category=category or self.category).values_list("date", "puzzle_id")
+        )
+
+    def expected(self, days, puzzles=None):
+        ids = [puzzle.id for puzzle in puzzles or self.puzzles]
+        return {
+            self.START + timedelta(days=offset): ids[daily.date_seed(self.START + timedelta(days=offset)) % len(ids)]
+            for offset in range(days)
+        }
+
+    def test_schedule_is_deterministic(self):
+        self.assertEqual(daily.schedule_category(self.category, self.START, 10), 10)
+        self.assertEqual(self.schedule(), self.expected(10))
+        first = self.schedule()
+
+        # Scheduled days keep their puzzle when puzzles are added
+        Puzzle.objects.create(solution="late addition", clue="clue", category=self.category)
+        self.assertEqual(daily.schedule_category(self.category, self.START, 12), 2)
+        schedule = self.schedule()
+        self.assertEqual({day: schedule[day] for day in first}, first)
+
+        # Rescheduling from scratch picks the same puzzles again
+        DailyPuzzle.objects.all().delete()
+        daily.schedule_category(self.category, self.START, 12)
+        puzzles = list(Puzzle.objects.filter(category=self.category).order_by("position"))
+        self.assertEqual(self.schedule(), self.expected(12, puzzles))
+        self.assertEqual(daily.schedule_category(make_category("empty"), self.START, 5), 0)
+
+    def test_command(self):
+        inactive = make_category("inactive")
+        inactive.is_active = False
+        inactive.save()
+        make_puzzles(inactive, 2)
+        other = make_category("other")
+        make_puzzles(other, 3)
+        out = io.StringIO()
+
+        call_command("schedule_daily_puzzles", "--start", "2026-03-01", "--days", "4", "--slug", "animals", stdout=out)
+        self.assertEqual(self.schedule(), self.expected(4))
+        self.assertFalse(DailyPuzzle.objects.filter(category=other).exists())
+        call_command("schedule_daily_puzzles", "--start", "2026-03-01", "--days", "4", stdout=out)
+        self.assertEqual(len(self.schedule(other)), 4)
+        self.assertFalse(DailyPuzzle.objects.filter(category=inactive).exists())
+        self.assertIn("Successfully scheduled 4 daily puzzles from 2026-03-01 to 2026-03-04.", out.getvalue())
+
+    def test_unscheduled_day_is_picked_on_demand(self):
+        with self.assertLogs("core.daily", "WARNING"):
+            payload = daily.daily_payload(self.category, self.START)
+        puzzle = Puzzle.objects.get(id=self.expected(1)[self.START])
+        self.assertEqual(payload, {
+            "acronym": getAcronymFromSolution(puzzle.solution),
+            "clue": puzzle.clue,
+            "par_score": puzzle.par_score,
+            "position": puzzle.position,
+        })
+        self.assertEqual(self.schedule(), self.expected(1))
+        # Cached from then on
+        with self.assertNumQueries(0):
+            self.assertEqual(daily.daily_payload(self.category, self.START), payload)
+        self.assertIsNone(daily.daily_payload(make_category("empty"), self.START))
+
+    def test_losing_the_race_keeps_the_callers_transaction(self):
+        # Another request scheduled a different puzzle between the lookup and the insert
+        DailyPuzzle.objects.create(date=self.START, category=self.category, puzzle=self.puzzles[0])
+        with transaction.atomic(), self.assertLogs("core.daily", "WARNING"):
+            scheduled = daily._schedule_one(self.category, self.START)
+            self.assertEqual(scheduled.puzzle_id, self.puzzles[0].id)
+            # Still usable: without a savepoint PostgreSQL aborts the transaction here
+            self.assertEqual(DailyPuzzle.objects.count(), 1)
+
+    def test_view(self):
+        DailyPuzzle.objects.create(date=daily.local_today(0), category=self.category, puzzle=self.puzzles[2])
+        response = self.client.get("/api/daily/", {"slug": self.category.slug, "tz_offset": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["clue"], self.puzzles[2].clue)
+        self.assertEqual(response.json()["position"], self.puzzles[2].position)
+        self.assertEqual(self.client.get("/api/daily/").status_code, 400)
+        self.assertEqual(self.client.get("/api/daily/", {"slug": "missing"}).status_code, 404)
+        self.assertEqual(self.client.get("/api/daily/", {"slug": make_category("empty").slug}).status_code, 404)
+
+
+class DailyBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        daily._bundles.clear()
+        self.addCleanup(daily._bundles.clear)
+        self.today = daily.local_today(0)
+        self.categories = [make_category("animals"), make_category("birds")]
+        for category in self.categories:
+            make_puzzles(category, 3)
+            daily.schedule_category(category, self.today, 5)
+        hidden = make_category("hidden")
+        hidden.is_active = False
+        hidden.save()
+        make_puzzles(hidden, 2)
+        make_puzzles(make_category("private", creator=make_user()), 2)
+        make_category("empty")
+
+    def test_bundle(self):
+        response = self.client.get("/api/daily/all/", {"tz_offset": "0"})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["date"], self.today.isoformat())
+        self.assertEqual([item["category_slug"] for item in body["puzzles"]], ["animals", "birds"])
+        for item, category in zip(body["puzzles"], self.categories):
+            self.assertEqual(item, {"category_slug": category.slug, **daily.daily_payload(category, self.today)})
+
+    def test_cache_headers_and_etag(self):
+        response = self.client.get("/api/daily/all/")
+        etag = response["ETag"]
+        # Strong: quoted, no W/ prefix
+        self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+        cache_control = dict(
+            part.strip().partition("=")[::2] for part in response["Cache-Control"].split(",")
+        )
+        self.assertIn("public", cache_control)
+        self.assertTrue(0 < int(cache_control["max-age"]) <= daily.seconds_until_midnight(0))
+        self.assertEqual(response["Expires"], http_date(daily.next_midnight(0).timestamp()))
+
+        # Built once per process per day
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/daily/all/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+        self.assertEqual(again["ETag"], etag)
+        self.assertIn("max-age", again["Cache-Control"])
+
+        stale = self.client.get("/api/daily/all/", HTTP_IF_NONE_MATCH='"stale", "other"')
+        self.assertEqual((stale.status_code, stale.content), (200, response.content))
+        self.assertEqual(self.client.get("/api/daily/all/", HTTP_IF_NONE_MATCH=f'"stale", {etag}').status_code, 304)
+
+    def test_bad_offset(self):
+        self.assertEqual(self.client.get("/api/daily/all/", {"tz_offset": "east"}).status_code, 400)
+
+    def test_only_a_few_days_are_kept(self):
+        for offset in range(5):
+            daily.daily_bundle(self.today + timedelta(days=offset))
+        self.assertEqual(sorted(daily._bundles), [self.today + timedelta(days=offset) for offset in (2, 3, 4)])
+
+
+class FixedClock(datetime):
+    """datetime whose now() is 23:30 UTC on 2026-03-10."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 3, 10, 23, 30, tzinfo=dt_timezone.utc).astimezone(tz)
+
+
+class DailyOffsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 5)
+        clock = mock.patch("core.daily.datetime", FixedClock)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_parse_offset(self):
+        cases = {
+            None: 0, "": 0, "0": 0, "60": 1, "-300": -5,
+            # Half-hour zones always round up
+            "330": 6, "-330": -5, "-30": 0, "30": 1, "89": 1,
+            # Clamped to real time zones
+            "840": 14, "10000": 14, "-720": -12, "-10000": -12,
+        }
+        for raw, hours in cases.items():
+            self.assertEqual(daily.parse_offset(raw), hours, raw)
+        for raw in ["east", "1.5", "60m"]:
+            with self.assertRaises(ValueError):
+                daily.parse_offset(raw)
+
+    def test_local_dates(self):
+        self.assertEqual(daily.local_today(0), date(2026, 3, 10))
+        self.assertEqual(daily.local_today(1), date(2026, 3, 11))
+        self.assertEqual(daily.local_today(-12), date(2026, 3, 10))
+        self.assertEqual(daily.seconds_until_midnight(0), 30 * 60)
+        self.assertEqual(daily.seconds_until_midnight(1), 23 * 60 * 60 + 30 * 60)
+
+    def test_each_offset_gets_its_own_day(self):
+        daily.schedule_category(self.category, date(2026, 3, 10), 2)
+        self.assertEqual(len(set(DailyPuzzle.objects.values_list("puzzle_id", flat=True))), 2)
+        expected = {
+            "0": date(2026, 3, 10), "-600": date(2026, 3, 10), "60": date(2026, 3, 11), "330": date(2026, 3, 11),
+        }
+        for raw, day in expected.items():
+            response = self.client.get("/api/daily/", {"slug": self.category.slug, "tz_offset": raw})
+            puzzle = DailyPuzzle.objects.get(date=day).puzzle
+            self.assertEqual(response.json()["position"], puzzle.position, raw)
+        response = self.client.get("/api/daily/", {"slug": self.category.slug, "tz_offset": "0"})
+        self.assertIn("max-age=1800", response["Cache-Control"])
+        self.assertEqual(self.client.get("/api/daily/", {"slug": self.category.slug, "tz_offset": "x"}).status_code, 400)
+
+    def test_stats_view(self):
+        yesterday, today = date(2026, 3, 9), date(2026, 3, 10)
+        DailyStats.objects.create(date=today, category=self.category, guesses=3, completions=2)
+        DailyStats.objects.create(date=today, category=self.category, guesses=5, completions=1)
+        DailyStats.objects.create(date=yesterday, category=self.category, guesses=1, completions=9)
+        # Counted by this process but not flushed yet
+        daily.record_completion(today, self.category.id, 5)
+        self.addCleanup(daily.daily_stats._pending.clear)
+
+        response = self.client.get("/api/daily/stats/", {"slug": self.category.slug, "tz_offset": "-60"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "date": "2026-03-10",
+            "solves": 4,
+            "distribution": [
+                {"guesses": 3, "count": 2, "percent": 50.0},
+                {"guesses": 5, "count": 2, "percent": 50.0},
+            ],
+        })
+        # Already the 11th an hour east, and nobody has solved it yet
+        response = self.client.get("/api/daily/stats/", {"slug": self.category.slug, "tz_offset": "60"})
+        self.assertEqual(response.json(), {"date": "2026-03-11", "solves": 0, "distribution": []})
+
+        self.assertEqual(self.client.get("/api/daily/stats/").status_code, 400)
+        self.assertEqual(self.client.get("/api/daily/stats/", {"slug": "missing"}).status_code, 404)
+        self.assertEqual(
+            self.client.get("/api/daily/stats/", {"slug": self.category.slug, "tz_offset": "soon"}).status_code, 400
+        )
+
+
+class PositionCounterTests(TestCase):
+    def setUp(self):
+        self.category = make_category()
+        self.puzzle = make_puzzles(self.category, 3)[1]
+
+    def test_plain_edits_leave_the_counter_alone(self):
+        puzzle = Puzzle.objects.get(id=self.puzzle.id)
+        puzzle.clue = "a better clue"
+        puzzle.par_score = 7
+        with CaptureQueriesContext(connection) as queries:
+            puzzle.save()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("positioncounter", queries[0]["sql"].lower())
+
+        # A new position (or category) is still pushed past by the counter
+        puzzle.position = 10
+        puzzle.save()
+        puzzle.clue = "edited again"
+        with self.assertNumQueries(1):
+            puzzle.save()
+        self.assertEqual(PositionCounter.objects.reserve(self.category.id), 11)
+
+        other = make_category("other")
+        moved = Puzzle.objects.get(id=self.puzzle.id)
+        moved.category = other
+        moved.save()
+        self.assertEqual(PositionCounter.objects.reserve(other.id), 11)
+
+
+class ConcurrentReserveTests(TransactionTestCase):
+    THREADS = 8
+    RESERVATIONS_PER_THREAD = 25
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("threads can't write to an in-memory SQLite database concurrently")
+        self.category = make_category()
+
+    def test_concurrent_reservations_are_disjoint(self):
+        ranges = []
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def reserve(seed):
+            rng = random.Random(seed)
+            try:
+                start.wait()
+                for _ in range(self.RESERVATIONS_PER_THREAD):
+                    count = rng.randrange(1, 6)
+                    with transaction.atomic():
+                        first = PositionCounter.objects.reserve(self.category.id, count)
+                    ranges.append((first, count))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        # No counter row yet, so the first reservations also race to create it
+        threads = [threading.Thread(target=reserve, args=(seed,)) for seed in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(ranges), self.THREADS * self.RESERVATIONS_PER_THREAD)
+        positions_handed_out = sorted(first + i for first, count in ranges for i in range(count))
+        total = sum(count for _first, count in ranges)
+        # Disjoint and without gaps
+        self.assertEqual(positions_handed_out, list(range(1, total + 1)))
+        self.assertEqual(PositionCounter.objects.get(category=self.category).last_position, total)
+
+
+class UnpositionedSamplingTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.category = make_category()
+        self.puzzles = make_puzzles(self.category, 8)
+        # Rows written around Puzzle.save can be left without a position
+        self.unpositioned = {puzzle.id for puzzle in self.puzzles[:3]}
+        Puzzle.objects.filter(id__in=self.unpositioned).update(position=None)
+        sampling.invalidate_sampler(self.category.id)
+
+    def test_sampler_skips_unpositioned_puzzles(self):
+        sampler = sampling.get_sampler(self.category.id)
+        self.assertEqual(sorted(sampler.positions), [4, 5, 6, 7, 8])
+        self.assertEqual(sampler.signature[:3], (5, self.puzzles[-1].id, 8))
+
+        # Giving one a position changes the signature
+        Puzzle.objects.filter(id=self.puzzles[0].id).update(position=9)
+        self.assertNotEqual(sampling._category_signature(self.category.id), sampler.signature)
+
+    def test_weighted_run_serves_positioned_puzzles(self):
+        session = start_session(self.user, self.category)
+        self.assertEqual(session.total, 5)
+        served = []
+        for round_num in range(1, 10):
+            puzzles, _remaining = next_packet(session, 2, round_num)
+            served.extend(puzzle.id for puzzle in puzzles)
+        self.assertEqual(sorted(served), sorted(puzzle.id for puzzle in self.puzzles[3:]))
+
+        make_category("empty")
+        mixed = start_mixed_session(
+            self.user, make_category("mixed-run"), Category.objects.filter(slug__in=["animals", "empty"])
+        )
+        puzzles, remaining = next_packet(mixed, 10, 1)
+        self.assertEqual(remaining, 5)
+        self.assertFalse({puzzle.id for puzzle in puzzles} & self.unpositioned)
+
+
+class EndlessSessionTests(TestCase):
+    def test_permutation_is_a_bijection(self):
+        for span in [1, 2, 3, 7, 8, 9, 100, 1000]:
+            for seed in [0, 1, 2**61 + 12345]:
+                slots = [permuted_slot(index, span, seed) for index in range(span)]
+                self.assertEqual(sorted(slots), list(range(span)), (span, seed))
+        orders = {tuple(permuted_slot(index, 1000, seed) for index in range(20)) for seed in range(5)}
+        self.assertEqual(len(orders), 5)
+
+    def test_seen_bitset(self):
+        seen = bytearray()
+        self.assertFalse(has_seen(seen, 0))
+        for slot in [0, 7, 8, 63, 1000]:
+            mark_seen(seen, slot)
+        self.assertEqual(len(seen), 1000 // 8 + 1)
+        self.assertEqual([slot for slot in range(1001) if has_seen(seen, slot)], [0, 7, 8, 63, 1000])
+        self.assertFalse(has_seen(seen, 5000))
+
+    def test_full_cycle_never_repeats(self):
+        user = make_user()
+        category = make_category()
+        make_puzzles(category, 53)
+        # Deleted puzzles leave gaps in the permutation, which are skipped
+        Puzzle.objects.filter(position__in=[5, 20, 53]).delete()
+        session = start_session(user, category, exclude_positions=[1, 2, 99])
+        self.assertEqual((session.span, session.total, session.served), (52, 50, 2))
+
+        served = []
+        remaining = []
+        while True:
+            packet, left = next_packet(session, 6)
+            if not packet:
+                break
+            served.extend(puzzle.position for puzzle in packet)
+            remaining.append(left)
+        self.assertEqual(sorted(served), sorted(set(range(3, 53)) - {5, 20}))
+        self.assertEqual(remaining[0], 48)
+        session.refresh_from_db()
+        self.assertEqual((session.cursor, session.served), (52, 50))
+        self.assertEqual(next_packet(session, 6), ([], 0))
+
+    def test_restart_replaces_the_session(self):
+        user = make_user()
+        category = make_category()
+        make_puzzles(category, 5)
+        first = start_session(user, category)
+        second = start_session(user, category)
+        self.assertEqual(list(EndlessSession.objects.filter(user=user).values_list("pk", flat=True)), [second.pk])
+        self.assertNotEqual(first.pk, second.pk)
+
+
+class ConcurrentSessionStartTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("SQLite fails a read transaction's upgrade to a write lock instead of waiting")
+        self.user = make_user()
+        self.category = make_category()
+        make_puzzles(self.category, 10)
+
+    def test_concurrent_starts_leave_one_session(self):
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def begin():
+            try:
+                start.wait()
+                for _ in range(5):
+                    start_session(self.user, self.category)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=begin) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(EndlessSession.objects.filter(user=self.user, category=self.category).count(), 1)
@@ -0,0 +1,78 @@
+"""
+Text helpers shared by the API and the puzzle import tools.
+
+Kept free of Django imports so import worker processes can use them.
+"""
+import hashlib
+import string
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+
+def getAcronymFromSolution(solution):
+    """
+    Extracts the acronym from a solution by taking the first letter of each word.
+
+    Args:
+        solution (str): The full sentence solution (e.g., "Lions Tigers Monkeys Elephants")
+
+    Returns:
+        str: The acronym (e.g., "LTME")
+    """
+    if not solution:
+        return ""
+
+    words = solution.strip().split()
+    acronym = "".join(word[0].upper() for word in words if word)
+    return acronym
+
+
+def normalize_word(word):
+    """
+    Normalizes a word by removing common punctuation and converting to lowercase.
+
+    This allows for comparison between words with and without punctuation.
+    For example: "don't" becomes "dont", "well-known" becomes "wellknown"
+
+    Args:
+        word (str): The word to normalize
+
+    Returns:
+        str: The normalized word with punctuation removed and lowercased
+    """
+    if not word:
+        return ""
+
+    # Remove common punctuation characters but keep letters and numbers
+    # Remove punctuation except for spaces (we'll handle spaces separately)
+    normalized = word.translate(_PUNCTUATION).lower()
+    return normalized
+
+
+def stem_word(normalized):
+    """
+    Crude singular form of a normalized word, so "dog" and "dogs" (or "box"
+    and "boxes") compare equal. Strips a trailing "s" (but not "ss"), then the
+    "e" of an "es" plural after s, x, z, ch or sh. Words of three letters or
+    fewer are left alone ("bus", "gas"). The result is only a comparison key,
+    never shown: "horse" and "horses" both become "hors".
+    """
+    if len(normalized) > 3 and normalized.endswith("s") and not normalized.endswith("ss"):
+        normalized = normalized[:-1]
+    if len(normalized) > 3 and normalized.endswith("e") and normalized[:-1].endswith(("s", "x", "z", "ch", "sh")):
+        normalized = normalized[:-1]
+    return normalized
+
+
+def normalize_whitespace(text):
+    """Strip `text` and collapse every run of whitespace inside it to one space."""
+    return " ".join(text.split())
+
+
+def puzzle_content_hash(solution, clue, par_score):
+    """
+    Fingerprint of a puzzle's imported content, used to tell which rows of a
+    CSV changed since the last sync.
+    """
+    content = "\x1f".join([solution, clue, str(par_score)])
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
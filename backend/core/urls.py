@@ -1,6 +1,6 @@
 # core/urls.py
 from django.urls import path
-from .views import CategoryListView, CategoryPuzzleCountView, PuzzleRequest, PuzzleGuessResponse, PuzzleSolution, ClerkWebhookView, LevelupLevelsView, EndlessMyScoreView, EndlessSubmitView, EndlessLevelPacket, WordOfTheDay
+from .views import CategoryListView, CategoryPuzzleCountView, PuzzleRequest, PuzzleGuessResponse, PuzzleSolution, ClerkWebhookView, LevelupLevelsView, EndlessMyScoreView, EndlessSubmitView, EndlessLeaderboardView, EndlessLevelPacket, WordOfTheDay, DailyAllView, DailyStatsView, DailyStreakView
 
 urlpatterns = [
     path('categories/', CategoryListView.as_view(), name='category-list'),
@@ -12,6 +12,10 @@ urlpatterns = [
     path("levelup/levels/", LevelupLevelsView.as_view(), name="levelup-levels"),
     path("endless/score/", EndlessMyScoreView.as_view(), name="endless-score"),
     path("endless/submit/", EndlessSubmitView.as_view(), name="endless-submit"),
+    path("endless/leaderboard/", EndlessLeaderboardView.as_view(), name="endless-leaderboard"),
     path("endless/levels/", EndlessLevelPacket.as_view(), name="endless-level-packet"),
-    path("daily/", WordOfTheDay.as_view(), name="daily-word-get")
+    path("daily/", WordOfTheDay.as_view(), name="daily-word-get"),
+    path("daily/all/", DailyAllView.as_view(), name="daily-all"),
+    path("daily/stats/", DailyStatsView.as_view(), name="daily-stats"),
+    path("daily/streak/", DailyStreakView.as_view(), name="daily-streak")
 ]
\ No newline at end of file
@@ -3,15 +3,18 @@ from django.shortcuts import get_object_or_404
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Category, Puzzle, UserProgress, User, EndlessScore
-from .serializers import CategorySerializer
-from .constants import WordAccuracy
+from .models import Category, Puzzle, UserProgress, User, EndlessScore, EndlessSession, DailyStreak
+from .endless_sessions import start_session, start_mixed_session, next_packet
+from . import category_cache, daily, leaderboards, percentiles, streaks, webhooks
+from .serializers import CATEGORY_FIELDS, serialize_category_row
+from .constants import WordAccuracy, MIXED_CATEGORY_SLUG
 from django.db.models import Q,OuterRef, Subquery, IntegerField,CharField, Exists
 from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.http import HttpResponse, JsonResponse
+from django.utils.http import parse_etags
 import json
 import difflib
-from datetime import date
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
@@ -19,6 +22,7 @@ from svix.webhooks import Webhook, WebhookVerificationError
 from core.models import User
 from django.http import JsonResponse
 from .auth_utils import verify_clerk_jwt, extract_user_id_from_token
+from .text import getAcronymFromSolution, normalize_word
 from functools import wraps
 import logging
 
@@ -81,112 +85,73 @@ def clerk_authenticated(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
-def getAcronymFromSolution(solution):
-    """
-    Extracts the acronym from a solution by taking the first letter of each word.
-
-    Args:
-        solution (str): The full sentence solution (e.g., "Lions Tigers Monkeys Elephants")
-
-    Returns:
-        str: The acronym (e.g., "LTME")
-    """
-    if not solution:
-        return ""
-
-    words = solution.strip().split()
-    acronym = "".join(word[0].upper() for word in words if word)
-    return acronym
-
-def normalize_word(word):
-    """
-    Normalizes a word by removing common punctuation and converting to lowercase.
-
-    This allows for comparison between words with and without punctuation.
-    For example: "don't" becomes "dont", "well-known" becomes "wellknown"
-
-    Args:
-        word (str): The word to normalize
-
-    Returns:
-        str: The normalized word with punctuation removed and lowercased
-    """
-    if not word:
-        return ""
-
-    # Remove common punctuation characters but keep letters and numbers
-    import string
-    # Remove punctuation except for spaces (we'll handle spaces separately)
-    translator = str.maketrans('', '', string.punctuation)
-    normalized = word.translate(translator).lower()
-    return normalized
-
 class CategoryListView(ListAPIView):
     """
         This view returns a list of all active system categories
         and all categories created by a specific user if the 'user_id'
         query parameter is provided.
+
+        With a user and game_mode, each category also carries the user's
+        endless high_score or today's daily "Completed" badge. These are
+        annotated onto the category query, so the whole list takes at most
+        two queries (the user lookup and the categories).
     """
-    serializer_class = CategorySerializer
 
     def get(self, request):
         is_system_category = Q(creator__isnull=True)
         user_id = request.query_params.get('user_id')
         game_mode = request.query_params.get('game_mode')
 
+        # Daily badges depend on the date in the player's own time zone
+        today = None
+        if user_id and game_mode == "daily":
+            try:
+                offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+            except ValueError:
+                return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
+            today = daily.local_today(offset_hours)
+
+        cache_key = category_cache.list_key(user_id or None, game_mode, today)
+        payload = category_cache.lookup(cache_key)
+        if payload is not None:
+            return Response(payload)
+
         query = is_system_category
         user = None
 
         if user_id:
             try:
-                user = User.objects.get(clerk_id=user_id)
+                user = User.objects.only('id').get(clerk_id=user_id)
                 is_users_category = Q(creator=user)
                 query = query | is_users_category
             except User.DoesNotExist:
                 return Response({"error": "User not found"}, status=404)
 
         categories = Category.objects.filter(query, is_active=True)
-
-        # Serialize categories first
-        serializer = self.get_serializer(categories, many=True)
-        categories_data = serializer.data
+        fields = list(CATEGORY_FIELDS)
 
         # Add dynamic data if user exists and game_mode specified
         if user and game_mode:
             if game_mode == "endless":
-                # Create a dictionary mapping a category's ID to its high score.
-                # This fetches all relevant scores for the user in a single, efficient database query.
-                score_map = {score.category_id: score.high_score
-                            for score in EndlessScore.objects.filter(user=user)}
-
-                # Now, loop through your list of categories.
-                for cat_data in categories_data:
-                    cat_id = cat_data['id']
-                    # Use the dictionary for a fast lookup.
-                    # .get() is used to safely return None if the key doesn't exist.
-                    high_score = score_map.get(cat_id)
-                    if high_score is not None:
-                        cat_data['high_score'] = high_score
+                high_scores = EndlessScore.objects.filter(user=user, category=OuterRef('pk'))
+                categories = categories.annotate(
+                    high_score=Subquery(high_scores.values('high_score')[:1], output_field=IntegerField())
+                )
+                fields.append('high_score')
 
             elif game_mode == "daily":
-                today = date.today()
-                completed_categories = set(
-                    UserProgress.objects.filter(
-                        user=user,
-                        game_mode=game_mode,
-                        timestamp__date=today
-                    ).values_list('category_id', flat=True)
+                completions = UserProgress.objects.filter(
+                    user=user,
+                    game_mode=game_mode,
+                    played_on=today,
+                    category=OuterRef('pk')
                 )
+                categories = categories.annotate(completed_today=Exists(completions))
+                fields.append('completed_today')
 
-                print(completed_categories)
-
-                for cat_data in categories_data:
-                    cat_id = cat_data['id']
-                    if cat_id in completed_categories:
-                        cat_data['badge'] = "Completed"
-
-        print(categories_data)
-        return Response(categories_data)
+        payload = [serialize_category_row(row) for row in categories.values(*fields)]
+        category_cache.store(cache_key, payload)
+        return Response(payload)
 
 class CategoryPuzzleCountView(APIView):
     """
@@ -314,8 +279,12 @@ class PuzzleGuessResponse(APIView):
     
 @method_decorator(csrf_exempt, name='dispatch')
 class ClerkWebhookView(APIView):
+    """
+    POST /api/clerk
+    Verifies a Clerk webhook and queues it; the process_webhook_events
+    command applies it to the User table
+    """
     def post(self, request, *args, **kwargs):
-        print("Webhook received!")
         headers = request.headers
         payload = request.body.decode('utf-8')
 
@@ -326,36 +295,11 @@ class ClerkWebhookView(APIView):
             wh = Webhook(secret)
             event = wh.verify(payload, headers)
         except WebhookVerificationError as e:
-            print(f"Error verifying webhook: {e}")
+            logger.warning(f"Error verifying webhook: {e}")
             return Response({"error": "Invalid signature"}, status=400)
-        
-        event_type = event['type']
-        data = event['data']
-
-        if event_type == 'user.created':
-            # Get email from the first email address
-            email = data['email_addresses'][0]['email_address']
-
-            User.objects.create(
-                clerk_id=data['id'],
-                email=email,
-                username=data.get('username') or email,  # Use username or fall back to email
-                first_name=data.get('first_name', ''),
-                last_name=data.get('last_name', ''),
-            )
-            print(f"User {data['id']} created in database.")
-
-        elif event_type == 'user.updated':
-            user = User.objects.filter(clerk_id=data['id']).first()
-            if user:
-                email = data['email_addresses'][0]['email_address']
-                user.email = email
-                user.username = data.get('username') or email
-                user.first_name = data.get('first_name', '')
-                user.last_name = data.get('last_name', '')
-                user.save()
-                print(f"User {data['id']} updated.")
 
+        # Redelivered webhooks share a svix-id and are only stored once
+        webhooks.enqueue(headers['svix-id'], event)
         return Response(status=200)
     
 @method_decorator(clerk_authenticated, name='dispatch')
@@ -571,34 +515,55 @@ class LevelupLevelsView(ListAPIView):
         except (json.JSONDecodeError, KeyError) as e:
             return Response({"error": "Invalid JSON in request body"}, status=400)
 
-        # Check if progress already exists to prevent duplicates (only for today)
         try:
-            today = date.today()
-            existing_progress = UserProgress.objects.filter(
+            offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+        except ValueError:
+            return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
+
+        # Check if progress already exists to prevent duplicates (only for today,
+        # in the player's own time zone)
+        try:
+            today = daily.local_today(offset_hours)
+            existing_id = UserProgress.objects.filter(
                 user=user,
                 puzzle=puzzle,
                 game_mode=game_mode,
-                timestamp__date=today  # Only check for completion today
-            ).first()
+                played_on=today
+            ).values_list('id', flat=True).first()
 
-            if existing_progress:
+            if existing_id:
                 # Progress already exists - don't create duplicate or update
                 return Response({
                     "success": True,
                     "message": "Progress already recorded",
-                    "id": existing_progress.id
+                    "id": existing_id
                 }, status=200)
 
-            # Create new progress record only if none exists
-            new_user_progress = UserProgress.objects.create(
-                user=user,
-                category=category,
-                puzzle=puzzle,
-                game_mode=game_mode,
-                score=score,
-                attempts_data=attempts_data
-            )
-            return Response({"success": True, "id": new_user_progress.id}, status=201)
+            # Create new progress record only if none exists, and extend the
+            # player's daily streak in the same transaction
+            with transaction.atomic():
+                new_user_progress = UserProgress.objects.create(
+                    user=user,
+                    category=category,
+                    puzzle=puzzle,
+                    game_mode=game_mode,
+                    score=score,
+                    attempts_data=attempts_data,
+                    played_on=today
+                )
+                if game_mode == UserProgress.GameMode.DAILY:
+                    streaks.record_daily_play(user.id, today)
+            percentiles.record_guesses(category.id, game_mode, score)
+            if game_mode == UserProgress.GameMode.DAILY:
+                daily.record_completion(today, category.id, score)
+                # The daily category list shows a "Completed" badge now
+                category_cache.bump_user(user.clerk_id)
+
+            return Response({
+                "success": True,
+                "id": new_user_progress.id,
+                "beat_percent": percentiles.beat_percent(category.id, game_mode, score)
+            }, status=201)
         except Exception as e:
             logger.error(f"Failed to create user progress: {e}")
             return Response({"error": "Failed to save progress"}, status=500) 
@@ -620,10 +585,11 @@ class EndlessMyScoreView(APIView):
             logger.error(f"User with clerk_id {user_id} not found in database")
             return Response({"error": "User not found"}, status=404)
 
-        # Get all active categories (system categories + user's own categories)
+        # Get all active categories (system categories + user's own categories),
+        # plus the hidden bucket that mixed runs are scored under
         categories = Category.objects.filter(
             Q(creator__isnull=True) | Q(creator=user),
-            is_active=True
+            Q(is_active=True) | Q(slug=MIXED_CATEGORY_SLUG)
         ).order_by('order', 'name')
 
         # Get user's endless scores for these categories
@@ -685,30 +651,91 @@ class EndlessSubmitView(APIView):
         except Category.DoesNotExist:
             return Response({"error": "Category not found"}, status=404)
 
-        # Update score atomically
+        # Update score atomically (keeps the higher of the stored and new score)
+        # and move the player to their new leaderboard bucket in the same transaction
         try:
             with transaction.atomic():
-                row, created = EndlessScore.objects.select_for_update().get_or_create(
-                    user=user, category=category, defaults={"high_score": score}
-                )
-
-                # If record exists and new score is higher, update it
-                if not created and score > row.high_score:
-                    row.high_score = score
-                    row.save()
-
-            return Response({"success": True, "high_score": row.high_score}, status=200)
+                # A tombstoned user is off the boards until purged; locking the
+                # row keeps a concurrent tombstone from missing this score
+                if not User.objects.select_for_update().filter(pk=user.pk, deleted_at__isnull=True).exists():
+                    return Response({"error": "User not found"}, status=404)
+                previous, high_score = EndlessScore.objects.record_high_score(user, category, score)
+                leaderboards.record_score_change(category.id, previous, high_score)
+            percentiles.record_endless(category.id, previous, high_score)
+            if high_score != previous:
+                category_cache.bump_user(user.clerk_id)
+
+            return Response({
+                "success": True,
+                "high_score": high_score,
+                "beat_percent": percentiles.beat_percent(category.id, UserProgress.GameMode.ENDLESS, score)
+            }, status=200)
         except Exception as e:
             logger.error(f"Failed to update endless score: {e}")
             return Response({"error": "Failed to update score"}, status=500)
             
 
+@method_decorator(clerk_authenticated, name='dispatch')
+class EndlessLeaderboardView(APIView):
+    """
+    GET /api/endless/leaderboard/?slug=<slug>&limit=<n>
+    Returns the top endless high scores for a category and the caller's rank
+    """
+
+    def get(self, request):
+        user_id = request.clerk_user_id
+
+        # Get user
+        try:
+            user = User.objects.get(clerk_id=user_id)
+        except User.DoesNotExist:
+            logger.error(f"User with clerk_id {user_id} not found in database")
+            return Response({"error": "User not found"}, status=404)
+
+        slug = request.query_params.get("slug")
+        if not slug:
+            return Response({"error": "Missing required parameter: slug"}, status=400)
+
+        try:
+            limit = int(request.query_params.get("limit", leaderboards.TOP_LIMIT_DEFAULT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+
+        # Get category (system categories or user's own categories)
+        try:
+            category = Category.objects.get(
+                Q(slug=slug) & (Q(creator__isnull=True) | Q(creator=user))
+            )
+        except Category.DoesNotExist:
+            return Response({"error": "Category not found"}, status=404)
+
+        high_score = EndlessScore.objects.filter(
+            user=user, category=category
+        ).values_list("high_score", flat=True).first()
+
+        me = None
+        if high_score is not None:
+            rank, players = leaderboards.rank_for_score(category.id, high_score)
+            me = {"high_score": high_score, "rank": rank, "players": players}
+
+        return Response({
+            "category_slug": category.slug,
+            "top": leaderboards.top_scores(category.id, limit),
+            "me": me,
+        })
+
+
 @method_decorator(clerk_authenticated, name='dispatch')
 class EndlessLevelPacket(APIView):
     """
-    GET/POST /api/endless/levels/?slug=<slug>
+    GET/POST /api/endless/levels/?slug=<slug>[&session_id=<id>][&round=<n>]
     Returns a random list of puzzles from specified category
-    POST body (optional): {"last_position": [1, 5, 8]} --> positions to exclude from results
+    slug=mixed draws from every active system category plus the user's own
+    When round is given, puzzles are weighted towards harder ones as the run goes on
+    The first packet starts a server-side session and returns its session_id;
+    passing it back on later packets guarantees no puzzle is repeated in the run.
+    POST body (optional): {"session_id": "<id>"} or, for older clients,
+    {"last_position": [1, 5, 8]} --> positions to exclude from a new session
     """
 
     def _get_puzzle_data(self, request):
@@ -729,6 +756,17 @@ class EndlessLevelPacket(APIView):
         if not slug:
             return Response({"error": "Missing required parameter: slug"}, status=400)
 
+        # Optional round number shifts sampling towards harder puzzles
+        round_num = None
+        round_raw = request.query_params.get("round")
+        if round_raw is not None:
+            try:
+                round_num = int(round_raw)
+                if round_num < 1:
+                    raise ValueError
+            except ValueError:
+                return Response({"error": "round must be a positive integer"}, status=400)
+
 
         # Get category (system categories or user's own categories)
         try:
@@ -739,51 +777,63 @@ class EndlessLevelPacket(APIView):
             logger.error(f"Category with slug {slug} not found")
             return Response({"error": "Category not found"}, status=404)
 
-        # Parse optional last_position data from request body
+        # Parse optional session_id / last_position data from request body
+        session_id = request.query_params.get("session_id")
         last_positions = []
         if request.body:
             try:
                 data = json.loads(request.body)
+                session_id = data.get('session_id') or session_id
                 last_positions = data.get('last_position', [])
                 if not isinstance(last_positions, list):
                     return Response({"error": "last_position must be an array"}, status=400)
-            except (json.JSONDecodeError, KeyError):
+            except (json.JSONDecodeError, KeyError, AttributeError):
                 # Ignore invalid JSON, continue without filtering
                 pass
 
-        # Start with all puzzles in category
-        puzzles_query = Puzzle.objects.filter(category=category)
+        mixed = category.slug == MIXED_CATEGORY_SLUG
 
-        # Apply last_position filtering if we have positions to exclude
-        if last_positions:
+        if session_id:
+            try:
+                session = EndlessSession.objects.get(pk=session_id, user=user, category=category)
+            except (EndlessSession.DoesNotExist, ValidationError):
+                return Response({"error": "Endless session not found"}, status=404)
+        elif mixed:
+            source_categories = Category.objects.filter(
+                Q(creator__isnull=True) | Q(creator=user),
+                is_active=True
+            )
+            session = start_mixed_session(user, category, source_categories)
+        else:
             try:
-                # Convert to integers and filter out puzzles with these positions
+                # Convert to integers so they can seed the new session
                 exclude_positions = [int(pos) for pos in last_positions]
-                puzzles_query = puzzles_query.exclude(position__in=exclude_positions)
-                logger.info(f"Filtering out puzzles at positions: {exclude_positions}")
             except (ValueError, TypeError):
                 # Invalid position data, continue without filtering
                 logger.warning(f"Invalid last_position data: {last_positions}")
+                exclude_positions = []
+            session = start_session(user, category, exclude_positions)
 
-        # Get total count and apply limit
-        total_count = puzzles_query.count()
-        if total_count == 0:
+        random_puzzles, total_count = next_packet(session, limit, round_num)
+        if not random_puzzles:
             return Response({"error": "No puzzles available"}, status=404)
 
-        final_limit = min(total_count, limit)
-        random_puzzles = puzzles_query.order_by('?')[:final_limit]
-
         # Prepare response data
         puzzle_data = []
         for puzzle in random_puzzles:
-            puzzle_data.append({
+            item = {
                 "position": puzzle.position,
                 "clue": puzzle.clue,
                 "par_score": puzzle.par_score,
                 "acronym": getAcronymFromSolution(puzzle.solution),
-            })
+            }
+            if mixed:
+                # Positions are only unique within a category
+                item["category_slug"] = puzzle.category.slug
+            puzzle_data.append(item)
 
         return Response({
+            "session_id": str(session.pk),
             "puzzles": puzzle_data,
             "count": len(puzzle_data),
             "total_available": total_count,
@@ -801,7 +851,7 @@ class EndlessLevelPacket(APIView):
 
 class WordOfTheDay(APIView):
     """
-    GET/ /api/daily/?slug=<slug>
+    GET/ /api/daily/?slug=<slug>&tz_offset=<minutes east of UTC>
     Returns the word of the day given the specified category slug
     """
     def get(self, request):
@@ -810,6 +860,11 @@ class WordOfTheDay(APIView):
 
         if not slug:
             return Response({"error": "Missing slug parameter"}, status=400)
+
+        try:
+            offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+        except ValueError:
+            return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
         
          # Get category
         try:
@@ -817,30 +872,96 @@ class WordOfTheDay(APIView):
         except Category.DoesNotExist:
             return Response({"error": "Category not found"}, status=404)
         
-        # Get all puzzles for this category
-        all_puzzles = Puzzle.objects.filter(category=category)
-
-        if not all_puzzles.exists():
+        # Today's puzzle comes from the precomputed daily schedule
+        puzzle_data = daily.daily_payload(category, daily.local_today(offset_hours))
+        if puzzle_data is None:
             return Response({"error": "No puzzles available for this category"}, status=404)
 
-        # Use current date to deterministically select puzzle for today
-        today = date.today()
-        # Create a consistent seed from the date (days since epoch)
-        date_seed = (today - date(1970, 1, 1)).days
+        # The answer can't change before the player's rollover, so let clients cache it
+        return daily.cache_until_midnight(Response(puzzle_data), offset_hours)
+
+
+class DailyAllView(APIView):
+    """
+    GET /api/daily/all/?tz_offset=<minutes east of UTC>
+    Returns today's puzzle for every active system category in one response.
+    The body is built once per day per process and can be cached by clients
+    and proxies until the player's rollover; If-None-Match is answered with 304.
+    """
+    def get(self, request):
+        try:
+            offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+        except ValueError:
+            return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
+
+        bundle = daily.daily_bundle(daily.local_today(offset_hours))
 
-        # Use modulo to select puzzle index - ensures same puzzle each day
-        puzzle_count = all_puzzles.count()
-        selected_index = date_seed % puzzle_count
+        if bundle.etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(bundle.body, content_type="application/json")
 
-        # Get the puzzle at the calculated index
-        selected_puzzle = all_puzzles.order_by('position')[selected_index]
+        response["ETag"] = bundle.etag
+        return daily.cache_until_midnight(response, offset_hours)
 
-        # Prepare response data
-        puzzle_data = {
-            'acronym': getAcronymFromSolution(selected_puzzle.solution),
-            'clue': selected_puzzle.clue,
-            'par_score': selected_puzzle.par_score,
-            'position': selected_puzzle.position
-        }
+class DailyStatsView(APIView):
+    """
+    GET /api/daily/stats/?slug=<slug>&tz_offset=<minutes east of UTC>
+    Returns how many players solved today's puzzle and in how many guesses
+    """
+    def get(self, request):
+        slug = request.query_params.get("slug")
+        if not slug:
+            return Response({"error": "Missing slug parameter"}, status=400)
+
+        try:
+            offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+        except ValueError:
+            return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
+
+        try:
+            category = Category.objects.get(slug=slug, creator=None)
+        except Category.DoesNotExist:
+            return Response({"error": "Category not found"}, status=404)
+
+        day = daily.local_today(offset_hours)
+        distribution = daily.stats_for(day, category.id)
+        solves = sum(distribution.values())
+
+        return Response({
+            "date": day.isoformat(),
+            "solves": solves,
+            "distribution": [
+                {
+                    "guesses": guesses,
+                    "count": count,
+                    "percent": round(100 * count / solves, 1)
+                }
+                for guesses, count in sorted(distribution.items())
+                if count
+            ]
+        })
+
+@method_decorator(clerk_authenticated, name='dispatch')
+class DailyStreakView(APIView):
+    """
+    GET /api/daily/streak/?tz_offset=<minutes east of UTC>
+    Returns the caller's current and longest daily streaks
+    """
+    def get(self, request):
+        user_id = request.clerk_user_id
+
+        # Get user
+        try:
+            user = User.objects.get(clerk_id=user_id)
+        except User.DoesNotExist:
+            logger.error(f"User with clerk_id {user_id} not found in database")
+            return Response({"error": "User not found"}, status=404)
+
+        try:
+            offset_hours = daily.parse_offset(request.query_params.get("tz_offset"))
+        except ValueError:
+            return Response({"error": "tz_offset must be an integer number of minutes"}, status=400)
 
-        return Response(puzzle_data)
\ No newline at end of file
+        streak = DailyStreak.objects.filter(user=user).first()
+        return Response(streaks.streak_summary(streak, daily.local_today(offset_hours)))
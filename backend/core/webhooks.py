@@ -0,0 +1,152 @@
+"""
+Clerk webhook processing.
+
+ClerkWebhookView only verifies a webhook and appends it to WebhookEvent; the
+process_webhook_events command applies queued events in batches. A batch
+folds every user's events into their final state and writes all users with
+one upsert, so replays and bursts (e.g. a bulk Clerk import) cost a few
+statements per batch rather than a request worker per event.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import deletion
+from .models import User, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_DEFAULT = 500
+
+# Events that keep failing are left in the table for inspection.
+MAX_ATTEMPTS = 5
+
+USER_EVENTS = ("user.created", "user.updated")
+DELETE_EVENTS = ("user.deleted",)
+
+PROFILE_FIELDS = ["email", "username", "first_name", "last_name", "is_active"]
+
+
+def enqueue(svix_id, event):
+    """Store a verified webhook unless one with the same svix-id is already queued."""
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(svix_id=svix_id, event_type=event["type"], data=event["data"])],
+        ignore_conflicts=True,
+    )
+
+
+def _primary_email(data):
+    addresses = data.get("email_addresses") or []
+    for address in addresses:
+        if address.get("id") == data.get("primary_email_address_id"):
+            return address["email_address"]
+    if addresses:
+        return addresses[0]["email_address"]
+    raise ValueError(f"User {data.get('id')} has no email address")
+
+
+def _user_from(data):
+    email = _primary_email(data)
+    return User(
+        clerk_id=data["id"],
+        email=email,
+        username=data.get("username") or email,  # Use username or fall back to email
+        first_name=data.get("first_name") or "",
+        last_name=data.get("last_name") or "",
+        is_active=True,
+    )
+
+
+def _apply(events):
+    """
+    Apply `events` (in arrival order) to User rows. The latest event for each
+    Clerk user wins. Raises on the first bad event.
+    """
+    latest = {}
+    for event in events:
+        latest[event.data["id"]] = event
+
+    users = [_user_from(e.data) for e in latest.values() if e.event_type in USER_EVENTS]
+    deleted = [clerk_id for clerk_id, e in latest.items() if e.event_type in DELETE_EVENTS]
+
+    if users:
+        User.objects.bulk_create(
+            users,
+            update_conflicts=True,
+            unique_fields=["clerk_id"],
+            update_fields=PROFILE_FIELDS,
+        )
+    if deleted:
+        deletion.tombstone(deleted)
+
+
+def _apply_one_by_one(events):
+    # Isolate the event(s) that broke the batch; the rest still go through.
+    # Anything an event raises (a DataError for an over-long field, a
+    # TypeError for a malformed payload, ...) is recorded against that event
+    # only; letting it escape would roll back the whole batch without
+    # counting the attempt, and the event would block the queue forever.
+    processed, failed = [], []
+    for event in events:
+        try:
+            with transaction.atomic():
+                _apply([event])
+            processed.append(event)
+        except Exception as e:
+            event.attempts += 1
+            event.last_error = str(e)
+            failed.append(event)
+            logger.error(f"Failed to apply webhook {event.svix_id} ({event.event_type}): {e}")
+    return processed, failed
+
+
+def process_batch(batch_size=BATCH_SIZE_DEFAULT, after_id=0):
+    """
+    Apply the oldest pending events with ids above `after_id`.
+
+    Returns (processed, failed, last_id); last_id is None once there is
+    nothing left to process.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS, id__gt=after_id)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0, 0, None
+
+        # Ignore types we don't handle, but mark them processed
+        handled = [e for e in events if e.event_type in USER_EVENTS + DELETE_EVENTS]
+        try:
+            with transaction.atomic():
+                _apply(handled)
+            processed, failed = events, []
+        except Exception:
+            processed, failed = _apply_one_by_one(handled)
+            processed += [e for e in events if e not in handled]
+
+        now = timezone.now()
+        for event in processed:
+            event.processed_at = now
+        WebhookEvent.objects.bulk_update(processed, ["processed_at"])
+        WebhookEvent.objects.bulk_update(failed, ["attempts", "last_error"])
+
+    return len(processed), len(failed), events[-1].id
+
+
+def drain(batch_size=BATCH_SIZE_DEFAULT):
+    """
+    Process batches until every pending event has been tried once.
+    Returns (processed, failed) totals.
+    """
+    total_processed = total_failed = 0
+    last_id = 0
+    while True:
+        processed, failed, last_id = process_batch(batch_size, last_id)
+        if last_id is None:
+            break
+        total_processed += processed
+        total_failed += failed
+    return total_processed, total_failed